@@ -1,12 +1,19 @@
-from django.contrib import admin
-from django.urls import reverse
+from django.contrib import admin, messages
+from django.contrib.contenttypes.models import ContentType
+from django.forms.models import BaseInlineFormSet
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
 from django.utils.html import format_html
 
 from campaigns.models import (
     Campaign, Placement, Donation, Expense,
     FundAllocation, FundWithdrawalRequest
 )
-from common.models import File
+from campaigns.counters import ADMIN_COUNTERS
+from campaigns.services import approve_withdrawals
+from common.models import AuditLogArchive, File
+from libs.counters import get_counts
+from libs.pagination import EstimatedCountPaginator
 from auditlog.models import LogEntry
 from django_q.models import Schedule, OrmQ, Failure, Success
 from django_q.admin import ScheduleAdmin, TaskAdmin, FailAdmin, QueueAdmin
@@ -20,7 +27,8 @@ class CustomAdminSite(admin.AdminSite):
     def each_context(self, request):
         context = super().each_context(request)
         if request.user.is_staff:
-            context['pending_withdrawals_count'] = FundWithdrawalRequest.objects.filter(is_approved=False).count()
+            for name, value in get_counts(ADMIN_COUNTERS).items():
+                context[f'{name}_count'] = value
         return context
 
 
@@ -30,57 +38,180 @@ custom_admin_site = CustomAdminSite(name='custom_admin')
 # ========== Base AuditLog Admin Mixin ==========
 class AuditLogAdminMixin:
     def view_logs_link(self, obj):
-        model_name = self.model._meta.model_name
-        url = reverse('admin:auditlog_logentry_changelist') + f'?object_id={obj.pk}&content_type__model={model_name}'
+        # filter on the content type id: no join, served by the object_id index
+        content_type = ContentType.objects.get_for_model(self.model)
+        url = reverse('admin:auditlog_logentry_changelist') + f'?object_id={obj.pk}&content_type__exact={content_type.pk}'
         return format_html('<a class="button" href="{}">View Logs</a>', url)
 
     view_logs_link.short_description = 'Audit Logs'
 
 
+class SoftDeleteAdminMixin:
+    """
+    Lists deleted rows too (filter on ``is_deleted``) and replaces Django's
+    delete action with bulk soft delete / restore, one UPDATE each.
+    """
+    actions = ['soft_delete_selected', 'restore_selected']
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_list_filter(self, request):
+        return ('is_deleted',) + tuple(super().get_list_filter(request))
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Soft delete selected %(verbose_name_plural)s', permissions=['delete'])
+    def soft_delete_selected(self, request, queryset):
+        _, counts = queryset.soft_delete()
+        count = counts.get(self.model._meta.label, 0)
+        self.message_user(request, f'Soft deleted {count} {self.model._meta.verbose_name_plural}.')
+
+    @admin.action(description='Restore selected %(verbose_name_plural)s', permissions=['change'])
+    def restore_selected(self, request, queryset):
+        _, counts = queryset.restore()
+        count = counts.get(self.model._meta.label, 0)
+        self.message_user(request, f'Restored {count} {self.model._meta.verbose_name_plural}.')
+
+
 # ========== Inlines ==========
-class FundAllocationInline(admin.TabularInline):
+class RecentInlineFormSet(BaseInlineFormSet):
+    """
+    Inline formset limited to the first ``max_rows`` rows of the inline's
+    ordering; the template links to the changelist for the rest.
+    """
+    max_rows = None
+    changelist_url = None
+
+    def get_queryset(self):
+        if not hasattr(self, '_recent_queryset'):
+            queryset = super().get_queryset()
+            recent = queryset[:self.max_rows]
+            self.total_count = len(recent)
+            for obj in recent:
+                # rows are labelled with str(obj), which usually needs the parent
+                setattr(obj, self.fk.name, self.instance)
+            if self.total_count == self.max_rows:
+                self.total_count = queryset.count()
+            self._recent_queryset = recent
+        return self._recent_queryset
+
+    @property
+    def has_more(self):
+        self.get_queryset()
+        return self.total_count > self.max_rows
+
+    @property
+    def all_url(self):
+        return f'{self.changelist_url}?{self.fk.name}__exact={self.instance.pk}'
+
+
+class RecentInlineMixin:
+    """
+    Show only the ``max_rows`` most recent rows (per ``ordering``) plus a
+    "view all" link, so change pages of large parents render in bounded time.
+    """
+    max_rows = 20
+    formset = RecentInlineFormSet
+    template = 'admin/edit_inline/recent_tabular.html'
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        opts = self.model._meta
+        formset.max_rows = self.max_rows
+        formset.changelist_url = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist',
+                                         current_app=self.admin_site.name)
+        return formset
+
+
+class FundAllocationInline(RecentInlineMixin, admin.TabularInline):
     model = FundAllocation
     extra = 0
     readonly_fields = ('donation', 'allocated_amount')
     can_delete = False
+    ordering = ('-id',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('donation__campaign')
 
 
-class PlacementInline(admin.TabularInline):
+class PlacementInline(RecentInlineMixin, admin.TabularInline):
     model = Placement
     extra = 0
+    ordering = ('-created_at',)
+    readonly_fields = ('qr_code', 'qr_code_svg', 'donation_card', 'created_by')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('qr_code', 'qr_code_svg', 'donation_card', 'created_by')
 
-class ExpenseInline(admin.TabularInline):
+
+class ExpenseInline(RecentInlineMixin, admin.TabularInline):
     model = Expense
     extra = 0
     fields = ('description', 'amount', 'timestamp', 'created_by')
-    readonly_fields = ('timestamp',)
+    readonly_fields = ('timestamp', 'created_by')
+    ordering = ('-timestamp',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('created_by')
 
 
-class DonationInline(admin.TabularInline):
+class DonationInline(RecentInlineMixin, admin.TabularInline):
+    """
+    Read-only: donations are edited on their own change page.
+    """
     model = Donation
     extra = 0
     fields = ('donor', 'amount', 'timestamp', 'transaction_id', 'is_fully_allocated')
-    readonly_fields = ('timestamp', 'transaction_id')
+    readonly_fields = fields
+    ordering = ('-timestamp',)
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('donor')
 
 
 # ========== Model Admins ==========
 @admin.register(Campaign, site=custom_admin_site)
-class CampaignAdmin(AuditLogAdminMixin, admin.ModelAdmin):
+class CampaignAdmin(SoftDeleteAdminMixin, AuditLogAdminMixin, admin.ModelAdmin):
     list_display = ('external_id', 'title', 'goal_amount', 'total_donated',
                     'unallocated_amount', 'is_active', 'verified', 'view_logs_link')
     search_fields = ('title', 'organizer__username', 'description')
     list_filter = ('is_active', 'verified', 'start_date')
     inlines = [PlacementInline, ExpenseInline, DonationInline]
     readonly_fields = ('total_donated', 'unallocated_amount', 'start_date', 'external_id')
+    raw_id_fields = ('organizer', 'featured_image', 'images')
+
+    def save_formset(self, request, form, formset, change):
+        # created_by is read-only in the inlines, new rows are the admin's own
+        instances = formset.save(commit=False)
+        for obj in formset.deleted_objects:
+            obj.delete()
+        for instance in instances:
+            if hasattr(instance, 'created_by_id') and instance.created_by_id is None:
+                instance.created_by = request.user
+            instance.save()
+        formset.save_m2m()
 
 
 @admin.register(Placement, site=custom_admin_site)
-class PlacementAdmin(AuditLogAdminMixin, admin.ModelAdmin):
+class PlacementAdmin(SoftDeleteAdminMixin, AuditLogAdminMixin, admin.ModelAdmin):
     list_display = ('external_id', 'name', 'campaign', 'created_by', 'created_at', 'view_logs_link')
     search_fields = ('name', 'campaign__title', 'created_by__username')
     list_filter = ('created_at',)
     readonly_fields = ('external_id',)
+    raw_id_fields = ('campaign', 'created_by', 'qr_code', 'qr_code_svg', 'donation_card')
+    list_select_related = ('campaign', 'created_by')
 
 
 @admin.register(Donation, site=custom_admin_site)
@@ -88,18 +219,25 @@ class DonationAdmin(AuditLogAdminMixin, admin.ModelAdmin):
     list_display = ('external_id', 'donor', 'campaign', 'amount', 'timestamp',
                     'is_fully_allocated', 'transaction_id', 'view_logs_link')
     search_fields = ('donor__username', 'campaign__title', 'transaction_id')
-    list_filter = ('timestamp', 'is_fully_allocated')
+    list_filter = ('status', 'timestamp', 'is_fully_allocated')
     readonly_fields = ('external_id', 'timestamp', 'transaction_id')
+    raw_id_fields = ('campaign', 'placement', 'donor')
+    list_select_related = ('donor', 'campaign')
+    ordering = ('-timestamp',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Expense, site=custom_admin_site)
-class ExpenseAdmin(AuditLogAdminMixin, admin.ModelAdmin):
+class ExpenseAdmin(SoftDeleteAdminMixin, AuditLogAdminMixin, admin.ModelAdmin):
     list_display = ('external_id', 'description', 'campaign', 'amount',
                     'timestamp', 'created_by', 'view_logs_link')
     search_fields = ('description', 'campaign__title', 'created_by__username')
     list_filter = ('timestamp',)
     inlines = [FundAllocationInline]
     readonly_fields = ('external_id', 'timestamp')
+    raw_id_fields = ('campaign', 'created_by', 'receipt')
+    list_select_related = ('campaign', 'created_by')
 
 
 @admin.register(FundAllocation, site=custom_admin_site)
@@ -108,6 +246,10 @@ class FundAllocationAdmin(AuditLogAdminMixin, admin.ModelAdmin):
     search_fields = ('donation__donor__username', 'expense__description')
     list_filter = ('donation__timestamp',)
     readonly_fields = ('external_id',)
+    raw_id_fields = ('donation', 'expense')
+    list_select_related = ('donation__campaign', 'expense')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(FundWithdrawalRequest, site=custom_admin_site)
@@ -116,16 +258,33 @@ class FundWithdrawalRequestAdmin(AuditLogAdminMixin, admin.ModelAdmin):
                     'is_approved', 'timestamp', 'reviewed_by', 'reviewed_at', 'view_logs_link')
     search_fields = ('campaign__title', 'requested_by__username')
     list_filter = ('is_approved', 'timestamp')
-    readonly_fields = ('external_id', 'timestamp', 'reviewed_at')
+    # approval goes through approve_withdrawals, which checks the campaign balance
+    readonly_fields = ('external_id', 'timestamp', 'is_approved', 'reviewed_by', 'reviewed_at')
+    raw_id_fields = ('campaign', 'requested_by')
+    list_select_related = ('campaign', 'requested_by', 'reviewed_by')
+    actions = ['approve_selected']
 
     def get_queryset(self, request):
         return super().get_queryset(request).filter(is_approved=False)
 
+    @admin.action(description='Approve selected withdrawal requests', permissions=['change'])
+    def approve_selected(self, request, queryset):
+        approved, insufficient = approve_withdrawals(list(queryset.values_list('pk', flat=True)), request.user)
+        if approved:
+            self.message_user(request, f'Approved {len(approved)} withdrawal request(s).', messages.SUCCESS)
+        if insufficient:
+            self.message_user(
+                request,
+                f'{len(insufficient)} request(s) exceed the unallocated balance of their campaign and were left pending.',
+                messages.WARNING,
+            )
+
 
 @admin.register(File, site=custom_admin_site)
 class FileAdmin(admin.ModelAdmin):
     list_display = ('name', 'content_type', 'file')
     search_fields = ('name', 'description')
+    list_select_related = ('content_type',)
 
 
 # ========== Q Cluster Admins ==========
@@ -144,3 +303,37 @@ class LogEntryAdmin(admin.ModelAdmin):
     list_filter = ('content_type__model', 'action')
     search_fields = ('object_repr', 'changes', 'actor__username')
     readonly_fields = [f.name for f in LogEntry._meta.fields]
+    list_select_related = ('actor',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(AuditLogArchive, site=custom_admin_site)
+class AuditLogArchiveAdmin(admin.ModelAdmin):
+    list_display = ('month', 'part', 'entry_count', 'size', 'created_at', 'download_link')
+    readonly_fields = [f.name for f in AuditLogArchive._meta.fields] + ['download_link']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/', self.admin_site.admin_view(self.download),
+                 name='common_auditlogarchive_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk):
+        archive = AuditLogArchive.objects.filter(pk=pk).first()
+        if archive is None or not self.has_view_permission(request, archive):
+            raise Http404
+        return FileResponse(archive.file.open('rb'), as_attachment=True,
+                            filename=archive.file.name.rsplit('/', 1)[-1])
+
+    def download_link(self, obj):
+        url = reverse('admin:common_auditlogarchive_download', args=[obj.pk], current_app=self.admin_site.name)
+        return format_html('<a class="button" href="{}">Download</a>', url)
+
+    download_link.short_description = 'Archive'
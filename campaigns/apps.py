@@ -7,3 +7,9 @@ class CampaignsConfig(AppConfig):
     
     def ready(self):
         import campaigns.signals  # Adjust path to your app name
+        import campaigns.counters  # noqa: F401 (registers the cached counters)
+        from libs.auditbuffer import connect_receivers
+        connect_receivers()
+        from django_q.signals import post_execute
+        from libs.metrics import record_task
+        post_execute.connect(record_task, dispatch_uid="metrics:record_task")
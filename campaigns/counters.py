@@ -0,0 +1,32 @@
+"""
+Admin dashboard counters (see ``libs.counters``), shown by ``CustomAdminSite``.
+"""
+from django_q.models import Failure, Task
+
+from campaigns.models import Donation, FundWithdrawalRequest
+from libs import counters
+
+PENDING_WITHDRAWALS = "pending_withdrawals"
+PENDING_DONATIONS = "pending_donations"
+FAILED_TASKS = "failed_tasks"
+
+ADMIN_COUNTERS = (PENDING_WITHDRAWALS, PENDING_DONATIONS, FAILED_TASKS)
+
+counters.register(
+    PENDING_WITHDRAWALS,
+    lambda: FundWithdrawalRequest.objects.filter(is_approved=False).count(),
+    models=[FundWithdrawalRequest],
+)
+counters.register(
+    PENDING_DONATIONS,
+    lambda: Donation.objects.filter(status=Donation.Status.PENDING).count(),
+    models=[Donation],
+)
+# django-q writes results through Task; the admin deletes through Failure.
+# Successful tasks never change the count.
+counters.register(
+    FAILED_TASKS,
+    lambda: Failure.objects.count(),
+    models=[Task, Failure],
+    condition=lambda task: task.success is False,
+)
@@ -0,0 +1,60 @@
+import statistics
+import time
+from contextlib import nullcontext
+
+from auditlog.context import disable_auditlog
+from auditlog.models import LogEntry
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from campaigns.models import Campaign, Donation
+from libs.auditbuffer import buffered_auditlog
+
+
+class Command(BaseCommand):
+    help = ("Benchmark donation write latency with synchronous vs buffered audit logging. "
+            "Creates and afterwards deletes a scratch campaign with its donations and log entries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writes", type=int, default=500, help="Donations created (and updated) per mode.")
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username="bench-auditlog")
+        with disable_auditlog():
+            campaign = Campaign.objects.create(title="Audit log benchmark", description="-", organizer=user,
+                                               goal_amount=1)
+        try:
+            self._run("no audit log", campaign, options["writes"], disable_auditlog)
+            self._run("sync (auditlog)", campaign, options["writes"], nullcontext)
+            self._run("buffered, autocommit", campaign, options["writes"], buffered_auditlog)
+            self._run("buffered, one transaction", campaign, options["writes"], buffered_auditlog, atomic=True)
+        finally:
+            donation_ids = list(Donation.objects.filter(campaign=campaign).values_list("pk", flat=True))
+            LogEntry.objects.filter(content_type=ContentType.objects.get_for_model(Donation),
+                                    object_id__in=donation_ids).delete()
+            with disable_auditlog():
+                campaign.hard_delete()
+            LogEntry.objects.filter(content_type=ContentType.objects.get_for_model(Campaign),
+                                    object_id=campaign.pk).delete()
+
+    def _run(self, label, campaign, writes, context, atomic=False):
+        latencies = []
+        entries_before = LogEntry.objects.count()
+        started = time.perf_counter()
+        with context(), (transaction.atomic() if atomic else nullcontext()):
+            for i in range(writes):
+                t = time.perf_counter()
+                donation = Donation.objects.create(campaign=campaign, amount=i + 1)
+                donation.amount += 1
+                donation.save()
+                latencies.append(time.perf_counter() - t)
+        total = time.perf_counter() - started  # includes the flush
+        logged = LogEntry.objects.count() - entries_before
+        latencies.sort()
+        self.stdout.write(
+            f"{label:<28} mean {statistics.mean(latencies) * 1000:6.2f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.2f} ms  "
+            f"total {total:6.2f}s  {logged} entries"
+        )
@@ -0,0 +1,36 @@
+import time
+from io import BytesIO
+import uuid
+
+import qrcode
+from django.core.management.base import BaseCommand
+
+from campaigns.models import DONATION_BASE_URL
+from libs.qrcodes import QRBatchEncoder
+
+
+class Command(BaseCommand):
+    help = "Benchmark QR code generation: qrcode.make vs the batch encoder (PNG and SVG)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=2000, help="Number of distinct codes to generate.")
+
+    def handle(self, *args, **options):
+        urls = [f"{DONATION_BASE_URL}{uuid.uuid4()}" for _ in range(options["count"])]
+
+        def qrcode_make(url):
+            image = qrcode.make(url)
+            image.save(BytesIO(), format="PNG")
+
+        encoder = QRBatchEncoder()
+        self._run("qrcode.make (PNG)", urls, qrcode_make)
+        self._run("batch encoder (PNG)", urls, encoder.png)
+        self._run("batch encoder (SVG, cached matrix)", urls, encoder.svg)
+        self._run("batch encoder (SVG, cold)", urls, QRBatchEncoder().svg)
+
+    def _run(self, label, urls, render):
+        started = time.perf_counter()
+        for url in urls:
+            render(url)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<36} {len(urls) / elapsed:>10.0f} codes/s ({elapsed:.2f}s)")
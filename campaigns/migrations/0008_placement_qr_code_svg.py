@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-19 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0007_alter_donation_transaction_id'),
+        ('common', '0004_filevariant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placement',
+            name='qr_code_svg',
+            field=models.ForeignKey(blank=True, help_text='Resolution-independent SVG version of the QR code.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='qr_code_svg', to='common.file'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0009_donation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='When the object was soft deleted.', null=True),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='When the object was soft deleted.', null=True),
+        ),
+        migrations.AddField(
+            model_name='placement',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, help_text='When the object was soft deleted.', null=True),
+        ),
+    ]
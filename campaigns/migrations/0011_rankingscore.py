@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0010_softdelete_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(help_text="Ranking board, e.g. 'trending' or 'top_donors:<campaign id>'.", max_length=64)),
+                ('member', models.BigIntegerField(help_text='Id of the ranked object.')),
+                ('score', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Ranking Score',
+                'verbose_name_plural': 'Ranking Scores',
+                'indexes': [models.Index(fields=['board', '-score'], name='ranking_board_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'member'), name='unique_ranking_member')],
+            },
+        ),
+    ]
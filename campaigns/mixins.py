@@ -1,11 +1,113 @@
-from django.db import models
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.utils import timezone
+
+from libs.auditbuffer import save_log_entry
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    """
+    ``delete()`` soft-deletes the whole queryset with one ``UPDATE``, then
+    does the same for the relations named in the model's
+    ``soft_delete_cascade``. ``restore()`` undoes it, including the children
+    deleted by the same cascade (matched on ``deleted_at``). Each call writes
+    one audit log entry listing the affected ids instead of one per row.
+    Like ``QuerySet.delete()``, both return ``(total, {model label: count})``
+    with the cascaded rows included.
+    """
+
+    def delete(self):
+        return self.soft_delete()
+
+    delete.queryset_only = True
+
+    def hard_delete(self):
+        return super().delete()
+
+    hard_delete.queryset_only = True
+
+    def soft_delete(self):
+        with transaction.atomic():
+            affected = self._set_deleted(True, timezone.now())
+            _log_bulk_change(self.model, affected, "soft delete")
+        return _counts(affected)
+
+    def restore(self):
+        with transaction.atomic():
+            affected = self._set_deleted(False)
+            _log_bulk_change(self.model, affected, "restore")
+        return _counts(affected)
+
+    def _set_deleted(self, deleted, deleted_at=None, affected=None):
+        """
+        Flip ``is_deleted`` on the rows not already in that state and cascade;
+        returns ``{model label: [pk, ...]}`` of the rows changed.
+        """
+        affected = {} if affected is None else affected
+        rows = list(self.filter(is_deleted=not deleted).values_list("pk", "deleted_at"))
+        if not rows:
+            return affected
+        pks = [pk for pk, _ in rows]
+        self.model._base_manager.filter(pk__in=pks).update(is_deleted=deleted, deleted_at=deleted_at)
+        affected.setdefault(self.model._meta.label, []).extend(pks)
+
+        for relation in getattr(self.model, "soft_delete_cascade", ()):
+            field = self.model._meta.get_field(relation)
+            children = SoftDeleteQuerySet(field.related_model)
+            fk = field.field.name
+            if deleted:
+                children.filter(**{f"{fk}__in": pks})._set_deleted(True, deleted_at, affected)
+            else:
+                # only what was deleted together with its parent
+                by_time = {}
+                for pk, parent_deleted_at in rows:
+                    by_time.setdefault(parent_deleted_at, []).append(pk)
+                for parent_deleted_at, parent_pks in by_time.items():
+                    if parent_deleted_at is not None:
+                        children.filter(**{f"{fk}__in": parent_pks, "deleted_at": parent_deleted_at}) \
+                            ._set_deleted(False, None, affected)
+        return affected
+
+
+def _counts(affected):
+    per_label = {label: len(pks) for label, pks in affected.items()}
+    return sum(per_label.values()), per_label
+
+
+def _log_bulk_change(model, affected, operation):
+    ids = affected.get(model._meta.label)
+    if not ids:
+        return
+    deleted = operation == "soft delete"
+    save_log_entry(LogEntry(
+        content_type=ContentType.objects.get_for_model(model),
+        object_pk="",
+        object_repr=f"Bulk {operation} of {len(ids)} {model._meta.verbose_name_plural}",
+        action=LogEntry.Action.UPDATE,
+        changes={"is_deleted": [str(not deleted), str(deleted)]},
+        additional_data={"bulk": operation, "objects": affected},
+    ))
+
 
 class SoftDeleteMixin(models.Model):
     is_deleted = models.BooleanField(default=False, help_text="Soft delete flag.")
+    deleted_at = models.DateTimeField(null=True, blank=True, help_text="When the object was soft deleted.")
 
     def delete(self, using=None, keep_parents=False):
         self.is_deleted = True
-        self.save(update_fields=["is_deleted"])
+        self.deleted_at = timezone.now()
+        self.save(update_fields=["is_deleted", "deleted_at"])
+        for relation in getattr(self, "soft_delete_cascade", ()):
+            field = self._meta.get_field(relation)
+            children = SoftDeleteQuerySet(field.related_model).filter(**{field.field.name: self})
+            affected = children._set_deleted(True, self.deleted_at)
+            _log_bulk_change(field.related_model, affected, "soft delete")
+
+    def restore(self):
+        SoftDeleteQuerySet(type(self)).filter(pk=self.pk).restore()
+        self.is_deleted = False
+        self.deleted_at = None
 
     def hard_delete(self, using=None, keep_parents=False):
         super().delete(using=using, keep_parents=keep_parents)
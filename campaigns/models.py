@@ -4,10 +4,13 @@ from auditlog.registry import auditlog
 from common.models import File
 from auditlog.models import LogEntry
 from django.contrib.contenttypes.fields import GenericRelation
-from .mixins import SoftDeleteMixin
+from .mixins import SoftDeleteMixin, SoftDeleteQuerySet
 import uuid
 
-class ActiveManager(models.Manager):
+DONATION_BASE_URL = "https://jadwalshalat.net/donation/"
+
+
+class ActiveManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
     def get_queryset(self):
         return super().get_queryset().filter(is_deleted=False)
 
@@ -38,7 +41,9 @@ class Campaign(SoftDeleteMixin, models.Model):
     audit_logs = GenericRelation(LogEntry)
 
     objects = ActiveManager()  # only non-deleted by default
-    all_objects = models.Manager()  # in case you still want full access somewhere
+    all_objects = SoftDeleteQuerySet.as_manager()  # in case you still want full access somewhere
+
+    soft_delete_cascade = ("placements", "expenses")
 
     class Meta:
         verbose_name = "Campaign"
@@ -61,6 +66,8 @@ class Placement(SoftDeleteMixin, models.Model):
     url = models.URLField(blank=True, null=True, help_text="URL where this placement leads to.")
     qr_code = models.ForeignKey(File, on_delete=models.SET_NULL, blank=True, null=True, related_name="qr_code",
                                 help_text="QR code image for offline tracking.")
+    qr_code_svg = models.ForeignKey(File, on_delete=models.SET_NULL, blank=True, null=True, related_name="qr_code_svg",
+                                    help_text="Resolution-independent SVG version of the QR code.")
     donation_card = models.ForeignKey(File, on_delete=models.SET_NULL, blank=True, null=True, related_name="donation_card",
                                 help_text="QR code image for offline tracking.")
     created_at = models.DateTimeField(auto_now_add=True, help_text="Timestamp when the placement was created.")
@@ -70,7 +77,7 @@ class Placement(SoftDeleteMixin, models.Model):
     audit_logs = GenericRelation(LogEntry)
 
     objects = ActiveManager()  # only non-deleted by default
-    all_objects = models.Manager()  # in case you still want full access somewhere
+    all_objects = SoftDeleteQuerySet.as_manager()  # in case you still want full access somewhere
 
     class Meta:
         verbose_name = "Placement"
@@ -79,6 +86,9 @@ class Placement(SoftDeleteMixin, models.Model):
     def __str__(self):
         return f"{self.name} - {self.campaign.title}"
 
+    def get_default_url(self):
+        return f"{DONATION_BASE_URL}{self.external_id}"
+
 auditlog.register(Placement)
 
 class Donation(models.Model):
@@ -111,6 +121,12 @@ class Donation(models.Model):
     class Meta:
         verbose_name = "Donation"
         verbose_name_plural = "Donations"
+        indexes = [
+            # admin changelist: date/allocation/status filters, newest first
+            models.Index(fields=["timestamp"], name="donation_timestamp_idx"),
+            models.Index(fields=["is_fully_allocated", "timestamp"], name="donation_allocated_ts_idx"),
+            models.Index(fields=["status", "timestamp"], name="donation_status_ts_idx"),
+        ]
 
     def __str__(self):
         return f"Donation of {self.amount} to {self.campaign.title}"
@@ -134,7 +150,7 @@ class Expense(SoftDeleteMixin, models.Model):
     audit_logs = GenericRelation(LogEntry)
 
     objects = ActiveManager()  # only non-deleted by default
-    all_objects = models.Manager()  # in case you still want full access somewhere
+    all_objects = SoftDeleteQuerySet.as_manager()  # in case you still want full access somewhere
 
     class Meta:
         verbose_name = "Expense"
@@ -193,3 +209,26 @@ class FundWithdrawalRequest(models.Model):
         return f"Withdrawal Request: {self.amount} from {self.campaign.title}"
 
 auditlog.register(FundWithdrawalRequest)
+
+
+class RankingScore(models.Model):
+    """
+    Database fallback for the ranking boards in ``campaigns.rankings`` (used
+    when the cache is not Redis): one row per board member.
+    """
+    board = models.CharField(max_length=64, help_text="Ranking board, e.g. 'trending' or 'top_donors:<campaign id>'.")
+    member = models.BigIntegerField(help_text="Id of the ranked object.")
+    score = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = "Ranking Score"
+        verbose_name_plural = "Ranking Scores"
+        constraints = [
+            models.UniqueConstraint(fields=["board", "member"], name="unique_ranking_member"),
+        ]
+        indexes = [
+            models.Index(fields=["board", "-score"], name="ranking_board_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.board}: {self.member} ({self.score})"
@@ -0,0 +1,254 @@
+"""
+Precomputed campaign rankings.
+
+Boards are sorted sets of ``member id -> score``, kept up to date from
+signals (see ``campaigns.signals``) so a ranked feed is one range read of
+``k`` members plus one query for those campaigns:
+
+- ``trending``: donation velocity. Each successful donation adds
+  ``amount * 2 ** ((timestamp - epoch) / half life)``. Scores therefore decay
+  without rewriting them: ordering by the stored score equals ordering by
+  the decayed sum. ``rebuild_rankings`` recomputes the board nightly from
+  the last ``RANKING_TRENDING_WINDOW`` and moves the epoch forward, which
+  keeps the exponents small.
+- ``nearly_funded``: ``total_donated / goal_amount`` of active campaigns
+  that have some donations but have not reached their goal.
+- ``top_donors:<campaign id>``: total successful donations per donor.
+
+Boards live in a Redis sorted set when the default cache is Redis, and in
+the ``RankingScore`` table otherwise (``RANKINGS_BACKEND`` forces either).
+Incremental updates can drift (e.g. bulk updates send no signals); the
+nightly rebuild corrects them.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from campaigns.models import Campaign, Donation, RankingScore
+
+logger = logging.getLogger(__name__)
+
+RANKINGS_BACKEND = getattr(settings, "RANKINGS_BACKEND", None)  # "redis" or "db"; default follows the cache
+RANKINGS_KEY_PREFIX = getattr(settings, "RANKINGS_KEY_PREFIX", "rank")
+TRENDING_HALF_LIFE = getattr(settings, "RANKING_TRENDING_HALF_LIFE", 24 * 3600)  # seconds
+TRENDING_WINDOW = getattr(settings, "RANKING_TRENDING_WINDOW", 7 * 24 * 3600)  # seconds
+
+TRENDING = "trending"
+NEARLY_FUNDED = "nearly_funded"
+CAMPAIGN_BOARDS = (TRENDING, NEARLY_FUNDED)
+TOP_DONORS_PREFIX = "top_donors:"
+
+_EPOCH_BOARD = f"{TRENDING}:epoch"
+
+
+def top_donors_board(campaign_id):
+    return f"{TOP_DONORS_PREFIX}{campaign_id}"
+
+
+class RedisRankings:
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, board):
+        return f"{RANKINGS_KEY_PREFIX}:{board}"
+
+    def incr(self, board, member, amount):
+        self.client.zincrby(self._key(board), float(amount), member)
+
+    def set(self, board, member, score):
+        self.client.zadd(self._key(board), {member: float(score)})
+
+    def remove(self, board, member):
+        self.client.zrem(self._key(board), member)
+
+    def score(self, board, member):
+        return self.client.zscore(self._key(board), member)
+
+    def top(self, board, count, offset=0):
+        rows = self.client.zrevrange(self._key(board), offset, offset + count - 1, withscores=True)
+        return [(int(member), score) for member, score in rows]
+
+    def replace(self, board, scores):
+        key = self._key(board)
+        if not scores:
+            self.client.delete(key)
+            return
+        staging = f"{key}:rebuild"
+        pipe = self.client.pipeline()
+        pipe.delete(staging)
+        pipe.zadd(staging, {member: float(score) for member, score in scores.items()})
+        pipe.rename(staging, key)  # readers see the old board or the new one
+        pipe.execute()
+
+    def boards(self, prefix):
+        start = len(RANKINGS_KEY_PREFIX) + 1
+        return [key.decode()[start:] for key in self.client.scan_iter(match=self._key(f"{prefix}*"))
+                if not key.endswith(b":rebuild")]
+
+
+class DatabaseRankings:
+    def incr(self, board, member, amount):
+        amount = float(amount)
+        with transaction.atomic():
+            if RankingScore.objects.filter(board=board, member=member).update(score=F("score") + amount):
+                return
+            try:
+                with transaction.atomic():
+                    RankingScore.objects.create(board=board, member=member, score=amount)
+            except IntegrityError:
+                # created concurrently
+                RankingScore.objects.filter(board=board, member=member).update(score=F("score") + amount)
+
+    def set(self, board, member, score):
+        RankingScore.objects.update_or_create(board=board, member=member, defaults={"score": float(score)})
+
+    def remove(self, board, member):
+        RankingScore.objects.filter(board=board, member=member).delete()
+
+    def score(self, board, member):
+        return RankingScore.objects.filter(board=board, member=member).values_list("score", flat=True).first()
+
+    def top(self, board, count, offset=0):
+        return list(RankingScore.objects.filter(board=board).order_by("-score", "member")
+                    .values_list("member", "score")[offset:offset + count])
+
+    def replace(self, board, scores):
+        with transaction.atomic():
+            RankingScore.objects.filter(board=board).delete()
+            RankingScore.objects.bulk_create(
+                [RankingScore(board=board, member=member, score=float(score)) for member, score in scores.items()],
+                batch_size=1000,
+            )
+
+    def boards(self, prefix):
+        return list(RankingScore.objects.filter(board__startswith=prefix)
+                    .values_list("board", flat=True).distinct())
+
+
+def get_backend():
+    cache = caches["default"]
+    use_redis = RANKINGS_BACKEND == "redis" or (RANKINGS_BACKEND is None and isinstance(cache, RedisCache))
+    if use_redis:
+        return RedisRankings(cache._cache.get_client(write=True))
+    return DatabaseRankings()
+
+
+# ---------- scoring ----------
+
+def _trending_epoch(backend):
+    epoch = backend.score(_EPOCH_BOARD, 0)
+    if epoch is None:
+        epoch = time.time()
+        backend.set(_EPOCH_BOARD, 0, epoch)
+    return epoch
+
+
+def _trending_weight(timestamp, epoch):
+    return 2 ** ((timestamp.timestamp() - epoch) / TRENDING_HALF_LIFE)
+
+
+def _funded_ratio(campaign):
+    if campaign.is_deleted or not campaign.is_active or not campaign.goal_amount:
+        return None
+    ratio = float(campaign.total_donated / campaign.goal_amount)
+    return ratio if 0 < ratio < 1 else None
+
+
+def record_donation(donation, sign=1):
+    """
+    Add a successful donation to the trending and top donor boards, or with
+    ``sign=-1`` take it out again (e.g. a refunded donation).
+    """
+    backend = get_backend()
+    weight = _trending_weight(donation.timestamp, _trending_epoch(backend))
+    backend.incr(TRENDING, donation.campaign_id, sign * float(donation.amount) * weight)
+    if donation.donor_id:
+        backend.incr(top_donors_board(donation.campaign_id), donation.donor_id, sign * float(donation.amount))
+
+
+def update_campaign(campaign):
+    """
+    Re-score a campaign on the boards that depend on its own fields.
+    """
+    backend = get_backend()
+    ratio = _funded_ratio(campaign)
+    if ratio is None:
+        backend.remove(NEARLY_FUNDED, campaign.pk)
+    else:
+        backend.set(NEARLY_FUNDED, campaign.pk, ratio)
+    if campaign.is_deleted or not campaign.is_active:
+        backend.remove(TRENDING, campaign.pk)
+
+
+def rebuild_rankings():
+    """
+    Recompute every board from the database. Scheduled nightly.
+    """
+    backend = get_backend()
+    since = timezone.now() - timedelta(seconds=TRENDING_WINDOW)
+    epoch = since.timestamp()
+    successful = Donation.objects.filter(status=Donation.Status.SUCCESS)
+
+    trending = defaultdict(float)
+    recent = successful.filter(campaign__is_deleted=False, campaign__is_active=True, timestamp__gte=since)
+    for campaign_id, amount, timestamp in recent.values_list("campaign_id", "amount", "timestamp").iterator():
+        trending[campaign_id] += float(amount) * _trending_weight(timestamp, epoch)
+    # epoch first: donations recorded in between are weighted against the new one
+    backend.set(_EPOCH_BOARD, 0, epoch)
+    backend.replace(TRENDING, trending)
+
+    nearly_funded = {}
+    for campaign in Campaign.objects.filter(is_active=True, goal_amount__gt=0) \
+            .only("pk", "is_active", "is_deleted", "goal_amount", "total_donated").iterator():
+        ratio = _funded_ratio(campaign)
+        if ratio is not None:
+            nearly_funded[campaign.pk] = ratio
+    backend.replace(NEARLY_FUNDED, nearly_funded)
+
+    donors = defaultdict(dict)
+    rows = successful.filter(donor__isnull=False).values("campaign_id", "donor_id").annotate(total=Sum("amount"))
+    for row in rows.iterator():
+        donors[row["campaign_id"]][row["donor_id"]] = float(row["total"])
+    for campaign_id, scores in donors.items():
+        backend.replace(top_donors_board(campaign_id), scores)
+    stale = set(backend.boards(TOP_DONORS_PREFIX)) - {top_donors_board(pk) for pk in donors}
+    for board in stale:
+        backend.replace(board, {})
+
+    logger.info(f"Rankings rebuilt: {len(trending)} trending, {len(nearly_funded)} nearly funded, "
+                f"{len(donors)} top donor board(s)")
+    return {"trending": len(trending), "nearly_funded": len(nearly_funded), "top_donors": len(donors)}
+
+
+# ---------- reads ----------
+
+def top(board, count, offset=0):
+    """
+    ``[(member id, score), ...]`` best first. Trending scores are scaled to
+    the current time, i.e. a decayed donation sum.
+    """
+    backend = get_backend()
+    rows = backend.top(board, count, offset)
+    if board == TRENDING and rows:
+        scale = 2 ** (-(time.time() - _trending_epoch(backend)) / TRENDING_HALF_LIFE)
+        rows = [(member, score * scale) for member, score in rows]
+    return rows
+
+
+def ranked_campaigns(board, queryset, count, offset=0):
+    """
+    The campaigns of ``queryset`` on ``board`` at ranks ``offset`` to
+    ``offset + count``, best first, as ``[(campaign, score), ...]``. Members
+    filtered out by ``queryset`` (e.g. deleted since) leave the page short.
+    """
+    rows = top(board, count, offset)
+    campaigns = queryset.in_bulk([member for member, _ in rows])
+    return [(campaigns[member], score) for member, score in rows if member in campaigns]
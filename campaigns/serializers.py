@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from .models import (
     Campaign,
@@ -7,19 +9,25 @@ from .models import (
     FundAllocation,
     FundWithdrawalRequest
 )
-from common.serializers import FileLiteSerializer, serialize_fields
+from .services import sync_expenses, sync_placements
+from common.serializers import FileListSerializer, FileLiteSerializer, serialize_fields
+from libs.metrics import TimedSerializerMixin
 
+BULK_PLACEMENT_MAX_ITEMS = getattr(settings, "BULK_PLACEMENT_MAX_ITEMS", 1000)
 
-class PlacementSerializer(serializers.ModelSerializer):
+
+class PlacementSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     campaign = serializers.SlugRelatedField(
         slug_field='external_id',
         queryset=Campaign.objects.all()
     )
+    file_fields = ('qr_code', 'qr_code_svg', 'donation_card')
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         serialize_fields(instance, representation, {
             'qr_code': (FileLiteSerializer, False),
+            'qr_code_svg': (FileLiteSerializer, False),
             'donation_card': (FileLiteSerializer, False),
         })
         return representation
@@ -27,11 +35,27 @@ class PlacementSerializer(serializers.ModelSerializer):
     class Meta:
         model = Placement
         exclude = ['id']
-        read_only_fields = ['created_at', 'is_deleted',
-                            'qr_code', 'donation_card', 'url', 'created_by']
+        read_only_fields = ['created_at', 'is_deleted', 'deleted_at',
+                            'qr_code', 'qr_code_svg', 'donation_card', 'url', 'created_by']
+        list_serializer_class = FileListSerializer
+
+
+class PlacementBulkItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Placement
+        fields = ['name']
+
+
+class PlacementBulkCreateSerializer(serializers.Serializer):
+    campaign = serializers.SlugRelatedField(
+        slug_field='external_id',
+        queryset=Campaign.objects.all()
+    )
+    placements = PlacementBulkItemSerializer(many=True, allow_empty=False,
+                                             max_length=BULK_PLACEMENT_MAX_ITEMS)
 
 
-class DonationSerializer(serializers.ModelSerializer):
+class DonationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # User only provides placement; campaign is inferred
     campaign = serializers.SlugRelatedField(
         slug_field='external_id',
@@ -60,11 +84,12 @@ class DonationSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class ExpenseSerializer(serializers.ModelSerializer):
+class ExpenseSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     campaign = serializers.SlugRelatedField(
         slug_field='external_id',
         queryset=Campaign.objects.all()
     )
+    file_fields = ('receipt',)
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -76,10 +101,11 @@ class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
         exclude = ['id']
-        read_only_fields = ['timestamp', 'is_deleted', 'created_by']
+        read_only_fields = ['timestamp', 'is_deleted', 'deleted_at', 'created_by']
+        list_serializer_class = FileListSerializer
 
 
-class FundAllocationSerializer(serializers.ModelSerializer):
+class FundAllocationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     donation = serializers.SlugRelatedField(
         slug_field='external_id',
         queryset=Donation.objects.all()
@@ -94,7 +120,7 @@ class FundAllocationSerializer(serializers.ModelSerializer):
         exclude = ['id']
 
 
-class FundWithdrawalRequestSerializer(serializers.ModelSerializer):
+class FundWithdrawalRequestSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     campaign = serializers.SlugRelatedField(
         slug_field='external_id',
         queryset=Campaign.objects.all()
@@ -107,7 +133,9 @@ class FundWithdrawalRequestSerializer(serializers.ModelSerializer):
                             'reviewed_by', 'requested_by', 'is_approved']
 
 
-class CampaignListSerializer(serializers.ModelSerializer):
+class CampaignListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    file_fields = ('featured_image',)
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         serialize_fields(instance, representation, {
@@ -119,12 +147,27 @@ class CampaignListSerializer(serializers.ModelSerializer):
         model = Campaign
         fields = ['external_id', 'title', 'description', 'goal_amount', 'total_donated',
                   'unallocated_amount', 'is_active', 'verified', 'featured_image']
+        list_serializer_class = FileListSerializer
+
+
+class NestedPlacementSerializer(PlacementSerializer):
+    """
+    Placement inside a campaign payload: the campaign is the parent, and an
+    ``external_id`` refers to an existing placement of it.
+    """
+    campaign = serializers.SlugRelatedField(slug_field='external_id', read_only=True)
+    external_id = serializers.UUIDField(required=False)
+
 
+class NestedExpenseSerializer(ExpenseSerializer):
+    campaign = serializers.SlugRelatedField(slug_field='external_id', read_only=True)
+    external_id = serializers.UUIDField(required=False)
 
-class CampaignDetailSerializer(serializers.ModelSerializer):
-    placements = PlacementSerializer(many=True, read_only=True)
+
+class CampaignDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    placements = NestedPlacementSerializer(many=True, required=False)
     donations = DonationSerializer(many=True, read_only=True)
-    expenses = ExpenseSerializer(many=True, read_only=True)
+    expenses = NestedExpenseSerializer(many=True, required=False)
     withdrawal_requests = FundWithdrawalRequestSerializer(many=True, read_only=True)
 
     def to_representation(self, instance):
@@ -135,6 +178,33 @@ class CampaignDetailSerializer(serializers.ModelSerializer):
         })
         return representation
 
+    def _validate_children(self, items, related_name):
+        ids = [item['external_id'] for item in items if 'external_id' in item]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Duplicate external_id.")
+        known = set()
+        if self.instance is not None and ids:
+            known = set(getattr(self.instance, related_name)
+                        .filter(external_id__in=ids).values_list('external_id', flat=True))
+        unknown = [str(i) for i in ids if i not in known]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown external_id for this campaign: {', '.join(unknown)}.")
+        return items
+
+    def validate_placements(self, items):
+        return self._validate_children(items, 'placements')
+
+    def validate_expenses(self, items):
+        return self._validate_children(items, 'expenses')
+
+    def _children_author(self, campaign):
+        request = self.context.get('request')
+        if request is not None and request.user.is_authenticated:
+            return request.user
+        return campaign.organizer
+
+    @transaction.atomic
     def create(self, validated_data):
         placements_data = validated_data.pop('placements', [])
         expenses_data = validated_data.pop('expenses', [])
@@ -145,17 +215,22 @@ class CampaignDetailSerializer(serializers.ModelSerializer):
         if images_data:
             campaign.images.set(images_data)
 
-        for placement_data in placements_data:
-            Placement.objects.create(campaign=campaign, **placement_data)
-
-        for expense_data in expenses_data:
-            Expense.objects.create(campaign=campaign, **expense_data)
+        # keep the default placement created on save
+        author = self._children_author(campaign)
+        sync_placements(campaign, placements_data, author, remove_missing=False)
+        sync_expenses(campaign, expenses_data, author, remove_missing=False)
 
         return campaign
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        placements_data = validated_data.pop('placements', [])
-        expenses_data = validated_data.pop('expenses', [])
+        """
+        Nested ``placements`` / ``expenses``, when present, replace the
+        campaign's children by diffing on ``external_id`` (see
+        ``campaigns.services.sync_placements``); when absent they are left as is.
+        """
+        placements_data = validated_data.pop('placements', None)
+        expenses_data = validated_data.pop('expenses', None)
         images_data = validated_data.pop('images', None)
 
         instance = super().update(instance, validated_data)
@@ -163,13 +238,11 @@ class CampaignDetailSerializer(serializers.ModelSerializer):
         if images_data is not None:
             instance.images.set(images_data)
 
-        instance.placements.all().delete()
-        for placement_data in placements_data:
-            Placement.objects.create(campaign=instance, **placement_data)
-
-        instance.expenses.all().delete()
-        for expense_data in expenses_data:
-            Expense.objects.create(campaign=instance, **expense_data)
+        author = self._children_author(instance)
+        if placements_data is not None:
+            sync_placements(instance, placements_data, author)
+        if expenses_data is not None:
+            sync_expenses(instance, expenses_data, author)
 
         return instance
 
@@ -177,6 +250,6 @@ class CampaignDetailSerializer(serializers.ModelSerializer):
         model = Campaign
         exclude = ['id']
         read_only_fields = [
-            'total_donated', 'is_deleted', 'verified',
+            'total_donated', 'is_deleted', 'deleted_at', 'verified',
             'unallocated_amount', 'start_date', 'organizer'
         ]
\ No newline at end of file
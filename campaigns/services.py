@@ -0,0 +1,226 @@
+from copy import copy
+
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from campaigns.counters import PENDING_WITHDRAWALS
+from campaigns.models import Campaign, Expense, FundWithdrawalRequest, Placement
+from campaigns.signals import normalize_uploaded_image
+from campaigns.tasks import generate_placement_assets
+from libs import counters
+from libs.auditbuffer import log_bulk_write
+from libs.queues import IMAGES, enqueue
+
+BULK_CREATE_BATCH_SIZE = getattr(settings, "BULK_CREATE_BATCH_SIZE", 500)
+
+
+def bulk_create_placements(campaign, items, created_by):
+    """
+    Create many placements for a campaign with a handful of queries.
+
+    ``external_id`` and the autogenerated donation URL are assigned up front,
+    rows are inserted with ``bulk_create`` (no per-row save signals, so the
+    audit entries are written here), and a single batched QR + donation card
+    job is enqueued for the whole set once the insert commits.
+
+    :param campaign: Campaign the placements belong to.
+    :param items: Iterable of dicts with placement field values (e.g. ``name``).
+    :param created_by: User recorded as the creator.
+    :return: The created placements.
+    """
+    placements = []
+    for item in items:
+        placement = Placement(campaign=campaign, created_by=created_by, **item)
+        if not placement.url:
+            placement.url = f"{placement.get_default_url()}#autogenerated"
+        placements.append(placement)
+
+    if not placements:
+        return placements
+
+    with transaction.atomic():
+        _bulk_create(Placement, placements)
+        log_bulk_write(LogEntry.Action.CREATE, placements)
+        # not before the rows are visible to the worker, and never after a rollback
+        pks = [p.pk for p in placements]
+        transaction.on_commit(lambda: enqueue(generate_placement_assets, pks, queue=IMAGES))
+    return placements
+
+
+def _bulk_create(model, objects):
+    model.objects.bulk_create(objects, batch_size=BULK_CREATE_BATCH_SIZE)
+
+    if any(obj.pk is None for obj in objects):
+        # Backends that cannot return inserted primary keys.
+        ids = dict(model.objects.filter(
+            external_id__in=[obj.external_id for obj in objects]
+        ).values_list("external_id", "id"))
+        for obj in objects:
+            obj.pk = ids[obj.external_id]
+
+
+def _diff_children(existing, items):
+    """
+    Match payload items to existing children on ``external_id``.
+
+    :return: ``(changed, old, changed_fields, new_items, removed)``: rows to
+        ``bulk_update`` with their pre-update copies and the union of the
+        fields that differ, items without an ``external_id``, and existing rows
+        missing from the payload.
+    """
+    by_id = {child.external_id: child for child in existing}
+    changed, old, changed_fields, new_items = [], [], set(), []
+    for item in items:
+        item = dict(item)
+        child = by_id.pop(item.pop("external_id", None), None)
+        if child is None:
+            new_items.append(item)
+            continue
+        fields = {name for name, value in item.items() if getattr(child, name) != value}
+        if fields:
+            old.append(copy(child))
+            for name in fields:
+                setattr(child, name, item[name])
+            changed.append(child)
+            changed_fields |= fields
+    return changed, old, changed_fields, new_items, list(by_id.values())
+
+
+def _sync_children(model, queryset, items, remove_missing):
+    changed, old, fields, new_items, removed = _diff_children(queryset, items)
+    if changed:
+        model.objects.bulk_update(changed, sorted(fields), batch_size=BULK_CREATE_BATCH_SIZE)
+        log_bulk_write(LogEntry.Action.UPDATE, changed, old, fields=sorted(fields))
+    if removed and remove_missing:
+        model.objects.filter(pk__in=[child.pk for child in removed]).delete()
+    return changed, old, new_items
+
+
+def sync_placements(campaign, items, created_by, remove_missing=True):
+    """
+    Upsert a campaign's placements from a nested payload, keyed on
+    ``external_id``: changed rows are written with one ``bulk_update``, new
+    ones through :func:`bulk_create_placements`, and placements missing from
+    the payload are soft-deleted. QR codes and cards are only generated for
+    new placements (``url`` is read-only, so existing ones keep theirs).
+
+    :param campaign: Campaign the placements belong to.
+    :param items: Validated item dicts; ``external_id`` marks existing rows.
+    :param created_by: User recorded as the creator of new placements.
+    :param remove_missing: Soft-delete placements absent from ``items``.
+    """
+    existing = campaign.placements.select_related("campaign")
+    _changed, _old, new_items = _sync_children(Placement, existing, items, remove_missing)
+
+    bulk_create_placements(campaign, new_items, created_by)
+
+
+def sync_expenses(campaign, items, created_by, remove_missing=True):
+    """
+    Upsert a campaign's expenses from a nested payload, keyed on
+    ``external_id``; see :func:`sync_placements`.
+    """
+    existing = campaign.expenses.select_related("campaign", "receipt")
+    changed, old, new_items = _sync_children(Expense, existing, items, remove_missing)
+
+    created = [Expense(campaign=campaign, created_by=created_by, **item) for item in new_items]
+    if created:
+        _bulk_create(Expense, created)
+        log_bulk_write(LogEntry.Action.CREATE, created)
+
+    # what normalize_expense_receipt does on save
+    receipts = {expense.receipt_id: expense.receipt for expense in created + changed if expense.receipt_id}
+    for receipt in receipts.values():
+        normalize_uploaded_image(receipt)
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, withdrawal):
+        super().__init__(f"Campaign {withdrawal.campaign_id} cannot cover withdrawal {withdrawal.external_id} "
+                         f"of {withdrawal.amount}")
+        self.withdrawal = withdrawal
+
+
+def approve_withdrawals(withdrawal_ids, reviewed_by):
+    """
+    Approve pending withdrawal requests against their campaigns' unallocated
+    balance, in one transaction.
+
+    The requests and then their campaigns are locked with ``select_for_update``
+    (campaigns in primary key order, so concurrent batches cannot deadlock).
+    Per campaign, requests are taken oldest first while the balance covers
+    them, and the balance is decremented with one conditional
+    ``UPDATE ... WHERE unallocated_amount >= total``. Requests that do not
+    fit stay pending; requests already approved are ignored.
+
+    :param withdrawal_ids: Primary keys of the requests to approve.
+    :param reviewed_by: Admin recorded as the reviewer.
+    :return: ``(approved, insufficient)`` lists of ``FundWithdrawalRequest``.
+    """
+    with transaction.atomic():
+        pending = list(
+            FundWithdrawalRequest.objects.select_for_update()
+            .filter(pk__in=withdrawal_ids, is_approved=False)
+            .order_by("campaign_id", "timestamp", "pk")
+        )
+        if not pending:
+            return [], []
+        campaigns = {
+            campaign.pk: campaign for campaign in
+            Campaign.all_objects.select_for_update().filter(pk__in={w.campaign_id for w in pending}).order_by("pk")
+        }
+
+        approved, insufficient, totals = [], [], {}
+        for withdrawal in pending:
+            campaign = campaigns[withdrawal.campaign_id]
+            total = totals.get(campaign.pk, 0) + withdrawal.amount
+            if total <= campaign.unallocated_amount:
+                totals[campaign.pk] = total
+                approved.append(withdrawal)
+            else:
+                insufficient.append(withdrawal)
+
+        for campaign_id, total in totals.items():
+            updated = Campaign.all_objects.filter(pk=campaign_id, unallocated_amount__gte=total) \
+                .update(unallocated_amount=F("unallocated_amount") - total)
+            if not updated:
+                # the row lock makes this unreachable unless the balance is written without it
+                raise InsufficientFunds(next(w for w in approved if w.campaign_id == campaign_id))
+        if not approved:
+            return approved, insufficient
+
+        reviewed_at = timezone.now()
+        FundWithdrawalRequest.objects.filter(pk__in=[w.pk for w in approved]).update(
+            is_approved=True, reviewed_by=reviewed_by, reviewed_at=reviewed_at)
+
+        old_withdrawals = [copy(w) for w in approved]
+        for withdrawal in approved:
+            withdrawal.is_approved = True
+            withdrawal.reviewed_by = reviewed_by
+            withdrawal.reviewed_at = reviewed_at
+            withdrawal.campaign = campaigns[withdrawal.campaign_id]
+        changed_campaigns = [campaigns[pk] for pk in totals]
+        old_campaigns = [copy(campaign) for campaign in changed_campaigns]
+        for campaign in changed_campaigns:
+            campaign.unallocated_amount -= totals[campaign.pk]
+        log_bulk_write(LogEntry.Action.UPDATE, approved, old_withdrawals,
+                       fields=["is_approved", "reviewed_by", "reviewed_at"])
+        log_bulk_write(LogEntry.Action.UPDATE, changed_campaigns, old_campaigns, fields=["unallocated_amount"])
+
+        # update() sends no signals
+        transaction.on_commit(lambda: counters.invalidate(PENDING_WITHDRAWALS))
+    return approved, insufficient
+
+
+def approve_withdrawal(withdrawal, reviewed_by):
+    """
+    Approve a single request; raises ``InsufficientFunds`` if its campaign
+    cannot cover it.
+    """
+    approved, insufficient = approve_withdrawals([withdrawal.pk], reviewed_by)
+    if insufficient:
+        raise InsufficientFunds(insufficient[0])
+    return approved[0] if approved else None
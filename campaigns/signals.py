@@ -1,10 +1,24 @@
-from django.db.models.signals import pre_save, post_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, m2m_changed
 from django.dispatch import receiver
-from django_q.tasks import async_task
-from campaigns.models import Placement, Campaign
-from campaigns.tasks import generate_qr_for_placement, generate_donation_card
+from campaigns import rankings
+from campaigns.models import Placement, Campaign, Donation, Expense
+from campaigns.tasks import (
+    generate_qr_for_placement,
+    generate_donation_card,
+    generate_donation_cards,
+    generate_placement_assets,
+)
+from common.models import File
+from common.tasks import normalize_file
+from libs.coalesce import coalesced_async_task
+from libs.queues import IMAGES
 from copy import deepcopy
 
+logger = logging.getLogger(__name__)
+
 
 # ==========================
 # Placement Signal
@@ -35,14 +49,16 @@ def run_post_save_tasks_for_placement(sender, instance, created, **kwargs):
     Handles post-save actions for Placement:
     - Generate QR code if missing or URL changed.
     - Generate donation card if created or if relevant field changed.
+
+    Tasks are coalesced per placement, so repeated saves collapse into one run.
+    When both are needed they run as one job, QR code first.
     """
     url_changed = hasattr(instance, '_previous_url') and instance._previous_url != instance.url
     previous = getattr(instance, '_previous', None)
-    if url_changed and '#autogenerated' in instance.url:
+    if url_changed and instance.url and '#autogenerated' in instance.url:
         url_changed = False
 
-    if url_changed or instance.qr_code is None:
-        async_task(generate_qr_for_placement, instance.id)
+    should_generate_qr = url_changed or instance.qr_code is None
 
     should_generate_card = created
     if not created and previous:
@@ -51,8 +67,12 @@ def run_post_save_tasks_for_placement(sender, instance, created, **kwargs):
             url_changed
         )
 
-    if should_generate_card:
-        async_task(generate_donation_card, instance.id)
+    if should_generate_qr and should_generate_card:
+        coalesced_async_task(generate_placement_assets, instance.id, [instance.id], queue=IMAGES)
+    elif should_generate_qr:
+        coalesced_async_task(generate_qr_for_placement, instance.id, instance.id, queue=IMAGES)
+    elif should_generate_card:
+        coalesced_async_task(generate_donation_card, instance.id, instance.id, queue=IMAGES)
 
 
 # ==========================
@@ -83,9 +103,11 @@ def trigger_donation_card_on_campaign_change(sender, instance, **kwargs):
     """
     previous = getattr(instance, '_previous_featured_image', None)
     if previous != instance.featured_image:
-        # Featured image changed → trigger donation card regen for each placement
-        for placement in instance.placements.all():
-            async_task(generate_donation_card, placement.id)
+        # Featured image changed → one batched donation card regen for all placements
+        placement_ids = list(instance.placements.values_list('id', flat=True))
+        if placement_ids:
+            coalesced_async_task(generate_donation_cards, f"campaign-{instance.id}", placement_ids,
+                                 queue=IMAGES)
 
 
 @receiver(post_save, sender=Campaign)
@@ -98,4 +120,76 @@ def create_default_placement(sender, instance, created, **kwargs):
             campaign=instance,
             name="Default Placement",
             created_by=instance.organizer
-        )
\ No newline at end of file
+        )
+
+
+# ==========================
+# Image Normalization
+# ==========================
+
+def normalize_uploaded_image(file_instance):
+    """
+    Queue the normalized master of an uploaded image, unless it is up to date.
+    """
+    if file_instance and not file_instance.has_master:
+        coalesced_async_task(normalize_file, f"file-{file_instance.pk}", file_instance.pk, queue=IMAGES)
+
+
+@receiver(post_save, sender=Campaign)
+def normalize_campaign_featured_image(sender, instance, **kwargs):
+    normalize_uploaded_image(instance.featured_image)
+
+
+@receiver(m2m_changed, sender=Campaign.images.through)
+def normalize_campaign_images(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add" or reverse or not pk_set:
+        return
+    for file_instance in File.objects.filter(pk__in=pk_set):
+        normalize_uploaded_image(file_instance)
+
+
+@receiver(post_save, sender=Expense)
+def normalize_expense_receipt(sender, instance, **kwargs):
+    normalize_uploaded_image(instance.receipt)
+
+
+# ==========================
+# Rankings
+# ==========================
+
+def update_rankings_on_commit(func, *args, **kwargs):
+    """
+    Run a ``campaigns.rankings`` update once the save commits. Failures are
+    only logged: the nightly rebuild catches up.
+    """
+    def run():
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception(f"Rankings update {func.__name__} failed")
+
+    transaction.on_commit(run)
+
+
+@receiver(pre_save, sender=Donation)
+def cache_previous_donation_status(sender, instance, **kwargs):
+    if not instance.pk:
+        instance._previous_status = None
+        return
+    instance._previous_status = Donation.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Donation)
+def update_donation_rankings(sender, instance, **kwargs):
+    """
+    A donation counts towards the rankings while its status is success.
+    """
+    was_successful = getattr(instance, '_previous_status', None) == Donation.Status.SUCCESS
+    is_successful = instance.status == Donation.Status.SUCCESS
+    if was_successful != is_successful:
+        update_rankings_on_commit(rankings.record_donation, instance, sign=1 if is_successful else -1)
+
+
+@receiver(post_save, sender=Campaign)
+def update_campaign_rankings(sender, instance, **kwargs):
+    update_rankings_on_commit(rankings.update_campaign, instance)
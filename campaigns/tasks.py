@@ -1,10 +1,10 @@
-import qrcode
-import io
 import os
 from django.conf import settings
 from django.core.files.base import ContentFile
 from campaigns.models import Placement
 from common.models import File
+from libs.filecache import open_cached
+from libs.qrcodes import get_encoder
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from io import BytesIO
 
@@ -28,173 +28,267 @@ def wait_for_file_access(file_field, retries=5, delay=0.5):
     """
     for attempt in range(retries):
         try:
-            if not file_field or not file_field.file:
+            if not file_field:
                 raise FileNotFoundError("File field is empty.")
-            return Image.open(file_field.file).convert("RGBA" if file_field.name.endswith(".png") else "RGB")
+            with open_cached(file_field) as source:
+                return Image.open(source).convert("RGBA" if file_field.name.endswith(".png") else "RGB")
         except (FileNotFoundError, UnidentifiedImageError, ValueError):
             time.sleep(delay)
     return None
 
 
-def generate_donation_card(placement_id):
-    """
-    Generate a donation card with a styled layout.
+CARD_WIDTH = 1920
+CARD_TEXT = "Scan untuk donasi"
 
-    - Resize campaign's featured image to HD (1920px width)
-    - Place QR code centered in the last third of the image
-    - Draw "Scan untuk donasi" above QR code inside a rounded white box
-    - Compress final image as JPEG and save to File model
-    """
-    time.sleep(1)
 
+def load_card_font(size):
     try:
-        placement = Placement.objects.select_related("campaign__featured_image", "qr_code").get(pk=placement_id)
-        if not placement.campaign.featured_image or not placement.qr_code:
-            return
-
-        # Resize featured image to HD
-        featured = wait_for_file_access(placement.campaign.featured_image)
-        target_width = 1920
-        aspect_ratio = featured.height / featured.width
-        target_height = int(target_width * aspect_ratio)
-        featured = featured.resize((target_width, target_height), Image.LANCZOS)
-
-        # Load QR
-        qr = wait_for_file_access(placement.qr_code)
+        font_path = os.path.join(settings.BASE_DIR, "assets", "fonts", "dejavu-sans-bold.ttf")
+        return ImageFont.truetype(font_path, size)
+    except IOError as e:
+        logger.warning(f"Card font not available, using default: {e}")
+        return ImageFont.load_default()
 
-        # Prepare canvas
-        canvas = Image.new("RGB", featured.size, "white")
-        canvas.paste(featured, (0, 0))
-        draw = ImageDraw.Draw(canvas)
 
-        # Layout and size definitions
-        col_w = target_width // 3
-        margin = int(target_height * 0.15)
-        qr_max = target_height - 2 * margin
-        qr.thumbnail((col_w, qr_max), Image.LANCZOS)
+def resize_featured_image(featured):
+    """
+    Resize a campaign's featured image to the HD card width (1920px).
+    """
+    aspect_ratio = featured.height / featured.width
+    target_height = int(CARD_WIDTH * aspect_ratio)
+    return featured.resize((CARD_WIDTH, target_height), Image.LANCZOS)
 
-        # Font
-        try:
-            font_path = os.path.join(settings.BASE_DIR, "assets", "fonts", "dejavu-sans-bold.ttf")
-            font_size = int(target_height * 0.04)
-            font = ImageFont.truetype(font_path, font_size)
-            print(font)
-        except IOError:
-            print(IOError)
-            font = ImageFont.load_default()
-
-        text = "Scan untuk donasi"
-        text_bbox = draw.textbbox((0, 0), text, font=font)
-        text_w = text_bbox[2] - text_bbox[0]
-        text_h = text_bbox[3] - text_bbox[1]
-
-        # Calculate box position
-        block_w = max(text_w, qr.width) + 60
-        block_h = text_h + qr.height + 40
-        block_x = 2 * col_w + (col_w - block_w) // 2
-        block_y = (target_height - block_h) // 2
-
-        # shadow config
-        radius = 25
-        shadow_offset = (8, 8)
-        shadow_blur = 6
-        shadow_alpha = 80  # softer transparency
-
-        # Create larger canvas for shadow to allow blur
-        expanded_w = block_w + shadow_blur * 5
-        expanded_h = block_h + shadow_blur * 5
-
-        shadow = Image.new("RGBA", (expanded_w, expanded_h), (0, 0, 0, 0))
-        shadow_mask = Image.new("L", (expanded_w, expanded_h), 0)
-        draw_shadow = ImageDraw.Draw(shadow_mask)
-        draw_shadow.rounded_rectangle(
-            [shadow_blur, shadow_blur, shadow_blur + block_w, shadow_blur + block_h],
-            radius=radius,
-            fill=shadow_alpha  # softer alpha mask
-        )
-        shadow.putalpha(shadow_mask)
-        shadow = shadow.filter(ImageFilter.GaussianBlur(shadow_blur))
-
-        # Paste shadow
-        shadow_x = block_x + shadow_offset[0] - shadow_blur
-        shadow_y = block_y + shadow_offset[1] - shadow_blur
-        canvas.paste(shadow, (shadow_x, shadow_y), shadow)
-
-        # White box on top
-        box = Image.new("RGBA", (block_w, block_h), (255, 255, 255, 255))
-        box_mask = Image.new("L", (block_w, block_h), 0)
-        draw_box = ImageDraw.Draw(box_mask)
-        draw_box.rounded_rectangle([0, 0, block_w, block_h], radius, fill=255)
-        canvas.paste(box, (block_x, block_y), box_mask)
-
-        # Draw text
-        text_x = block_x + (block_w - text_w) // 2
-        text_y = block_y + 20
-        draw.text((text_x, text_y), text, fill="black", font=font)
-
-        # Paste QR
-        qr_x = block_x + (block_w - qr.width) // 2
-        qr_y = text_y + text_h + 20
-        canvas.paste(qr, (qr_x, qr_y), mask=qr)
-
-        # Save to JPEG
-        buffer = BytesIO()
-        canvas.save(buffer, format="JPEG", quality=85, optimize=True)
-        buffer.seek(0)
-
-        filename = f"donation_card_{placement.external_id}.jpg"
-        file, _ = File.objects.get_or_create(name=filename)
-        file.file.save(filename, ContentFile(buffer.getvalue()), save=True)
-        buffer.close()
 
-        placement.donation_card = file
-        placement.save(update_fields=["donation_card"])
+def render_donation_card(featured, qr, font=None):
+    """
+    Render a donation card and return it as JPEG bytes.
+
+    - Place QR code centered in the last third of the (already resized) featured image
+    - Draw "Scan untuk donasi" above QR code inside a rounded white box
+    """
+    target_width, target_height = featured.size
+
+    # Prepare canvas
+    canvas = Image.new("RGB", featured.size, "white")
+    canvas.paste(featured, (0, 0))
+    draw = ImageDraw.Draw(canvas)
+
+    # Layout and size definitions
+    col_w = target_width // 3
+    margin = int(target_height * 0.15)
+    qr_max = target_height - 2 * margin
+    qr.thumbnail((col_w, qr_max), Image.LANCZOS)
+
+    # Font
+    font = font or load_card_font(int(target_height * 0.04))
+
+    text = CARD_TEXT
+    text_bbox = draw.textbbox((0, 0), text, font=font)
+    text_w = text_bbox[2] - text_bbox[0]
+    text_h = text_bbox[3] - text_bbox[1]
+
+    # Calculate box position
+    block_w = max(text_w, qr.width) + 60
+    block_h = text_h + qr.height + 40
+    block_x = 2 * col_w + (col_w - block_w) // 2
+    block_y = (target_height - block_h) // 2
+
+    # shadow config
+    radius = 25
+    shadow_offset = (8, 8)
+    shadow_blur = 6
+    shadow_alpha = 80  # softer transparency
+
+    # Create larger canvas for shadow to allow blur
+    expanded_w = block_w + shadow_blur * 5
+    expanded_h = block_h + shadow_blur * 5
+
+    shadow = Image.new("RGBA", (expanded_w, expanded_h), (0, 0, 0, 0))
+    shadow_mask = Image.new("L", (expanded_w, expanded_h), 0)
+    draw_shadow = ImageDraw.Draw(shadow_mask)
+    draw_shadow.rounded_rectangle(
+        [shadow_blur, shadow_blur, shadow_blur + block_w, shadow_blur + block_h],
+        radius=radius,
+        fill=shadow_alpha  # softer alpha mask
+    )
+    shadow.putalpha(shadow_mask)
+    shadow = shadow.filter(ImageFilter.GaussianBlur(shadow_blur))
+
+    # Paste shadow
+    shadow_x = block_x + shadow_offset[0] - shadow_blur
+    shadow_y = block_y + shadow_offset[1] - shadow_blur
+    canvas.paste(shadow, (shadow_x, shadow_y), shadow)
+
+    # White box on top
+    box = Image.new("RGBA", (block_w, block_h), (255, 255, 255, 255))
+    box_mask = Image.new("L", (block_w, block_h), 0)
+    draw_box = ImageDraw.Draw(box_mask)
+    draw_box.rounded_rectangle([0, 0, block_w, block_h], radius, fill=255)
+    canvas.paste(box, (block_x, block_y), box_mask)
+
+    # Draw text
+    text_x = block_x + (block_w - text_w) // 2
+    text_y = block_y + 20
+    draw.text((text_x, text_y), text, fill="black", font=font)
+
+    # Paste QR
+    qr_x = block_x + (block_w - qr.width) // 2
+    qr_y = text_y + text_h + 20
+    canvas.paste(qr, (qr_x, qr_y), mask=qr)
+
+    # Save to JPEG
+    buffer = BytesIO()
+    canvas.save(buffer, format="JPEG", quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_donation_cards(placement_ids):
+    """
+    Generate donation cards for many placements in one task.
+
+    Each campaign's featured image is decoded and resized once and shared by
+    all of its placements; File rows and placement links are saved in bulk.
+
+    Args:
+        placement_ids: ids of the placements to render
+    Returns:
+        dict of placement id -> donation card URL
+    """
+    placements = list(
+        Placement.objects.select_related("campaign__featured_image", "qr_code", "donation_card")
+        .filter(id__in=placement_ids)
+    )
+    placements = [p for p in placements if p.campaign.featured_image and p.qr_code]
+    if not placements:
+        return {}
+
+    filenames = [f"donation_card_{p.external_id}.jpg" for p in placements]
+    existing = {f.name: f for f in File.objects.filter(name__in=filenames)}
+
+    featured_images, fonts = {}, {}
+    new_files, changed_files, rendered = [], [], []
+    for placement, filename in zip(placements, filenames):
+        featured_file = placement.campaign.featured_image
+        if featured_file.pk not in featured_images:
+            featured = wait_for_file_access(featured_file.best_file)
+            featured_images[featured_file.pk] = resize_featured_image(featured) if featured else None
+        featured = featured_images[featured_file.pk]
 
-        logger.info(f"Donation card created: {placement.donation_card.file.url}")
-        return placement.donation_card.file.url
+        qr = wait_for_file_access(placement.qr_code)
+        if featured is None or qr is None:
+            logger.warning(f"Skipping donation card for placement {placement.id}: source image unavailable")
+            continue
+
+        font_size = int(featured.height * 0.04)
+        if font_size not in fonts:
+            fonts[font_size] = load_card_font(font_size)
+
+        file = placement.donation_card or existing.get(filename)
+        if file is None:
+            file = File(name=filename)
+            new_files.append(file)
+        else:
+            changed_files.append(file)
+        file.file.save(filename, ContentFile(render_donation_card(featured, qr, fonts[font_size])), save=False)
+        placement.donation_card = file
+        rendered.append(placement)
 
+    File.objects.bulk_create(new_files)
+    if changed_files:
+        File.objects.bulk_update(changed_files, ["file"])
+    Placement.objects.bulk_update(rendered, ["donation_card"])
 
-    except Placement.DoesNotExist:
-        pass
+    logger.info(f"Donation cards created for {len(rendered)} placement(s)")
+    return {p.id: p.donation_card.file.url for p in rendered}
 
 
-def generate_qr_for_placement(placement_id):
+def generate_donation_card(placement_id):
     """
-    Generate a QR code for a placement and save it as a File instance.
-    The file is then linked via ForeignKey to placement.qr_code.
-
-    Also checks if donation card image should be regenerated.
+    Generate the donation card for a single placement.
     """
-    try:
-        placement = Placement.objects.select_related('campaign__featured_image', 'qr_code').get(id=placement_id)
+    url = generate_donation_cards([placement_id]).get(placement_id)
+    if url:
+        logger.info(f"Donation card created: {url}")
+    return url
 
-        # Build URL for QR code
-        default_url = f"https://jadwalshalat.net/donation/{placement.external_id}"
-        url = placement.url or default_url
 
-        if not placement.url:
-            placement.url = f"{default_url}#autogenerated"
-            placement.save(update_fields=["url"])
+QR_FORMATS = {
+    "png": "qr_code",
+    "svg": "qr_code_svg",
+}
 
-        # Generate QR code
-        qr = qrcode.make(url)
-        buffer = io.BytesIO()
-        qr.save(buffer, format='PNG')
-        buffer.seek(0)
 
-        filename = f"placement_qr_{placement.external_id}.png"
+def generate_qr_for_placements(placement_ids, formats=("png", "svg")):
+    """
+    Generate QR codes for many placements in one task.
 
-        file, _ = File.objects.get_or_create(name=filename)
-        file.file.save(filename, ContentFile(buffer.getvalue()), save=True)
-        buffer.close()
+    Placements without a URL get their autogenerated donation URL first.
+    Files are written to storage one by one, but File rows and placement
+    links are saved in bulk (no per-placement save signals).
 
-        placement.qr_code = file
-        placement.save(update_fields=['qr_code'])
+    Args:
+        placement_ids: ids of the placements to encode
+        formats: any of "png" (used by donation cards) and "svg"
+    Returns:
+        dict of placement id -> PNG (or first requested format) URL
+    """
+    placements = list(
+        Placement.objects.select_related(*(QR_FORMATS[fmt] for fmt in formats)).filter(id__in=placement_ids)
+    )
+    if not placements:
+        return {}
+
+    missing_url = [p for p in placements if not p.url]
+    for placement in missing_url:
+        placement.url = f"{placement.get_default_url()}#autogenerated"
+    if missing_url:
+        Placement.objects.bulk_update(missing_url, ["url"])
+
+    ext_names = {fmt: f"placement_qr_{{}}.{fmt}" for fmt in formats}
+    wanted = [ext_names[fmt].format(p.external_id) for p in placements for fmt in formats]
+    existing = {f.name: f for f in File.objects.filter(name__in=wanted)}
+
+    encoder = get_encoder()
+    new_files, changed_files = [], []
+    for placement in placements:
+        data = placement.url.replace("#autogenerated", "")
+        for fmt in formats:
+            filename = ext_names[fmt].format(placement.external_id)
+            file = getattr(placement, QR_FORMATS[fmt]) or existing.get(filename)
+            if file is None:
+                file = File(name=filename)
+                new_files.append(file)
+            else:
+                changed_files.append(file)
+            file.file.save(filename, ContentFile(encoder.render(data, fmt)), save=False)
+            setattr(placement, QR_FORMATS[fmt], file)
+
+    File.objects.bulk_create(new_files)
+    if changed_files:
+        File.objects.bulk_update(changed_files, ["file"])
+    Placement.objects.bulk_update(placements, [QR_FORMATS[fmt] for fmt in formats])
+
+    logger.info(f"QR codes created for {len(placements)} placement(s) ({', '.join(formats)})")
+    return {p.id: getattr(p, QR_FORMATS[formats[0]]).file.url for p in placements}
 
-        logger.info(f"QR Code created: {placement.qr_code.file.url}")
-        return placement.qr_code.file.url
 
+def generate_qr_for_placement(placement_id):
+    """
+    Generate the QR codes (PNG and SVG) for a single placement.
+    The PNG file is linked via ForeignKey to placement.qr_code.
+    """
+    url = generate_qr_for_placements([placement_id]).get(placement_id)
+    if url:
+        logger.info(f"QR Code created: {url}")
+    return url
 
-    except Placement.DoesNotExist:
-        pass
 
+def generate_placement_assets(placement_ids):
+    """
+    Batched QR + donation card job for a set of (usually freshly bulk-created)
+    placements: all QR codes first, then the cards that embed them.
+    """
+    qr_urls = generate_qr_for_placements(placement_ids)
+    card_urls = generate_donation_cards(placement_ids)
+    logger.info(f"Placement assets created: {len(qr_urls)} QR code(s), {len(card_urls)} card(s)")
+    return {"qr_codes": len(qr_urls), "donation_cards": len(card_urls)}
@@ -1,3 +1,180 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from auditlog.models import LogEntry
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from campaigns.models import Campaign, Expense, FundWithdrawalRequest, Placement
+from campaigns.services import InsufficientFunds, approve_withdrawal, approve_withdrawals, bulk_create_placements
+
+
+def make_campaign(organizer, unallocated_amount):
+    # bulk_create: no default placement, so no image tasks are queued
+    campaign, = Campaign.objects.bulk_create([Campaign(
+        title="Withdrawals", description="-", organizer=organizer,
+        goal_amount=1000, unallocated_amount=unallocated_amount,
+    )])
+    return campaign
+
+
+def make_withdrawals(campaign, *amounts):
+    return [
+        FundWithdrawalRequest.objects.create(campaign=campaign, requested_by=campaign.organizer, amount=amount)
+        for amount in amounts
+    ]
+
+
+class SoftDeleteTests(TestCase):
+    def test_counts_include_the_cascade(self):
+        campaign = make_campaign(User.objects.create(username="organizer"), 0)
+        Expense.objects.bulk_create([
+            Expense(campaign=campaign, description="-", amount=10, created_by=campaign.organizer)
+            for _ in range(2)
+        ])
+
+        self.assertEqual(Campaign.objects.filter(pk=campaign.pk).delete(),
+                         (3, {"campaigns.Campaign": 1, "campaigns.Expense": 2}))
+        self.assertEqual(Campaign.objects.filter(pk=campaign.pk).soft_delete(), (0, {}))
+        self.assertEqual(Campaign.all_objects.filter(pk=campaign.pk).restore(),
+                         (3, {"campaigns.Campaign": 1, "campaigns.Expense": 2}))
+
+
+class BulkCreatePlacementsTests(TestCase):
+    def test_logs_and_enqueues_after_commit(self):
+        organizer = User.objects.create(username="organizer")
+        campaign = make_campaign(organizer, Decimal("0"))
+
+        with mock.patch("campaigns.services.enqueue") as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                placements = bulk_create_placements(campaign, [{"name": "a"}, {"name": "b"}], organizer)
+                enqueue.assert_not_called()
+
+        enqueue.assert_called_once()
+        self.assertEqual(enqueue.call_args.args[1], [p.pk for p in placements])
+        logged = LogEntry.objects.filter(content_type=ContentType.objects.get_for_model(Placement),
+                                         action=LogEntry.Action.CREATE)
+        self.assertEqual(sorted(logged.values_list("object_id", flat=True)), sorted(p.pk for p in placements))
+
+
+class ApproveWithdrawalsTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username="organizer")
+        self.admin = User.objects.create(username="admin", is_staff=True)
+
+    def test_batch_approves_oldest_first_within_balance(self):
+        campaign = make_campaign(self.organizer, Decimal("100"))
+        first, second, third = make_withdrawals(campaign, 60, 50, 40)
+
+        approved, insufficient = approve_withdrawals([first.pk, second.pk, third.pk], self.admin)
+
+        self.assertEqual({w.pk for w in approved}, {first.pk, third.pk})
+        self.assertEqual([w.pk for w in insufficient], [second.pk])
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.unallocated_amount, Decimal("0"))
+        second.refresh_from_db()
+        self.assertFalse(second.is_approved)
+        first.refresh_from_db()
+        self.assertTrue(first.is_approved)
+        self.assertEqual(first.reviewed_by, self.admin)
+        self.assertIsNotNone(first.reviewed_at)
+
+    def test_batch_spans_campaigns(self):
+        rich = make_campaign(self.organizer, Decimal("500"))
+        poor = make_campaign(self.organizer, Decimal("10"))
+        ids = [w.pk for w in make_withdrawals(rich, 100, 200) + make_withdrawals(poor, 20)]
+
+        approved, insufficient = approve_withdrawals(ids, self.admin)
+
+        self.assertEqual(len(approved), 2)
+        self.assertEqual(len(insufficient), 1)
+        rich.refresh_from_db()
+        poor.refresh_from_db()
+        self.assertEqual(rich.unallocated_amount, Decimal("200"))
+        self.assertEqual(poor.unallocated_amount, Decimal("10"))
+
+    def test_already_approved_is_not_charged_twice(self):
+        campaign = make_campaign(self.organizer, Decimal("100"))
+        withdrawal, = make_withdrawals(campaign, 30)
+
+        approve_withdrawal(withdrawal, self.admin)
+        self.assertIsNone(approve_withdrawal(withdrawal, self.admin))
+
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.unallocated_amount, Decimal("70"))
+
+    def test_single_over_balance_raises(self):
+        campaign = make_campaign(self.organizer, Decimal("10"))
+        withdrawal, = make_withdrawals(campaign, 30)
+
+        with self.assertRaises(InsufficientFunds):
+            approve_withdrawal(withdrawal, self.admin)
+
+
+class BalanceChangedTests(TestCase):
+    """
+    The conditional ``UPDATE`` must hold even where ``select_for_update`` is a
+    no-op (sqlite): the balance is lowered by another writer right after the
+    campaigns are read.
+    """
+
+    def test_balance_lowered_after_read_is_not_overdrawn(self):
+        organizer = User.objects.create(username="organizer")
+        admin = User.objects.create(username="admin", is_staff=True)
+        campaign = make_campaign(organizer, Decimal("100"))
+        withdrawal, = make_withdrawals(campaign, 60)
+        state = {"done": False}
+
+        def concurrent_writer(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if not state["done"] and sql.startswith("SELECT") and 'FROM "campaigns_campaign"' in sql:
+                state["done"] = True
+                with connection.cursor() as cursor:
+                    cursor.execute("UPDATE campaigns_campaign SET unallocated_amount = %s WHERE id = %s",
+                                   [30, campaign.pk])
+            return result
+
+        with connection.execute_wrapper(concurrent_writer), self.assertRaises(InsufficientFunds):
+            approve_withdrawals([withdrawal.pk], admin)
+
+        self.assertTrue(state["done"])
+        campaign.refresh_from_db()
+        self.assertGreaterEqual(campaign.unallocated_amount, 0)
+        withdrawal.refresh_from_db()
+        self.assertFalse(withdrawal.is_approved)
+
+
+class ConcurrentApprovalTests(TransactionTestCase):
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_concurrent_batches_cannot_overdraw(self):
+        organizer = User.objects.create(username="organizer")
+        admins = [User.objects.create(username=f"admin{i}", is_staff=True) for i in range(4)]
+        campaign = make_campaign(organizer, Decimal("100"))
+        withdrawals = make_withdrawals(campaign, *[30] * 8)
+        barrier = threading.Barrier(len(admins))
+        errors = []
+
+        def approve(admin):
+            try:
+                barrier.wait()
+                # every admin approves the whole list at the same time
+                approve_withdrawals([w.pk for w in withdrawals], admin)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=approve, args=(admin,)) for admin in admins]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        campaign.refresh_from_db()
+        approved = FundWithdrawalRequest.objects.filter(campaign=campaign, is_approved=True).count()
+        self.assertEqual(approved, 3)
+        self.assertEqual(campaign.unallocated_amount, Decimal("10"))
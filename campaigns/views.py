@@ -1,8 +1,11 @@
-from rest_framework import viewsets, permissions, filters
-from rest_framework.exceptions import PermissionDenied
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 
 from .models import (
@@ -18,11 +21,14 @@ from .serializers import (
     CampaignListSerializer,
     CampaignDetailSerializer,
     PlacementSerializer,
+    PlacementBulkCreateSerializer,
     DonationSerializer,
     ExpenseSerializer,
     FundAllocationSerializer,
     FundWithdrawalRequestSerializer
 )
+from . import rankings
+from .services import bulk_create_placements
 
 
 class CampaignViewSet(ModelViewSet):
@@ -53,6 +59,48 @@ class CampaignViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(organizer=self.request.user)
 
+    ranking_param = openapi.Parameter(
+        name='ordering',
+        in_=openapi.IN_QUERY,
+        description='Ranking: ' + ', '.join(rankings.CAMPAIGN_BOARDS),
+        type=openapi.TYPE_STRING,
+        enum=list(rankings.CAMPAIGN_BOARDS),
+        default=rankings.TRENDING,
+    )
+    page_param = openapi.Parameter(name='page', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER)
+
+    @swagger_auto_schema(
+        operation_description="Public campaign feed ordered by a precomputed ranking "
+                              "(trending = recent donation velocity, nearly_funded = share of the goal reached).",
+        manual_parameters=[ranking_param, page_param],
+    )
+    @action(detail=False, methods=['get'], url_path='ranked', permission_classes=[permissions.AllowAny])
+    def ranked(self, request):
+        board = request.query_params.get('ordering', rankings.TRENDING)
+        if board not in rankings.CAMPAIGN_BOARDS:
+            raise ValidationError({'ordering': f"Choose one of: {', '.join(rankings.CAMPAIGN_BOARDS)}."})
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+        except ValueError:
+            raise ValidationError({'page': "Must be a number."})
+        page_size = self.paginator.page_size
+
+        ranked = rankings.ranked_campaigns(
+            board, Campaign.objects.filter(is_active=True).select_related('featured_image'),
+            page_size, (page - 1) * page_size,
+        )
+        data = CampaignListSerializer([campaign for campaign, _ in ranked], many=True).data
+        for item, (_, score) in zip(data, ranked):
+            item['score'] = score
+        return Response({'ordering': board, 'page': page, 'results': data})
+
+    @swagger_auto_schema(operation_description="Donors with the highest total of successful donations.")
+    @action(detail=True, methods=['get'], url_path='top-donors', permission_classes=[permissions.AllowAny])
+    def top_donors(self, request, external_id=None):
+        campaign = get_object_or_404(Campaign.objects.filter(is_deleted=False), external_id=external_id)
+        rows = rankings.top(rankings.top_donors_board(campaign.pk), self.paginator.page_size)
+        return Response([{'donor': donor_id, 'amount': amount} for donor_id, amount in rows])
+
 
 class BaseCampaignRelatedViewSet(ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -95,6 +143,24 @@ class PlacementViewSet(BaseCampaignRelatedViewSet):
             raise PermissionDenied("You do not have permission to modify this campaign.")
         serializer.save(created_by=self.request.user)
 
+    @swagger_auto_schema(
+        operation_description="Create many placements for one campaign in a single request. "
+                              "QR codes and donation cards are generated by one batched background job.",
+        request_body=PlacementBulkCreateSerializer,
+        responses={201: PlacementSerializer(many=True)}
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        serializer = PlacementBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        campaign = serializer.validated_data['campaign']
+        if campaign.organizer != request.user:
+            raise PermissionDenied("You do not have permission to modify this campaign.")
+
+        placements = bulk_create_placements(campaign, serializer.validated_data['placements'], request.user)
+        return Response(PlacementSerializer(placements, many=True).data, status=status.HTTP_201_CREATED)
+
 
 class DonationViewSet(BaseCampaignRelatedViewSet):
     queryset = Donation.objects.all()
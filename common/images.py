@@ -0,0 +1,215 @@
+"""
+Image processing for ``File`` objects.
+
+Masters: uploaded campaign and expense images are normalized once after
+upload (EXIF orientation applied, metadata stripped, dimensions capped) into
+``File.master``; consumers read ``File.best_file`` instead of the original.
+
+Variants (width x format) are rendered lazily the first time they are
+requested, stored through ``FILE_STORAGE`` and tracked in ``FileVariant``.
+Concurrent requests for the same variant are deduplicated with a cache lock,
+so only one process renders it; the others fall back to the original until
+it is stored.
+"""
+import logging
+import os
+from io import BytesIO
+from urllib.parse import urlencode, urljoin
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from libs.filecache import open_cached
+from .models import FileVariant
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = tuple(getattr(settings, "IMAGE_VARIANT_WIDTHS", (320, 640, 1024, 1920)))
+VARIANT_FORMATS = tuple(getattr(settings, "IMAGE_VARIANT_FORMATS", ("avif", "webp")))
+VARIANT_LOCK_TIMEOUT = getattr(settings, "IMAGE_VARIANT_LOCK_TIMEOUT", 60)
+MASTER_MAX_DIMENSION = getattr(settings, "IMAGE_MASTER_MAX_DIMENSION", 2560)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff")
+
+# format name -> (Pillow encoder, save options, file extension)
+ENCODERS = {
+    "avif": ("AVIF", {"quality": 60}, "avif"),
+    "webp": ("WEBP", {"quality": 80, "method": 4}, "webp"),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}, "jpg"),
+}
+
+
+def supported_formats():
+    """
+    Return the configured variant formats this Pillow build can encode.
+    AVIF needs a Pillow build (or plugin) with libavif and is skipped otherwise.
+    """
+    Image.init()
+    return [
+        fmt for fmt in VARIANT_FORMATS
+        if fmt in ENCODERS and ENCODERS[fmt][0] in Image.SAVE
+    ]
+
+
+def is_image(file_instance):
+    if not file_instance or not file_instance.file:
+        return False
+    return os.path.splitext(file_instance.file.name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def variant_url(file_instance, width, fmt):
+    path = reverse("file_variant-detail", kwargs={"pk": file_instance.pk})
+    return urljoin(settings.BASE_URL, path) + "?" + urlencode({"width": width, "format": fmt})
+
+
+def get_srcset(file_instance):
+    """
+    Build ``srcset`` strings for every supported format, e.g.
+    ``{"webp": "https://.../?width=320&format=webp 320w, ..."}``.
+    Returns None for files that are not images.
+    """
+    if not is_image(file_instance):
+        return None
+    return {
+        fmt: ", ".join(f"{variant_url(file_instance, width, fmt)} {width}w" for width in VARIANT_WIDTHS)
+        for fmt in supported_formats()
+    }
+
+
+def render_master(file_instance, max_dimension=MASTER_MAX_DIMENSION):
+    """
+    Decode the uploaded image, apply its EXIF orientation, fit it within
+    ``max_dimension`` and re-encode it without metadata: JPEG, or PNG when it
+    has transparency.
+
+    Returns ``(ContentFile, width, height)``.
+    """
+    with open_cached(file_instance.file) as source:
+        image = Image.open(source)
+        # JPEG: let libjpeg decode at a reduced scale instead of full resolution
+        image.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        if has_alpha:
+            image = image.convert("RGBA")
+            encoder, options, ext = "PNG", {"optimize": True}, "png"
+        else:
+            image = image.convert("RGB")
+            encoder, options, ext = ENCODERS["jpeg"]
+
+        buffer = BytesIO()
+        # no exif/icc/info passed on: the master carries no metadata
+        image.save(buffer, format=encoder, **options)
+
+    base_name = os.path.splitext(os.path.basename(file_instance.file.name))[0]
+    return ContentFile(buffer.getvalue(), name=f"{base_name}.{ext}"), image.width, image.height
+
+
+def normalize_image(file_instance):
+    """
+    Render and store the master of an uploaded image, unless it is up to date.
+    Returns True when a master was (or already is) available.
+    """
+    if file_instance.has_master:
+        return True
+    if not is_image(file_instance):
+        return False
+
+    try:
+        content, width, height = render_master(file_instance)
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as e:
+        logger.warning(f"Cannot normalize file {file_instance.pk}: {e}")
+        return False
+
+    if file_instance.master:
+        file_instance.master.delete(save=False)
+    file_instance.master.save(content.name, content, save=False)
+    file_instance.master_source = file_instance.file.name
+    file_instance.width = width
+    file_instance.height = height
+    file_instance.normalized_at = timezone.now()
+    file_instance.save(update_fields=["master", "master_source", "width", "height", "normalized_at"])
+    return True
+
+
+def render_variant(file_instance, width, fmt):
+    """
+    Resize the source image (its master when available) to ``width`` (never
+    upscaling) and encode it as ``fmt``.
+    """
+    encoder, options, ext = ENCODERS[fmt]
+    with open_cached(file_instance.best_file) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = int(image.height * width / image.width)
+            image = image.resize((width, height), Image.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        if encoder == "JPEG" or not has_alpha:
+            image = image.convert("RGB")
+        else:
+            image = image.convert("RGBA")
+
+        buffer = BytesIO()
+        image.save(buffer, format=encoder, **options)
+
+    base_name = os.path.splitext(os.path.basename(file_instance.file.name))[0]
+    return ContentFile(buffer.getvalue(), name=f"{base_name}_{width}w.{ext}")
+
+
+def _current_variant(file_instance, width, fmt):
+    variant = FileVariant.objects.filter(file=file_instance, width=width, format=fmt).first()
+    if variant and variant.source_name == file_instance.file.name:
+        return variant, None
+    return None, variant
+
+
+def get_or_create_variant(file_instance, width, fmt):
+    """
+    Return an up-to-date ``FileVariant``, rendering it if needed.
+
+    Returns None while another process holds the render lock, or when the
+    source is not a readable image; callers should fall back to the original
+    file.
+    """
+    variant, stale = _current_variant(file_instance, width, fmt)
+    if variant:
+        return variant
+
+    lock_key = f"file-variant:{file_instance.pk}:{width}:{fmt}"
+    if cache.add(lock_key, 1, VARIANT_LOCK_TIMEOUT):
+        try:
+            try:
+                content = render_variant(file_instance, width, fmt)
+            except (FileNotFoundError, UnidentifiedImageError, OSError) as e:
+                logger.warning(f"Cannot render variant for file {file_instance.pk}: {e}")
+                return None
+
+            if stale:
+                stale.image.delete(save=False)
+                stale.delete()
+
+            variant = FileVariant(file=file_instance, width=width, format=fmt,
+                                  source_name=file_instance.file.name)
+            variant.image.save(content.name, content, save=False)
+            try:
+                with transaction.atomic():
+                    variant.save()
+            except IntegrityError:
+                # Another process finished the same variant first; keep theirs.
+                variant.image.delete(save=False)
+                variant, _stale = _current_variant(file_instance, width, fmt)
+            return variant
+        finally:
+            cache.delete(lock_key)
+
+    # another request is rendering it; don't hold this worker waiting
+    return None
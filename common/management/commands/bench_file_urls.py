@@ -0,0 +1,71 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from common.models import File
+from common.serializers import FileSerializer
+import libs.storage as storage_module
+
+
+class URLSerializer(FileSerializer):
+    # file_size would HEAD every object; keep the benchmark to URL resolution
+    class Meta(FileSerializer.Meta):
+        fields = ("id", "name", "url", "master_url")
+
+
+class Command(BaseCommand):
+    help = "Benchmark File serializer throughput with and without the storage URL cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=50, help="Files per serialized list (one response).")
+        parser.add_argument("--requests", type=int, default=200, help="Number of lists to serialize.")
+        parser.add_argument("--public", action="store_true", help="Unsigned URLs (querystring_auth off).")
+
+    def handle(self, *args, **options):
+        storage = storage_module.FILE_STORAGE
+        if not isinstance(storage, S3Boto3Storage):
+            # presigning is local, no bucket is contacted
+            storage = S3Boto3Storage(
+                bucket_name="bench", access_key="bench", secret_key="bench",
+                region_name="us-east-1", location="bench", file_overwrite=False,
+            )
+        storage.querystring_auth = not options["public"]
+        self.stdout.write(f"{options['files']} files x {options['requests']} lists, "
+                          f"{'public' if options['public'] else 'signed'} URLs on s3://{storage.bucket_name}")
+
+        files = []
+        for pk in range(options["files"]):
+            instance = File(pk=pk, name=f"bench {pk}", file=f"bench/{uuid.uuid4()}.jpg")
+            instance.file.storage = storage
+            files.append(instance)
+        keys = [storage_module._url_cache_key(storage, instance.file.name) for instance in files]
+
+        def cold():
+            storage_module._url_cache.clear()
+            cache.delete_many(keys)
+
+        enabled = storage_module.URL_CACHE_ENABLED
+        try:
+            storage_module.URL_CACHE_ENABLED = False
+            self._run("no cache", files, options["requests"])
+            storage_module.URL_CACHE_ENABLED = True
+            self._run("cache, cold every list", files, options["requests"], before=cold)
+            self._run("cache, shared only", files, options["requests"], before=storage_module._url_cache.clear)
+            self._run("cache, warm", files, options["requests"])
+        finally:
+            storage_module.URL_CACHE_ENABLED = enabled
+            cold()
+
+    def _run(self, label, files, requests, before=None):
+        elapsed = 0.0
+        for _ in range(requests):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            URLSerializer(files, many=True).data
+            elapsed += time.perf_counter() - started
+        self.stdout.write(f"{label:<24} {requests / elapsed:>10.0f} lists/s "
+                          f"{requests * len(files) / elapsed:>10.0f} files/s ({elapsed:.2f}s)")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from libs.coalesce import coalesce_stats
+
+
+class Command(BaseCommand):
+    help = "Show how many task enqueues were collapsed by the coalescing layer."
+
+    def handle(self, *args, **options):
+        stats = coalesce_stats()
+        if not stats:
+            self.stdout.write("No coalesced tasks recorded yet.")
+            return
+
+        self.stdout.write(f"{'task':<55} {'requested':>10} {'enqueued':>10} {'collapsed':>10}")
+        for func_path, counters in sorted(stats.items()):
+            self.stdout.write(
+                f"{func_path:<55} {counters['requested']:>10} {counters['enqueued']:>10} {counters['collapsed']:>10}"
+            )
@@ -0,0 +1,87 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django_q.tasks import result
+
+from libs.queues import IMAGES, LEDGER, enqueue
+
+TASK_MODULE = __name__
+
+
+def simulate_render(duration_ms):
+    """
+    Stand-in for an image job: keeps a worker CPU-busy for ``duration_ms``.
+    """
+    end = time.perf_counter() + duration_ms / 1000
+    while time.perf_counter() < end:
+        pass
+
+
+def probe(enqueued_at):
+    """
+    Returns the seconds between enqueue and execution.
+    """
+    return time.time() - enqueued_at
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure ledger queue latency (enqueue -> start) before and during a storm of "
+        "image render jobs. Requires the ledger and images qcluster processes to be running. "
+        "Fails when the storm p95 exceeds --max-ratio times the baseline p95."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=500, help="Render jobs in the storm.")
+        parser.add_argument("--render-ms", type=int, default=300, help="CPU time per render job.")
+        parser.add_argument("--probes", type=int, default=60, help="Ledger probes per phase.")
+        parser.add_argument("--interval", type=float, default=0.1, help="Seconds between probes.")
+        parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for a probe result.")
+        parser.add_argument("--max-ratio", type=float, default=1.5,
+                            help="Highest acceptable storm/baseline p95 ratio.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Baseline (idle image queue)...")
+        baseline = self._probe(options)
+
+        self.stdout.write(f"Enqueueing {options['renders']} render jobs of {options['render_ms']}ms...")
+        for _ in range(options["renders"]):
+            enqueue(f"{TASK_MODULE}.simulate_render", options["render_ms"], queue=IMAGES)
+
+        self.stdout.write("During render storm...")
+        storm = self._probe(options)
+
+        self._report("baseline", baseline)
+        self._report("render storm", storm)
+
+        ratio = _p95(storm) / max(_p95(baseline), 1e-3)
+        self.stdout.write(f"p95 ratio storm/baseline: {ratio:.2f}x")
+        if ratio > options["max_ratio"]:
+            raise CommandError(f"Ledger p95 rose {ratio:.2f}x under image load (limit {options['max_ratio']}x); "
+                               "the image cluster is not isolated from the ledger cluster")
+
+    def _probe(self, options):
+        task_ids = []
+        for _ in range(options["probes"]):
+            task_ids.append(enqueue(f"{TASK_MODULE}.probe", time.time(), queue=LEDGER))
+            time.sleep(options["interval"])
+
+        latencies = []
+        for task_id in task_ids:
+            latency = result(task_id, wait=int(options["timeout"] * 1000))
+            if latency is None:
+                raise CommandError(f"Probe {task_id} did not finish; is the ledger qcluster running?")
+            latencies.append(latency)
+        return latencies
+
+    def _report(self, label, latencies):
+        p50 = statistics.median(latencies)
+        p95 = _p95(latencies)
+        self.stdout.write(
+            f"{label:<14} p50={p50 * 1000:8.1f}ms  p95={p95 * 1000:8.1f}ms  max={max(latencies) * 1000:8.1f}ms"
+        )
+
+
+def _p95(values):
+    return statistics.quantiles(values, n=20, method="inclusive")[-1]
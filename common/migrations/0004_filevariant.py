@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-19 09:12
+
+import django.core.files.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0003_alter_file_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('width', models.PositiveIntegerField()),
+                ('format', models.CharField(max_length=10)),
+                ('image', models.FileField(max_length=300, storage=django.core.files.storage.FileSystemStorage(base_url='http://127.0.0.1:8000/static/upload/donation', location='upload//donation'), upload_to='variants/')),
+                ('source_name', models.CharField(max_length=300)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='common.file')),
+            ],
+            options={
+                'verbose_name': 'File Variant',
+                'verbose_name_plural': 'File Variants',
+                'constraints': [models.UniqueConstraint(fields=('file', 'width', 'format'), name='unique_file_variant')],
+            },
+        ),
+    ]
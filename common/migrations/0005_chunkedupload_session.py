@@ -0,0 +1,64 @@
+# Generated by Django 5.1.4 on 2026-10-19 10:05
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def gen_upload_ids(apps, schema_editor):
+    ChunkedUpload = apps.get_model('common', 'ChunkedUpload')
+    for row in ChunkedUpload.objects.all():
+        row.upload_id = uuid.uuid4()
+        row.save(update_fields=['upload_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0004_filevariant'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chunkedupload',
+            options={'verbose_name': 'Chunked Upload', 'verbose_name_plural': 'Chunked Uploads'},
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='chunk_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='chunked_uploads', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='encoding',
+            field=models.CharField(default='base64', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='received',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='upload_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, null=True),
+        ),
+        migrations.RunPython(gen_upload_ids, reverse_code=migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chunkedupload',
+            name='upload_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0005_chunkedupload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='chunk_digests',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
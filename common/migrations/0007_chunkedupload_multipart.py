@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0006_chunkedupload_chunk_digests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='multipart_upload_id',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='storage_name',
+            field=models.CharField(blank=True, max_length=300, null=True),
+        ),
+    ]
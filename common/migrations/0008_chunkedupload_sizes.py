@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0007_chunkedupload_multipart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='chunk_sizes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='received_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
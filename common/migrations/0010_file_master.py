@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:10
+
+import django.core.files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0009_schedule_sweep_abandoned_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='master',
+            field=models.FileField(blank=True, max_length=300, null=True, storage=django.core.files.storage.FileSystemStorage(base_url='http://127.0.0.1:8000/static/upload/donation', location='upload//donation'), upload_to='masters/'),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='master_source',
+            field=models.CharField(blank=True, max_length=300, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='normalized_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
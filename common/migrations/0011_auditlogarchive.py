@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:40
+
+import django.core.files.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0010_file_master'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditLogArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the archived month.')),
+                ('part', models.PositiveSmallIntegerField(default=1)),
+                ('file', models.FileField(max_length=300, storage=django.core.files.storage.FileSystemStorage(location='upload//archive'), upload_to='')),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('first_entry_id', models.BigIntegerField(blank=True, null=True)),
+                ('last_entry_id', models.BigIntegerField(blank=True, null=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Audit Log Archive',
+                'verbose_name_plural': 'Audit Log Archives',
+                'ordering': ['-month', '-part'],
+                'constraints': [models.UniqueConstraint(fields=('month', 'part'), name='unique_auditlog_archive_part')],
+            },
+        ),
+    ]
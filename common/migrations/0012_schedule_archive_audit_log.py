@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:45
+
+from django.conf import settings
+from django.db import migrations
+
+SCHEDULE_NAME = 'Archive cold audit log entries'
+
+
+def create_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+    Schedule.objects.update_or_create(
+        name=SCHEDULE_NAME,
+        defaults={
+            'func': 'common.tasks.archive_audit_log',
+            'schedule_type': 'D',
+            'repeats': -1,
+            'cluster': getattr(settings, 'TASK_QUEUES', {}).get('maintenance'),
+        },
+    )
+
+
+def delete_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+    Schedule.objects.filter(name=SCHEDULE_NAME).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0011_auditlogarchive'),
+        ('django_q', '0018_task_success_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_schedule, delete_schedule),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0012_schedule_archive_audit_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='finalizing_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
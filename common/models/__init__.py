@@ -1,8 +1,15 @@
+import hashlib
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
-from libs.storage import FILE_STORAGE, CHUNK_UPLOAD_PRIVATE
+from libs.storage import ARCHIVE_STORAGE, FILE_STORAGE, CHUNK_UPLOAD_PRIVATE, file_url
+
+UPLOAD_FINALIZE_TIMEOUT = getattr(settings, "UPLOAD_FINALIZE_TIMEOUT", 3600)  # seconds
 
 
 class File(models.Model):
@@ -14,28 +21,183 @@ class File(models.Model):
     )
     object_id = models.PositiveIntegerField(blank=True, null=True)
     content_object = GenericForeignKey("content_type", "object_id")
+    # normalized copy of an uploaded image, see common.images.normalize_image
+    master = models.FileField(storage=FILE_STORAGE, max_length=300, upload_to="masters/", blank=True, null=True)
+    master_source = models.CharField(max_length=300, blank=True, null=True)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    normalized_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return "%s - %s" % (self.name, self.file)
 
     def get_file(self):
         if self.file:
-            return self.file.url
+            return file_url(self.file)
         return None
 
+    @property
+    def has_master(self):
+        """
+        Whether ``master`` was rendered from the file currently stored.
+        """
+        return bool(self.master) and bool(self.file) and self.master_source == self.file.name
+
+    @property
+    def best_file(self):
+        """
+        The normalized master when it is up to date, otherwise the uploaded file.
+        """
+        return self.master if self.has_master else self.file
+
     class Meta:
         verbose_name = _("File")
         verbose_name_plural = _("Files")
 
 
+class FileVariant(models.Model):
+    """
+    A resized and re-encoded copy of an image ``File``, generated on demand.
+
+    ``source_name`` remembers which stored file the variant was rendered from,
+    so a variant becomes stale as soon as the parent ``File`` is re-saved.
+    """
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name="variants")
+    width = models.PositiveIntegerField()
+    format = models.CharField(max_length=10)
+    image = models.FileField(storage=FILE_STORAGE, max_length=300, upload_to="variants/")
+    source_name = models.CharField(max_length=300)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "%s @ %sw (%s)" % (self.file.name, self.width, self.format)
+
+    class Meta:
+        verbose_name = _("File Variant")
+        verbose_name_plural = _("File Variants")
+        constraints = [
+            models.UniqueConstraint(fields=["file", "width", "format"], name="unique_file_variant"),
+        ]
+
+
 
 class ChunkedUpload(models.Model):
+    """
+    An upload session. Parts live under ``<upload_id>/`` in ``STORAGE_CHUNK``,
+    and ``received`` is a bitmap of the chunk numbers stored so far, so
+    chunks can arrive in any order, in parallel, and be resumed.
+
+    Each chunk is hashed as it is written; ``chunk_digests`` maps the chunk
+    number to its MD5, which lets finalize verify the upload without reading
+    the parts again (see ``tree_checksum``).
+
+    Direct uploads (``multipart_upload_id`` set) never touch ``STORAGE_CHUNK``:
+    chunks are S3 multipart parts of ``storage_name`` in ``FILE_STORAGE``.
+    """
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="chunked_uploads",
+        blank=True, null=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     filename = models.CharField(max_length=128)
     folder = models.CharField(max_length=256)
     file = models.FileField(storage=CHUNK_UPLOAD_PRIVATE, blank=True, null=True)
+    chunk_count = models.PositiveIntegerField(blank=True, null=True)
+    file_size = models.BigIntegerField(blank=True, null=True)  # declared by the client
+    received_bytes = models.BigIntegerField(default=0)
+    chunk_sizes = models.JSONField(default=dict, blank=True)
+    encoding = models.CharField(max_length=10, default="base64")
+    received = models.BinaryField(default=bytes)
+    chunk_digests = models.JSONField(default=dict, blank=True)
+    # direct uploads: parts go straight to FILE_STORAGE as an S3 multipart upload
+    multipart_upload_id = models.CharField(max_length=1024, blank=True, null=True)
+    storage_name = models.CharField(max_length=300, blank=True, null=True)
     is_done = models.BooleanField(default=False)
+    # set while finalize streams the parts out, with no transaction open
+    finalizing_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return self.filename
 
+    @property
+    def is_finalizing(self):
+        """
+        Whether a finalize is in progress; one that has not finished within
+        ``UPLOAD_FINALIZE_TIMEOUT`` seconds is taken to have died.
+        """
+        return self.finalizing_at is not None and \
+            (timezone.now() - self.finalizing_at).total_seconds() < UPLOAD_FINALIZE_TIMEOUT
+
+    def part_name(self, chunk_no):
+        return f"{self.upload_id}/part_{chunk_no}"
+
+    def is_received(self, chunk_no):
+        bitmap = bytes(self.received or b"")
+        byte, bit = divmod(chunk_no, 8)
+        return byte < len(bitmap) and bool(bitmap[byte] & (1 << bit))
+
+    def mark_received(self, chunk_no):
+        bitmap = bytearray(self.received or b"")
+        byte, bit = divmod(chunk_no, 8)
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte + 1 - len(bitmap)))
+        bitmap[byte] |= 1 << bit
+        self.received = bytes(bitmap)
+
+    def received_chunks(self):
+        bitmap = bytes(self.received or b"")
+        return [i for i in range(len(bitmap) * 8) if bitmap[i // 8] & (1 << (i % 8))]
+
+    def missing_chunks(self, chunk_count=None):
+        chunk_count = chunk_count or self.chunk_count
+        if chunk_count is None:
+            received = self.received_chunks()
+            chunk_count = received[-1] + 1 if received else 0
+        return [i for i in range(chunk_count) if not self.is_received(i)]
+
+    def tree_checksum(self, chunk_count=None):
+        """
+        MD5 of the concatenated hex MD5 digests of chunks ``0..chunk_count-1``,
+        or None while a digest is missing.
+        """
+        chunk_count = chunk_count or self.chunk_count
+        if not chunk_count:
+            return None
+        digests = [self.chunk_digests.get(str(i)) for i in range(chunk_count)]
+        if not all(digests):
+            return None
+        return hashlib.md5("".join(digests).encode("ascii")).hexdigest()
+
+    class Meta:
+        verbose_name = _("Chunked Upload")
+        verbose_name_plural = _("Chunked Uploads")
+
+
+class AuditLogArchive(models.Model):
+    """
+    A month of audit log entries moved out of ``auditlog_logentry`` into a
+    gzipped JSON Lines file, one entry per line (see
+    ``common.tasks.archive_audit_log``). Entries that reach the table after
+    a month was archived end up in a further ``part``.
+    """
+    month = models.DateField(help_text="First day of the archived month.")
+    part = models.PositiveSmallIntegerField(default=1)
+    file = models.FileField(storage=ARCHIVE_STORAGE, max_length=300)
+    entry_count = models.PositiveIntegerField(default=0)
+    first_entry_id = models.BigIntegerField(blank=True, null=True)
+    last_entry_id = models.BigIntegerField(blank=True, null=True)
+    size = models.BigIntegerField(default=0)  # compressed bytes
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "%s part %s (%s entries)" % (self.month.strftime("%Y-%m"), self.part, self.entry_count)
+
+    class Meta:
+        verbose_name = _("Audit Log Archive")
+        verbose_name_plural = _("Audit Log Archives")
+        ordering = ["-month", "-part"]
+        constraints = [
+            models.UniqueConstraint(fields=["month", "part"], name="unique_auditlog_archive_part"),
+        ]
@@ -2,6 +2,9 @@ import base64
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 from rest_framework import serializers
+from libs.metrics import TimedSerializerMixin
+from libs.storage import file_url, file_urls
+from ..images import get_srcset
 from ..models import File
 
 def serialize_fields(instance, representation, field_serializer_map):
@@ -32,16 +35,65 @@ def serialize_fields(instance, representation, field_serializer_map):
 
         representation[field_name] = serialized
 
-class FileSerializer(serializers.ModelSerializer):
+def resolve_file_urls(instances, field_names):
+    """
+    Resolve the URLs of the ``File`` relations ``field_names`` of all
+    ``instances`` in one batch (see ``libs.storage.file_urls``), so that
+    serializing them afterwards only hits the local URL cache.
+    """
+    field_files = []
+    for instance in instances:
+        for field_name in field_names:
+            file_instance = getattr(instance, field_name, None)
+            if file_instance is None:
+                continue
+            if hasattr(file_instance, "all"):
+                field_files += [related.file for related in file_instance.all()]
+            else:
+                field_files.append(file_instance.file)
+    return file_urls(field_files)
+
+
+class FileListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    List serializer that resolves every URL of the page before serializing
+    the items. For ``File`` lists that is the files themselves (and their
+    masters); other serializers name their ``File`` relations in
+    ``file_fields``.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        if isinstance(self.child, FileSerializer):
+            field_files = [instance.file for instance in items]
+            if "master_url" in self.child.fields:
+                field_files += [instance.master for instance in items if instance.has_master]
+            file_urls(field_files)
+        else:
+            resolve_file_urls(items, getattr(self.child, "file_fields", ()))
+        return super().to_representation(items)
+
+
+class FileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     url = serializers.SerializerMethodField()
     file_size = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    master_url = serializers.SerializerMethodField()
 
     class Meta:
         model = File
-        fields = ("id", "name", "file", "url", "file_size", "description")
+        fields = ("id", "name", "file", "url", "file_size", "srcset", "master_url", "width", "height",
+                  "description")
+        list_serializer_class = FileListSerializer
 
     def get_url(self, instance):
-        return instance.file.url if instance.file else "-"
+        return file_url(instance.file) if instance.file else "-"
+
+    def get_master_url(self, instance):
+        return file_url(instance.master) if instance.has_master else None
+
+    def get_srcset(self, instance):
+        return get_srcset(instance)
 
     def get_file_size(self, instance):
         if instance.file and instance.file.size:
@@ -53,7 +105,8 @@ class FileLiteSerializer(FileSerializer):
 
     class Meta:
         model = File
-        fields = ("id", "name", "url", "file_size")
+        fields = ("id", "name", "url", "file_size", "srcset")
+        list_serializer_class = FileListSerializer
 
 
 def decode_base64_img(encoded_file, name="temp"):
@@ -83,7 +136,7 @@ class FileCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
     def get_url(self, instance):
-        return instance.file.url if instance.file else "-"
+        return file_url(instance.file) if instance.file else "-"
 
     def get_file_size(self, instance):
         if instance.file and instance.file.size:
@@ -96,6 +149,14 @@ class FileCreateSerializer(serializers.ModelSerializer):
         return data
 
 
+class FileStreamSerializer(serializers.Serializer):
+    """
+    Query parameters of ``POST files/stream/``.
+    """
+    name = serializers.CharField(max_length=File._meta.get_field("name").max_length)
+    description = serializers.CharField(required=False, allow_blank=True)
+
+
 class SetFileSerializer(serializers.Serializer):
     file_base64 = serializers.CharField(
         write_only=True, help_text="Base64 encoded file data"
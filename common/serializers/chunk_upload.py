@@ -1,9 +1,31 @@
+from django.conf import settings
 from rest_framework import serializers
 
+# upper bound of chunks per upload; also caps the size of a session's received bitmap
+MAX_CHUNKS = getattr(settings, "UPLOAD_MAX_CHUNKS", 10000)
+
+CHUNK_ENCODING_BASE64 = "base64"
+CHUNK_ENCODING_BINARY = "binary"
+
 
 class ChunkUploadSerializer(serializers.Serializer):
-    file_name = serializers.CharField()
+    upload_id = serializers.UUIDField(required=False)
+    file_name = serializers.CharField(max_length=128)
     chunk = serializers.CharField(required=False)
-    chunk_no = serializers.IntegerField(required=False)
+    chunk_file = serializers.FileField(required=False)
+    chunk_no = serializers.IntegerField(required=False, min_value=0, max_value=MAX_CHUNKS - 1)
+    chunk_checksum = serializers.CharField(required=False)
     checksum = serializers.CharField(required=False)
-    chunk_count = serializers.IntegerField(required=False)
+    chunk_count = serializers.IntegerField(required=False, min_value=1, max_value=MAX_CHUNKS)
+    file_size = serializers.IntegerField(required=False, min_value=0)
+    encoding = serializers.ChoiceField(
+        choices=(CHUNK_ENCODING_BASE64, CHUNK_ENCODING_BINARY),
+        required=False,
+    )
+
+
+class DirectUploadSerializer(serializers.Serializer):
+    file_name = serializers.CharField(max_length=128)
+    # S3 multipart uploads: at most 10,000 parts, each at least 5 MiB except the last
+    chunk_count = serializers.IntegerField(min_value=1, max_value=10000)
+    file_size = serializers.IntegerField(required=False, min_value=0)
@@ -0,0 +1,213 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.db.models import Max
+from django.utils import timezone
+
+from common.images import normalize_image
+from common.models import AuditLogArchive, ChunkedUpload, File
+from libs.storage import STORAGE_CHUNK, abort_multipart_upload
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SESSION_TTL = getattr(settings, "UPLOAD_SESSION_TTL", 24 * 60 * 60)  # seconds
+SWEEP_BATCH_SIZE = 500
+# audit log entries of the current and the previous N months stay in the table
+AUDITLOG_HOT_MONTHS = getattr(settings, "AUDITLOG_HOT_MONTHS", 3)
+ARCHIVE_BATCH_SIZE = 2000
+
+
+def _disk_usage(path):
+    """
+    Bytes used by the file or directory tree at ``path`` (0 if it is gone).
+    """
+    try:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+    except OSError:
+        return 0
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path):
+    size = _disk_usage(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+    return size
+
+
+def sweep_abandoned_uploads(max_age=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Delete chunk upload sessions created more than ``max_age`` seconds ago
+    (``UPLOAD_SESSION_TTL`` by default) together with their part files, in
+    batches of ``batch_size``. Direct uploads still open in the bucket are
+    aborted. Part files in ``STORAGE_CHUNK`` that no session owns any more
+    (including ``<name>.part_N`` files of the old protocol) are removed once
+    they are older than ``max_age`` too.
+
+    Returns ``{"sessions": n, "files": n, "bytes": reclaimed}``.
+    """
+    max_age = UPLOAD_SESSION_TTL if max_age is None else max_age
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    sessions = files = reclaimed = 0
+
+    last_pk = 0
+    while True:
+        batch = list(
+            ChunkedUpload.objects.filter(created_at__lt=cutoff, pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "upload_id", "is_done", "storage_name", "multipart_upload_id")[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+
+        for _pk, upload_id, is_done, storage_name, multipart_upload_id in batch:
+            if multipart_upload_id and not is_done:
+                try:
+                    abort_multipart_upload(storage_name, multipart_upload_id)
+                except Exception as e:
+                    logger.warning(f"Could not abort multipart upload of {storage_name}: {e}")
+            reclaimed += _remove(STORAGE_CHUNK.path(str(upload_id)))
+
+        ChunkedUpload.objects.filter(pk__in=[row[0] for row in batch]).delete()
+        sessions += len(batch)
+
+    # leftovers without a session: old-protocol parts, crashed finalizes
+    if os.path.isdir(STORAGE_CHUNK.location):
+        live = {str(upload_id) for upload_id in ChunkedUpload.objects.values_list("upload_id", flat=True)}
+        cutoff_ts = cutoff.timestamp()
+        with os.scandir(STORAGE_CHUNK.location) as entries:
+            for entry in entries:
+                if entry.name in live or entry.stat(follow_symlinks=False).st_mtime >= cutoff_ts:
+                    continue
+                reclaimed += _remove(entry.path)
+                files += 1
+
+    logger.info(f"Swept {sessions} abandoned upload session(s) and {files} orphaned file(s), "
+                f"reclaimed {reclaimed} bytes")
+    return {"sessions": sessions, "files": files, "bytes": reclaimed}
+
+
+def normalize_file(file_id):
+    """
+    Produce the normalized master of an uploaded image (see ``common.images``).
+    """
+    file_instance = File.objects.filter(pk=file_id).first()
+    if file_instance is None:
+        return None
+    if normalize_image(file_instance) and file_instance.master:
+        logger.info(f"Normalized file {file_id}: {file_instance.width}x{file_instance.height}")
+        return file_instance.master.url
+    return None
+
+
+def _month_start(value):
+    value = timezone.localtime(value)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _archive_row(entry):
+    return {
+        "id": entry.pk,
+        "timestamp": entry.timestamp.isoformat(),
+        "content_type": f"{entry.content_type.app_label}.{entry.content_type.model}",
+        "object_pk": entry.object_pk,
+        "object_id": entry.object_id,
+        "object_repr": entry.object_repr,
+        "action": entry.action,
+        "changes": entry.changes,
+        "changes_text": entry.changes_text,
+        "serialized_data": entry.serialized_data,
+        "actor_id": entry.actor_id,
+        "actor": entry.actor.get_username() if entry.actor else None,
+        "remote_addr": entry.remote_addr,
+        "cid": entry.cid,
+        "additional_data": entry.additional_data,
+    }
+
+
+def _archive_month(month, batch_size):
+    entries = LogEntry.objects.filter(timestamp__gte=month, timestamp__lt=_next_month(month))
+    last_id = entries.aggregate(last=Max("id"))["last"]
+    if last_id is None:
+        return None
+    entries = entries.filter(id__lte=last_id)
+
+    count, first_id, after = 0, None, 0
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode="wb") as archive_file:
+            while True:
+                batch = list(entries.filter(id__gt=after).select_related("content_type", "actor")
+                             .order_by("id")[:batch_size])
+                if not batch:
+                    break
+                for entry in batch:
+                    archive_file.write(json.dumps(_archive_row(entry), default=str).encode("utf-8") + b"\n")
+                first_id = first_id or batch[0].pk
+                after = batch[-1].pk
+                count += len(batch)
+        size = tmp.tell()
+        tmp.seek(0)
+
+        part = (AuditLogArchive.objects.filter(month=month.date()).aggregate(last=Max("part"))["last"] or 0) + 1
+        archive = AuditLogArchive(month=month.date(), part=part, entry_count=count,
+                                  first_entry_id=first_id, last_entry_id=last_id, size=size)
+        archive.file.save(f"auditlog/{month:%Y-%m}-{part}.jsonl.gz", DjangoFile(tmp), save=False)
+        archive.save()
+
+    # only once the archive is stored
+    while True:
+        ids = list(entries.order_by().values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        LogEntry.objects.filter(id__in=ids).delete()
+    return archive
+
+
+def archive_audit_log(keep_months=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move audit log entries older than the current and the previous
+    ``keep_months`` months (``AUDITLOG_HOT_MONTHS``) into one compressed
+    ``AuditLogArchive`` per month, then delete them from the table, so the
+    table the admin and "View Logs" query stays small.
+
+    Returns ``{"months": [...], "entries": n}``.
+    """
+    keep_months = AUDITLOG_HOT_MONTHS if keep_months is None else keep_months
+    cutoff = _month_start(timezone.now())
+    for _ in range(keep_months):
+        cutoff = _month_start(cutoff - timedelta(days=1))
+
+    oldest = LogEntry.objects.filter(timestamp__lt=cutoff).order_by("timestamp").values_list("timestamp", flat=True).first()
+    months, archived = [], 0
+    month = _month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        archive = _archive_month(month, batch_size)
+        if archive is not None:
+            months.append(f"{month:%Y-%m}")
+            archived += archive.entry_count
+            logger.info(f"Archived {archive.entry_count} audit log entries of {month:%Y-%m} to {archive.file.name}")
+        month = _next_month(month)
+    return {"months": months, "entries": archived}
@@ -0,0 +1,85 @@
+import hashlib
+import io
+import os
+import shutil
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.models import ChunkedUpload, File
+from common.serializers.chunk_upload import CHUNK_ENCODING_BINARY
+from common.views.chunk_upload import ChunkUploadError, ChunkUploadViewSet
+from libs.storage import STORAGE_CHUNK
+
+
+class StoreChunkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="uploader")
+        self.session = ChunkedUpload.objects.create(
+            filename="video.mp4", created_by=self.user,
+            chunk_count=2, encoding=CHUNK_ENCODING_BINARY,
+        )
+        self.directory = STORAGE_CHUNK.path(str(self.session.upload_id))
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.view = ChunkUploadViewSet()
+
+    def test_rejected_resend_keeps_the_stored_part(self):
+        self.view._store_chunk(self.session, 0, io.BytesIO(b"old"))
+        # finished by another request since this one loaded the session
+        ChunkedUpload.objects.filter(pk=self.session.pk).update(is_done=True)
+
+        with self.assertRaises(ChunkUploadError):
+            self.view._store_chunk(self.session, 0, io.BytesIO(b"new"))
+
+        with open(STORAGE_CHUNK.path(self.session.part_name(0)), "rb") as part:
+            self.assertEqual(part.read(), b"old")
+        self.assertEqual(os.listdir(self.directory), ["part_0"])
+
+    def finalize(self, chunks):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post("/api/files/chunk-upload/?is_checksum=true", {
+            "upload_id": str(self.session.upload_id), "file_name": self.session.filename,
+            "chunk_count": len(chunks), "encoding": CHUNK_ENCODING_BINARY,
+            "checksum": hashlib.md5(b"".join(chunks)).hexdigest(),
+        }, format="json")
+        if response.status_code == 200:
+            file_instance = File.objects.get(pk=response.data["data"]["file_id"])
+            self.addCleanup(file_instance.file.delete, save=False)
+        return response
+
+    def test_file_named_like_a_part(self):
+        ChunkedUpload.objects.filter(pk=self.session.pk).update(filename="part_0")
+        self.session.refresh_from_db()
+        for chunk_no, data in enumerate((b"first", b"second")):
+            self.view._store_chunk(self.session, chunk_no, io.BytesIO(data))
+
+        response = self.finalize([b"first", b"second"])
+
+        self.assertEqual(response.status_code, 200)
+        with File.objects.get(pk=response.data["data"]["file_id"]).file.open("rb") as stored:
+            self.assertEqual(stored.read(), b"firstsecond")
+
+    def test_chunks_are_refused_while_finalizing(self):
+        self.view._store_chunk(self.session, 0, io.BytesIO(b"first"))
+        ChunkedUpload.objects.filter(pk=self.session.pk).update(finalizing_at=timezone.now())
+
+        with self.assertRaises(ChunkUploadError):
+            self.view._store_chunk(self.session, 1, io.BytesIO(b"second"))
+        self.assertEqual(self.finalize([b"first", b"second"]).status_code, 409)
+
+    def test_checksum_mismatch_reopens_the_session(self):
+        for chunk_no, data in enumerate((b"first", b"second")):
+            self.view._store_chunk(self.session, chunk_no, io.BytesIO(data))
+
+        self.assertEqual(self.finalize([b"other", b"bytes"]).status_code, 400)
+        self.session.refresh_from_db()
+        self.assertIsNone(self.session.finalizing_at)
+        self.assertFalse(self.session.is_done)
+
+        self.assertEqual(self.finalize([b"first", b"second"]).status_code, 200)
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.is_done)
+        self.assertIsNone(self.session.finalizing_at)
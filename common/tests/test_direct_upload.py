@@ -0,0 +1,101 @@
+from unittest import mock
+
+import boto3
+from django.contrib.auth.models import User
+from django.test import TestCase
+from moto import mock_aws
+from rest_framework.test import APIClient
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from common.models import ChunkedUpload, File
+
+BUCKET = "donation-test"
+URL = "/api/files/chunk-upload/"
+PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+
+
+@mock_aws
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        self.s3 = boto3.client("s3", region_name="us-east-1")
+        self.s3.create_bucket(Bucket=BUCKET)
+        storage = S3Boto3Storage(bucket_name=BUCKET, region_name="us-east-1")
+        for patcher in (
+            mock.patch("libs.storage.FILE_STORAGE", storage),
+            mock.patch("common.views.chunk_upload.FILE_STORAGE", storage),
+            mock.patch("common.views.chunk_upload.USE_OBJECT_STORAGE", True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username="uploader"))
+
+    def start(self, chunk_count):
+        response = self.client.post(f"{URL}direct/", {"file_name": "video.mp4", "chunk_count": chunk_count},
+                                    format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["parts"]), chunk_count)
+        return ChunkedUpload.objects.get(upload_id=response.data["upload_id"])
+
+    def upload_part(self, session, chunk_no, size):
+        self.s3.upload_part(Bucket=BUCKET, Key=session.storage_name, UploadId=session.multipart_upload_id,
+                            PartNumber=chunk_no + 1, Body=b"x" * size)
+
+    def test_parts_complete(self):
+        session = self.start(2)
+        self.upload_part(session, 0, PART_SIZE)
+
+        response = self.client.get(f"{URL}{session.upload_id}/direct/parts/")
+        self.assertEqual(response.data["received_chunks"], [0])
+        self.assertEqual(response.data["missing_chunks"], [1])
+
+        response = self.client.post(f"{URL}{session.upload_id}/direct/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["data"]["missing_chunks"], [1])
+
+        self.upload_part(session, 1, 10)
+        response = self.client.post(f"{URL}{session.upload_id}/direct/complete/")
+        self.assertEqual(response.status_code, 200)
+        file_instance = File.objects.get(pk=response.data["data"]["file_id"])
+        self.assertEqual(self.s3.head_object(Bucket=BUCKET, Key=file_instance.file.name)["ContentLength"],
+                         PART_SIZE + 10)
+        session.refresh_from_db()
+        self.assertTrue(session.is_done)
+
+    def test_too_small_part_keeps_the_session_open(self):
+        session = self.start(2)
+        self.upload_part(session, 0, 10)
+        self.upload_part(session, 1, 10)
+
+        response = self.client.post(f"{URL}{session.upload_id}/direct/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["data"]["code"], "EntityTooSmall")
+        session.refresh_from_db()
+        self.assertFalse(session.is_done)
+
+        # re-uploading the part fixes it
+        self.upload_part(session, 0, PART_SIZE)
+        response = self.client.post(f"{URL}{session.upload_id}/direct/complete/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_abort(self):
+        session = self.start(1)
+        self.upload_part(session, 0, 10)
+
+        response = self.client.post(f"{URL}{session.upload_id}/direct/abort/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["aborted"])
+        self.assertEqual(self.s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []), [])
+        response = self.client.post(f"{URL}{session.upload_id}/direct/complete/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_upload_gone_from_storage_closes_the_session(self):
+        session = self.start(1)
+        self.s3.abort_multipart_upload(Bucket=BUCKET, Key=session.storage_name,
+                                       UploadId=session.multipart_upload_id)
+
+        response = self.client.post(f"{URL}{session.upload_id}/direct/complete/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["data"]["code"], "NoSuchUpload")
+        session.refresh_from_db()
+        self.assertTrue(session.is_done)
@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from campaigns.models import Campaign, Expense
+from common.models import File
+
+
+@mock.patch("common.views.variant.get_or_create_variant", return_value=None)
+class FileVariantVisibilityTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username="organizer")
+        self.featured = File.objects.create(name="featured.jpg", file="featured.jpg")
+        self.receipt = File.objects.create(name="receipt.jpg", file="receipt.jpg")
+        self.orphan = File.objects.create(name="orphan.jpg", file="orphan.jpg")
+        # bulk_create: no default placement or normalization, so no image tasks are queued
+        campaign, = Campaign.objects.bulk_create([Campaign(
+            title="Variants", description="-", organizer=self.organizer, goal_amount=1000,
+            featured_image=self.featured,
+        )])
+        Expense.objects.bulk_create([Expense(
+            campaign=campaign, description="-", amount=10, created_by=self.organizer, receipt=self.receipt,
+        )])
+
+    def get(self, file_instance, user=None):
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        return client.get(f"/api/files/variants/{file_instance.pk}/", {"width": 320, "format": "webp"})
+
+    def test_public_files_are_served_to_anyone(self, _variant):
+        self.assertEqual(self.get(self.featured).status_code, 302)
+
+    def test_unreferenced_files_are_not_found(self, _variant):
+        self.assertEqual(self.get(self.orphan).status_code, 404)
+        self.assertEqual(self.get(self.orphan, self.organizer).status_code, 404)
+
+    def test_receipts_are_served_to_the_organizer_only(self, _variant):
+        other = User.objects.create(username="other")
+        self.assertEqual(self.get(self.receipt).status_code, 404)
+        self.assertEqual(self.get(self.receipt, other).status_code, 404)
+        self.assertEqual(self.get(self.receipt, self.organizer).status_code, 302)
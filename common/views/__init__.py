@@ -1,6 +1,22 @@
-from rest_framework import viewsets, permissions
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File as DjangoFile
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from libs.streams import Base64StreamDecoder, StreamLimitExceeded, copy_stream
 from ..models import File
-from ..serializers import FileCreateSerializer
+from ..serializers import FileCreateSerializer, FileStreamSerializer
+
+MAX_FILE_SIZE = getattr(settings, "UPLOAD_MAX_FILE_SIZE", None)
+# decoded uploads bigger than this are spooled to a temporary file on disk
+SPOOL_MAX_MEMORY = settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+
 
 class FileViewSet(viewsets.ModelViewSet):
     queryset = File.objects.all()
@@ -8,3 +24,60 @@ class FileViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     http_method_names = ["post"]
 
+    @swagger_auto_schema(
+        operation_description="""
+        Upload a file as base64 text in the raw request body (optionally with a
+        `data:<type>;base64,` prefix), e.g. `Content-Type: text/plain`.
+
+        The body is decoded incrementally while it is read, into a temporary file
+        that only stays in memory while small, so large uploads do not need the
+        whole JSON body and decoded file in memory like `POST files/upload/`.
+        """,
+        request_body=openapi.Schema(type=openapi.TYPE_STRING, description="Base64 encoded file data"),
+        manual_parameters=[
+            openapi.Parameter('name', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description="File name (the extension is taken from the data-URI type if present)"),
+            openapi.Parameter('description', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False),
+        ],
+        responses={201: FileCreateSerializer},
+    )
+    @action(detail=False, methods=["post"], url_path="stream")
+    def stream(self, request):
+        params = FileStreamSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        name = params.validated_data["name"]
+
+        decoder = Base64StreamDecoder()
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spooled:
+            try:
+                # read the body as a stream, without parsing or buffering it
+                size = copy_stream(request._request, spooled, decoder=decoder, limit=MAX_FILE_SIZE)
+                size += spooled.write(decoder.flush())
+            except StreamLimitExceeded as e:
+                return Response({
+                    "message": "Failed upload file",
+                    "data": {
+                        "file_size": e.size,
+                        "allowed_size": MAX_FILE_SIZE,
+                    },
+                }, status=status.HTTP_400_BAD_REQUEST)
+            except ValueError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if not size:
+                return Response({"message": "Empty file"}, status=status.HTTP_400_BAD_REQUEST)
+
+            # like decode_base64_img: the stored file gets the data-URI type as extension
+            file_name = name
+            if decoder.media_type:
+                ext = "." + decoder.media_type.split("/")[-1]
+                if os.path.splitext(name)[1].lower() != ext.lower():
+                    file_name = name + ext
+            spooled.seek(0)
+            instance = File.objects.create(
+                name=name,
+                description=params.validated_data.get("description"),
+                file=DjangoFile(spooled, name=file_name),
+            )
+
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
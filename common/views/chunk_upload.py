@@ -1,56 +1,148 @@
 import hashlib
 import io
-from base64 import b64decode
+import os
+import shutil
+import uuid
 
+from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from botocore.exceptions import ClientError
 from django.conf import settings
+from django.core.files import File as DjangoFile
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from libs.storage import STORAGE_CHUNK
+from libs.storage import (
+    FILE_STORAGE, STORAGE_CHUNK, USE_OBJECT_STORAGE, abort_multipart_upload, complete_multipart_upload,
+    create_multipart_upload, is_local_storage, list_uploaded_parts, move_into_storage, presign_upload_parts,
+)
+from libs.streams import (
+    Base64StreamDecoder, ConcatReader, DigestMismatch, StreamLimitExceeded, copy_stream,
+    write_atomic,
+)
 from ..models import File, ChunkedUpload
-from ..serializers.chunk_upload import ChunkUploadSerializer
+from ..serializers.chunk_upload import (
+    ChunkUploadSerializer, DirectUploadSerializer, CHUNK_ENCODING_BASE64, CHUNK_ENCODING_BINARY, MAX_CHUNKS,
+)
 
 MAX_FILE_SIZE = getattr(settings, "UPLOAD_MAX_FILE_SIZE", None)
 
 
+class ChunkUploadError(Exception):
+    pass
+
+
+class FileTooLarge(ChunkUploadError):
+    def __init__(self, file_size):
+        super().__init__(f"File size {file_size} exceeds {MAX_FILE_SIZE}")
+        self.file_size = file_size
+
+
+def _decoded_size(size, encoding):
+    """
+    Lower bound of the file size ``size`` bytes of chunk data decode to.
+    """
+    if encoding == CHUNK_ENCODING_BASE64:
+        # 4 base64 characters per 3 bytes, minus room for a data-URI header
+        return max(size - 256, 0) * 3 // 4
+    return size
+
+
+# errors S3 reports for the client's parts or session; anything else is ours
+MULTIPART_CLIENT_ERRORS = ("EntityTooSmall", "InvalidPart", "InvalidPartOrder", "NoSuchUpload")
+
+
+def _multipart_error_code(error):
+    code = error.response.get("Error", {}).get("Code")
+    return code if code in MULTIPART_CLIENT_ERRORS else None
+
+
+def _file_too_large(file_size):
+    return Response({
+        "message": "Failed upload file",
+        "data": {
+            "file_size": file_size,
+            "allowed_size": MAX_FILE_SIZE,
+        },
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
 class ChunkUploadViewSet(GenericViewSet):
     """
     A viewset for handling chunked file uploads.
 
     Workflow:
-    1. `?is_init=true` – initialize the upload and create a session.
-    2. Upload chunks (`POST` with chunk data).
-    3. `?is_checksum=true` – finalize upload by verifying all chunks and saving the full file.
+    1. `?is_init=true` – initialize the upload and create a session (returns `upload_id`).
+    2. Upload chunks, in any order and in parallel:
+       - `PUT <upload_id>/chunks/<chunk_no>/` with the raw chunk as the request body, or
+       - `POST` with chunk data. With `encoding=binary` the chunk is sent as raw bytes in
+         the multipart `chunk_file` field instead of base64 text in `chunk`.
+    3. `GET <upload_id>/` – session status and missing chunks, to resume an interrupted upload.
+    4. `?is_checksum=true` – finalize upload by verifying all chunks and saving the full file.
+       Parts are streamed into the final file, so memory use does not grow with file size.
+
+    Clients that do not send `upload_id` are matched to their latest unfinished
+    session for `file_name`.
+
+    Every chunk is hashed while it is written. A chunk sent with its MD5
+    (`chunk_checksum`, or the `X-Chunk-Checksum` header on PUT) is rejected
+    right away if it does not match. At finalize, `checksum` may be the tree
+    hash – the MD5 of the concatenated hex MD5s of all chunks, in order – which
+    is checked against the stored digests without reading the parts again.
+    The MD5 of the whole uploaded data is still accepted and is computed while
+    the parts are assembled.
+
+    Direct uploads (S3 / DO Spaces only) skip this server entirely:
+    1. `POST direct/` – start an S3 multipart upload and get a presigned URL per chunk.
+    2. `PUT` each chunk's raw bytes to its URL (chunks of at least 5 MiB, except the last).
+       `GET <upload_id>/direct/parts/` re-signs the URLs of chunks not uploaded yet.
+    3. `POST <upload_id>/direct/complete/` – complete the multipart upload and create the file,
+       or `POST <upload_id>/direct/abort/` to discard it.
     """
     serializer_class = ChunkUploadSerializer
     permission_classes = (IsAuthenticated,)
     file_model_class = File
+    lookup_field = "upload_id"
+    lookup_value_regex = "[0-9a-f-]{36}"
+
+    def get_queryset(self):
+        if not self.request.user.is_authenticated:
+            return ChunkedUpload.objects.none()
+        return ChunkedUpload.objects.filter(created_by=self.request.user)
 
     @swagger_auto_schema(
         operation_description="""
         Handle chunked file upload lifecycle:
 
-        1. **Initialize Upload** (`?is_init=true`)  
+        1. **Initialize Upload** (`?is_init=true`)
            - Required fields: `file_name`
-           - Response: whether session was created
+           - Optional fields: `chunk_count`, `file_size`, `encoding`, `upload_id` (resume an existing session)
+           - `chunk_count` and `chunk_no` are bounded by `UPLOAD_MAX_CHUNKS` (10,000 by default)
+           - Uploads bound to exceed `UPLOAD_MAX_FILE_SIZE` are rejected at init and on each chunk
+           - Response: whether session was created, and its `upload_id`
 
         2. **Upload Chunk** (default POST)
            - Required fields:
-             - `file_name`
-             - `chunk`
+             - `file_name` (or `upload_id`)
+             - `chunk` (base64 text), or `chunk_file` (multipart, raw bytes) with `encoding=binary`
              - `chunk_no`
              - `chunk_count`
+           - Optional fields: `chunk_checksum` (MD5 of this chunk; a mismatch is rejected)
 
         3. **Finalize Upload** (`?is_checksum=true`)
            - Required fields:
-             - `file_name`
+             - `file_name` (or `upload_id`)
              - `chunk_count`
-             - `checksum` (full base64 MD5 hash)
+             - `checksum` (tree hash: MD5 of the concatenated chunk MD5s, or the MD5 of all uploaded data)
+             - `encoding` (`base64` by default, `binary` for raw chunks)
            - Verifies and saves the final file
         """,
         request_body=ChunkUploadSerializer,
@@ -80,72 +172,469 @@ class ChunkUploadViewSet(GenericViewSet):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        storage = STORAGE_CHUNK
         chunk = serializer.validated_data.get("chunk")
+        chunk_file = serializer.validated_data.get("chunk_file")
+        upload_id = serializer.validated_data.get("upload_id")
         file_name = serializer.validated_data.get("file_name")
         chunk_no = serializer.validated_data.get("chunk_no")
+        chunk_checksum = serializer.validated_data.get("chunk_checksum")
         checksum = serializer.validated_data.get("checksum")
         chunk_count = serializer.validated_data.get("chunk_count")
+        encoding = serializer.validated_data.get("encoding")
+        file_size = serializer.validated_data.get("file_size")
 
-        # INIT: create or reuse chunk upload session
+        # INIT: create a new session, or resume the one given by upload_id
         if request.GET.get("is_init"):
-            _data, created = ChunkedUpload.objects.get_or_create(
+            if upload_id:
+                session = self.get_queryset().filter(upload_id=upload_id).first()
+                if session is None:
+                    return Response({"message": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
+                return Response({"created": False, **self._status(session)})
+
+            if MAX_FILE_SIZE and file_size and file_size > MAX_FILE_SIZE:
+                return _file_too_large(file_size)
+            session = ChunkedUpload.objects.create(
                 filename=file_name,
+                created_by=request.user,
+                chunk_count=chunk_count,
+                file_size=file_size,
+                encoding=encoding or CHUNK_ENCODING_BASE64,
             )
-            return Response({"created": created})
+            return Response({"created": True, **self._status(session)})
+
+        session = self._get_session(request, upload_id, file_name, create=not request.GET.get("is_checksum"))
+        if session is None:
+            return Response({"message": "Upload session not found"}, status=status.HTTP_404_NOT_FOUND)
 
         # FINALIZE: verify checksum, merge and save
-        elif request.GET.get("is_checksum"):
-            base64_str = ""
-            for i in range(chunk_count):
-                chunk_file_name = file_name + f".part_{i}"
-                chunk_file = storage.open(chunk_file_name, mode="r")
-                base64_str += str(chunk_file.read())
-                storage.delete(chunk_file_name)
-
-            base64_bytes = base64_str.encode("utf-8")
-            hash_md5 = hashlib.md5()
-            hash_md5.update(base64_bytes)
-
-            if checksum == hash_md5.hexdigest():
-                file_data = b64decode(base64_str.split(",")[-1])
-                with io.BytesIO() as f:
-                    f.write(file_data)
-                    storage.save(file_name, f)
-
-                chunk_file = storage.open(file_name)
-                file_size = chunk_file.size
-
-                if MAX_FILE_SIZE and file_size > MAX_FILE_SIZE:
-                    storage.delete(file_name)
-                    return Response({
-                        "message": "Failed upload file",
-                        "data": {
-                            "file_size": file_size,
-                            "allowed_size": MAX_FILE_SIZE,
-                        },
-                    })
+        if request.GET.get("is_checksum"):
+            return self._finalize(session, chunk_count, checksum, encoding)
 
-                file_instance = self.file_model_class.objects.create(
-                    name=file_name
-                )
-                file_instance.file.save(file_name, chunk_file, save=True)
-                storage.delete(file_name)
+        # CHUNK UPLOAD: write part file
+        if chunk_no is None:
+            return Response({"message": "chunk_no is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if (encoding or session.encoding) == CHUNK_ENCODING_BINARY:
+            if chunk_file is None:
+                return Response({"message": "chunk_file is required for binary chunks"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            source = chunk_file
+            size = chunk_file.size
+        else:
+            if chunk is None:
+                return Response({"message": "chunk is required"}, status=status.HTTP_400_BAD_REQUEST)
+            source = io.StringIO(chunk)
+            size = len(chunk)
 
-                return Response({
-                    "message": "Success upload file",
-                    "data": {
-                        "url": file_instance.get_file(),
-                        "file_id": file_instance.pk,
-                        "file_name": file_instance.name,
-                    },
-                })
+        try:
+            digest = self._store_chunk(session, chunk_no, source, size=size, chunk_checksum=chunk_checksum,
+                                       chunk_count=chunk_count, encoding=encoding)
+        except FileTooLarge as e:
+            return _file_too_large(e.file_size)
+        except (ChunkUploadError, DigestMismatch) as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # CHUNK UPLOAD: write part file
-        with io.StringIO() as f:
-            f.write(chunk)
-            storage.save(file_name + f".part_{chunk_no}", f)
+        return Response({
+            "upload_id": session.upload_id,
+            "chunk_no": chunk_no,
+            "chunk_checksum": digest,
+        })
+
+    @swagger_auto_schema(
+        operation_description="Status of an upload session, including the chunk numbers still missing.",
+    )
+    def retrieve(self, request, upload_id=None):
+        return Response(self._status(self.get_object()))
+
+    @swagger_auto_schema(
+        operation_description="Upload one chunk as the raw request body. "
+                              "Chunks may be sent in any order and in parallel; re-sending a chunk replaces it.",
+        request_body=openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_BINARY),
+        manual_parameters=[
+            openapi.Parameter('X-Chunk-Checksum', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+                              description="MD5 hex digest of the chunk; the chunk is rejected on mismatch"),
+        ],
+    )
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<chunk_no>[0-9]+)')
+    def chunk(self, request, upload_id=None, chunk_no=None):
+        session = self.get_object()
+        chunk_no = int(chunk_no)
+        if chunk_no >= MAX_CHUNKS:
+            return Response({"message": f"chunk_no must be lower than {MAX_CHUNKS}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # read the body as a stream, without parsing or buffering it
+            digest = self._store_chunk(session, chunk_no, request._request,
+                                       size=int(request.META.get("CONTENT_LENGTH") or 0),
+                                       chunk_checksum=request.headers.get("X-Chunk-Checksum"))
+        except FileTooLarge as e:
+            return _file_too_large(e.file_size)
+        except (ChunkUploadError, DigestMismatch) as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({
+            "upload_id": session.upload_id,
             "chunk_no": chunk_no,
+            "chunk_checksum": digest,
+        })
+
+    def _get_session(self, request, upload_id, file_name, create=False):
+        sessions = self.get_queryset()
+        if upload_id:
+            return sessions.filter(upload_id=upload_id).first()
+
+        session = sessions.filter(filename=file_name, is_done=False).order_by("-created_at").first()
+        if session is None and create:
+            session = ChunkedUpload.objects.create(filename=file_name, created_by=request.user)
+        return session
+
+    def _status(self, session):
+        return {
+            "upload_id": session.upload_id,
+            "file_name": session.filename,
+            "chunk_count": session.chunk_count,
+            "file_size": session.file_size,
+            "received_bytes": session.received_bytes,
+            "encoding": session.encoding,
+            "is_done": session.is_done,
+            "received_chunks": session.received_chunks(),
+            "missing_chunks": session.missing_chunks(),
+            "checksum": session.tree_checksum(),
+        }
+
+    def _store_chunk(self, session, chunk_no, source, size=None, chunk_checksum=None, chunk_count=None,
+                     encoding=None):
+        """
+        Write a part to ``<upload_id>/part_<chunk_no>``, hashing it on the way,
+        then flag it in the session bitmap and record its digest and size. The
+        bytes are written to a temporary file outside the row lock, so chunks of
+        the same session upload in parallel, and renamed onto the part under the
+        lock once the chunk is accepted.
+
+        ``size`` (when known up front) is checked against the size limit before
+        anything is written; the stored size is checked again under the lock.
+
+        :return: MD5 hex digest of the chunk.
+        """
+        if session.is_done:
+            raise ChunkUploadError("Upload already finished")
+        if session.multipart_upload_id:
+            raise ChunkUploadError("Direct upload: send chunks to their presigned URLs")
+        chunk_count = chunk_count or session.chunk_count
+        if chunk_count is not None and chunk_no >= chunk_count:
+            raise ChunkUploadError(f"chunk_no must be lower than chunk_count ({chunk_count})")
+        encoding = encoding or session.encoding
+        if size is not None:
+            self._check_size(session, chunk_no, size, chunk_count, encoding)
+
+        part_path = STORAGE_CHUNK.path(session.part_name(chunk_no))
+        # written under a unique name and only moved onto part_<n> once accepted under
+        # the lock, so a rejected re-send never replaces the bytes the digests describe
+        tmp_path = f"{part_path}.{uuid.uuid4().hex}.tmp"
+        hash_md5 = hashlib.md5()
+        try:
+            size = write_atomic(tmp_path, source, hasher=hash_md5, expected_hexdigest=chunk_checksum)
+            digest = hash_md5.hexdigest()
+
+            with transaction.atomic():
+                locked = ChunkedUpload.objects.select_for_update().get(pk=session.pk)
+                if locked.is_done:
+                    raise ChunkUploadError("Upload already finished")
+                if locked.is_finalizing:
+                    raise ChunkUploadError("Upload is being finalized")
+                self._check_size(locked, chunk_no, size, chunk_count, encoding)
+
+                locked.mark_received(chunk_no)
+                locked.chunk_digests[str(chunk_no)] = digest
+                locked.chunk_sizes[str(chunk_no)] = size
+                locked.received_bytes = sum(locked.chunk_sizes.values())
+                update_fields = ["received", "chunk_digests", "chunk_sizes", "received_bytes", "updated_at"]
+                if chunk_count and not locked.chunk_count:
+                    locked.chunk_count = chunk_count
+                    update_fields.append("chunk_count")
+                if encoding != locked.encoding:
+                    locked.encoding = encoding
+                    update_fields.append("encoding")
+                locked.save(update_fields=update_fields)
+                # last: a failed save rolls back before the part changes
+                os.replace(tmp_path, part_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return digest
+
+    def _check_size(self, session, chunk_no, size, chunk_count, encoding):
+        """
+        Raise ``FileTooLarge`` when the file is bound to exceed
+        ``UPLOAD_MAX_FILE_SIZE``: by its declared size, by the bytes received
+        so far, or because every chunk but the last is at least this big.
+        """
+        if not MAX_FILE_SIZE:
+            return
+        received = size + sum(v for k, v in session.chunk_sizes.items() if k != str(chunk_no))
+        file_size = max(session.file_size or 0, _decoded_size(received, encoding))
+        if chunk_count and chunk_no < chunk_count - 1:
+            file_size = max(file_size, _decoded_size(size, encoding) * (chunk_count - 1))
+        if file_size > MAX_FILE_SIZE:
+            raise FileTooLarge(file_size)
+
+    def _finalize(self, session, chunk_count, checksum, encoding):
+        """
+        Stream the part files into ``FILE_STORAGE`` in fixed-size buffers,
+        decoding base64 parts on the fly, and create the ``File``.
+
+        The session is checked and marked ``finalizing_at`` under its row lock,
+        which then commits: new chunks are refused while the parts are streamed
+        out with no transaction open, and the lock is only taken again to
+        record the result.
+
+        A tree hash ``checksum`` is verified from the stored chunk digests up
+        front; otherwise the parts are hashed while they are read, in the same
+        pass that writes them. With a local ``FILE_STORAGE`` the parts are
+        assembled next to them and renamed into place; with object storage they
+        are streamed straight to the bucket.
+        """
+        with transaction.atomic():
+            session = ChunkedUpload.objects.select_for_update().get(pk=session.pk)
+            if session.is_done:
+                return Response({"message": "Upload already finished"}, status=status.HTTP_400_BAD_REQUEST)
+            if session.is_finalizing:
+                return Response({"message": "Upload is being finalized"}, status=status.HTTP_409_CONFLICT)
+            if session.multipart_upload_id:
+                return Response({"message": "Direct upload: finalize with direct/complete"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            chunk_count = chunk_count or session.chunk_count
+            if not chunk_count:
+                return Response({"message": "chunk_count is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+            missing = session.missing_chunks(chunk_count)
+            if missing:
+                return Response({
+                    "message": "Missing chunks",
+                    "data": {"missing_chunks": missing},
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            tree_checksum = session.tree_checksum(chunk_count)
+            session.finalizing_at = timezone.now()
+            session.save(update_fields=["finalizing_at", "updated_at"])
+
+        verified = tree_checksum is not None and checksum == tree_checksum
+        encoding = encoding or session.encoding
+        file_name = session.filename
+        part_paths = [STORAGE_CHUNK.path(session.part_name(i)) for i in range(chunk_count)]
+        hash_md5 = None if verified else hashlib.md5()
+        reader = ConcatReader(part_paths, hasher=hash_md5, limit=MAX_FILE_SIZE,
+                              decoder=Base64StreamDecoder() if encoding == CHUNK_ENCODING_BASE64 else None)
+
+        # reserved name: never one of the session's part files, whatever the client named the file
+        assembled_path = STORAGE_CHUNK.path(f"{session.upload_id}/.assembled")
+        stored_name = None
+        try:
+            if is_local_storage(FILE_STORAGE):
+                with open(assembled_path, "wb") as destination:
+                    copy_stream(reader, destination)
+                if not verified and checksum != hash_md5.hexdigest():
+                    return self._finalize_failed(session, self._checksum_mismatch(hash_md5.hexdigest(),
+                                                                                  tree_checksum))
+                stored_name = move_into_storage(assembled_path, file_name)
+            else:
+                stored_name = FILE_STORAGE.save(file_name, DjangoFile(reader, name=file_name))
+                if not verified and checksum != hash_md5.hexdigest():
+                    FILE_STORAGE.delete(stored_name)
+                    return self._finalize_failed(session, self._checksum_mismatch(hash_md5.hexdigest(),
+                                                                                  tree_checksum))
+        except StreamLimitExceeded as e:
+            # can never succeed: close the session and remove its parts
+            ChunkedUpload.objects.filter(pk=session.pk).update(is_done=True, finalizing_at=None,
+                                                               updated_at=timezone.now())
+            shutil.rmtree(STORAGE_CHUNK.path(str(session.upload_id)), ignore_errors=True)
+            return _file_too_large(e.size)
+        except ValueError as e:
+            return self._finalize_failed(session, Response({"message": str(e)},
+                                                           status=status.HTTP_400_BAD_REQUEST))
+        except BaseException:
+            self._finalize_failed(session)
+            raise
+        finally:
+            if os.path.exists(assembled_path):
+                os.remove(assembled_path)
+
+        with transaction.atomic():
+            session = ChunkedUpload.objects.select_for_update().get(pk=session.pk)
+            file_instance = self.file_model_class.objects.create(
+                name=file_name,
+                file=stored_name,
+            )
+            session.is_done = True
+            session.finalizing_at = None
+            session.chunk_count = chunk_count
+            session.save(update_fields=["is_done", "finalizing_at", "chunk_count", "updated_at"])
+
+        shutil.rmtree(STORAGE_CHUNK.path(str(session.upload_id)), ignore_errors=True)
+
+        return Response({
+            "message": "Success upload file",
+            "data": {
+                "url": file_instance.get_file(),
+                "file_id": file_instance.pk,
+                "file_name": file_instance.name,
+            },
         })
+
+    def _finalize_failed(self, session, response=None):
+        """
+        Reopen the session after a finalize that can be retried.
+        """
+        ChunkedUpload.objects.filter(pk=session.pk).update(finalizing_at=None, updated_at=timezone.now())
+        return response
+
+    def _checksum_mismatch(self, checksum, tree_checksum):
+        return Response({
+            "message": "Checksum mismatch",
+            "data": {"checksum": checksum, "tree_checksum": tree_checksum},
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(
+        operation_description="Start a direct upload to object storage. "
+                              "Returns a presigned URL per chunk; `PUT` the chunk bytes to it.",
+        request_body=DirectUploadSerializer,
+    )
+    @action(detail=False, methods=['post'], url_path='direct')
+    def direct(self, request):
+        if not USE_OBJECT_STORAGE:
+            return Response({"message": "Direct uploads require object storage (USE_S3 or USE_DO_SPACE)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = DirectUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file_name = serializer.validated_data["file_name"]
+        chunk_count = serializer.validated_data["chunk_count"]
+        file_size = serializer.validated_data.get("file_size")
+        if MAX_FILE_SIZE and file_size and file_size > MAX_FILE_SIZE:
+            return _file_too_large(file_size)
+
+        storage_name = FILE_STORAGE.get_available_name(file_name)
+        session = ChunkedUpload.objects.create(
+            filename=file_name,
+            created_by=request.user,
+            chunk_count=chunk_count,
+            file_size=file_size,
+            encoding=CHUNK_ENCODING_BINARY,
+            storage_name=storage_name,
+            multipart_upload_id=create_multipart_upload(storage_name),
+        )
+        return Response({
+            "upload_id": session.upload_id,
+            "file_name": session.filename,
+            "chunk_count": chunk_count,
+            "parts": self._presign(session, range(chunk_count)),
+        }, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(operation_description="Presigned URLs for the chunks of a direct upload not uploaded yet.")
+    @action(detail=True, methods=['get'], url_path='direct/parts')
+    def direct_parts(self, request, upload_id=None):
+        session = self._get_direct_session()
+        try:
+            uploaded = list_uploaded_parts(session.storage_name, session.multipart_upload_id)
+        except ClientError as e:
+            return self._multipart_failed(session, e)
+        missing = [i for i in range(session.chunk_count) if i + 1 not in uploaded]
+        return Response({
+            "upload_id": session.upload_id,
+            "received_chunks": sorted(number - 1 for number in uploaded),
+            "missing_chunks": missing,
+            "parts": self._presign(session, missing),
+        })
+
+    @swagger_auto_schema(operation_description="Complete a direct upload and create the file.")
+    @action(detail=True, methods=['post'], url_path='direct/complete')
+    def direct_complete(self, request, upload_id=None):
+        with transaction.atomic():
+            session = self._get_direct_session(lock=True)
+            try:
+                uploaded = list_uploaded_parts(session.storage_name, session.multipart_upload_id)
+            except ClientError as e:
+                return self._multipart_failed(session, e)
+            missing = [i for i in range(session.chunk_count) if i + 1 not in uploaded]
+            if missing:
+                return Response({
+                    "message": "Missing chunks",
+                    "data": {"missing_chunks": missing},
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            parts = {number: part for number, part in uploaded.items() if number <= session.chunk_count}
+            file_size = sum(part["Size"] for part in parts.values())
+            if MAX_FILE_SIZE and file_size > MAX_FILE_SIZE:
+                abort_multipart_upload(session.storage_name, session.multipart_upload_id)
+                session.is_done = True
+                session.save(update_fields=["is_done", "updated_at"])
+                return _file_too_large(file_size)
+
+            try:
+                complete_multipart_upload(session.storage_name, session.multipart_upload_id, parts)
+            except ClientError as e:
+                return self._multipart_failed(session, e)
+            file_instance = self.file_model_class.objects.create(
+                name=session.filename,
+                file=session.storage_name,
+            )
+            session.is_done = True
+            session.save(update_fields=["is_done", "updated_at"])
+
+        return Response({
+            "message": "Success upload file",
+            "data": {
+                "url": file_instance.get_file(),
+                "file_id": file_instance.pk,
+                "file_name": file_instance.name,
+            },
+        })
+
+    @swagger_auto_schema(operation_description="Abort a direct upload and discard the uploaded chunks.")
+    @action(detail=True, methods=['post'], url_path='direct/abort')
+    def direct_abort(self, request, upload_id=None):
+        with transaction.atomic():
+            session = self._get_direct_session(lock=True)
+            try:
+                abort_multipart_upload(session.storage_name, session.multipart_upload_id)
+            except ClientError as e:
+                # already gone (aborted or expired) is as good as aborted
+                if _multipart_error_code(e) != "NoSuchUpload":
+                    raise
+            session.is_done = True
+            session.save(update_fields=["is_done", "updated_at"])
+        return Response({"upload_id": session.upload_id, "aborted": True})
+
+    def _get_direct_session(self, lock=False):
+        sessions = self.get_queryset().filter(multipart_upload_id__isnull=False, is_done=False)
+        if lock:
+            sessions = sessions.select_for_update()
+        return get_object_or_404(sessions, upload_id=self.kwargs["upload_id"])
+
+    def _multipart_failed(self, session, error):
+        """
+        400 for errors caused by the client's parts or session, re-raise the rest.
+        A session whose multipart upload no longer exists is closed; otherwise
+        it stays open so the client can re-upload parts and complete again.
+        """
+        code = _multipart_error_code(error)
+        if code is None:
+            raise error
+        if code == "NoSuchUpload":
+            session.is_done = True
+            session.save(update_fields=["is_done", "updated_at"])
+        return Response({
+            "message": "Failed upload file",
+            "data": {
+                "code": code,
+                "detail": error.response["Error"].get("Message"),
+                "is_done": session.is_done,
+            },
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    def _presign(self, session, chunk_nos):
+        urls = presign_upload_parts(session.storage_name, session.multipart_upload_id,
+                                    [chunk_no + 1 for chunk_no in chunk_nos])
+        return [
+            {"chunk_no": part_number - 1, "part_number": part_number, "url": url}
+            for part_number, url in urls.items()
+        ]
@@ -0,0 +1,84 @@
+from django.db.models import Q
+from django.http import Http404, HttpResponseRedirect
+from django.utils.cache import patch_cache_control
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny
+from rest_framework.viewsets import GenericViewSet
+
+from drf_yasg.utils import swagger_auto_schema
+from drf_yasg import openapi
+
+from ..images import VARIANT_WIDTHS, get_or_create_variant, is_image, supported_formats
+from ..models import File
+
+# files shown on public pages: campaign images and placement assets
+PUBLIC_FILES = (
+    Q(campaign_featured_image__is_deleted=False)
+    | Q(campaign_images__is_deleted=False)
+    | Q(qr_code__is_deleted=False)
+    | Q(qr_code_svg__is_deleted=False)
+    | Q(donation_card__is_deleted=False)
+)
+
+
+class FileVariantViewSet(GenericViewSet):
+    """
+    Redirects to a resized/re-encoded variant of an image file.
+
+    Anyone can fetch variants of public files; expense receipts are only
+    served to the organizer of the campaign.
+
+    The variant is rendered on the first request and reused afterwards;
+    while another request renders it, or if it cannot be produced, the
+    client is redirected to the original.
+    """
+    queryset = File.objects.all()
+    permission_classes = (AllowAny,)
+
+    def get_queryset(self):
+        visible = PUBLIC_FILES
+        if self.request.user.is_authenticated:
+            visible = visible | Q(expense__campaign__organizer=self.request.user, expense__is_deleted=False)
+        return super().get_queryset().filter(visible).distinct()
+
+    def perform_content_negotiation(self, request, force=False):
+        # ``format`` is the image format here, not DRF's renderer override
+        renderer = self.get_renderers()[0]
+        return renderer, renderer.media_type
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('width', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True,
+                              description=f"Target width, one of {list(VARIANT_WIDTHS)}"),
+            openapi.Parameter('format', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                              description="Target format, e.g. webp or avif"),
+        ],
+        responses={302: "Redirect to the variant (or original) file URL"}
+    )
+    def retrieve(self, request, pk=None):
+        file_instance = self.get_object()
+        if not is_image(file_instance):
+            raise Http404("File is not an image.")
+
+        try:
+            width = int(request.query_params.get("width", ""))
+        except ValueError:
+            raise ValidationError({"width": "A valid integer is required."})
+        fmt = request.query_params.get("format", "").lower()
+
+        if width not in VARIANT_WIDTHS:
+            raise ValidationError({"width": f"Must be one of {list(VARIANT_WIDTHS)}."})
+        if fmt not in supported_formats():
+            raise ValidationError({"format": f"Must be one of {supported_formats()}."})
+
+        variant = get_or_create_variant(file_instance, width, fmt)
+        if variant is None:
+            return HttpResponseRedirect(file_instance.get_file())
+
+        response = HttpResponseRedirect(variant.image.url)
+        if not request.user.is_authenticated or File.objects.filter(PUBLIC_FILES, pk=file_instance.pk).exists():
+            patch_cache_control(response, public=True, max_age=86400)
+        else:
+            patch_cache_control(response, private=True, max_age=86400)
+        return response
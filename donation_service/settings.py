@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'libs.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -65,6 +66,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'libs.middleware.SSOUserMiddleware',
     'auditlog.middleware.AuditlogMiddleware',
+    'libs.middleware.AuditlogBufferMiddleware',
 
 ]
 
@@ -213,11 +215,50 @@ SIMPLE_JWT = {
 
 CORS_ORIGIN_ALLOW_ALL = True
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://localhost:6379/1",
+    }
+}
+
+# Responsive image variants, rendered on first request
+IMAGE_VARIANT_WIDTHS = [320, 640, 1024, 1920]
+IMAGE_VARIANT_FORMATS = ["avif", "webp"]
+# Uploaded campaign/expense images are normalized to fit within this size
+IMAGE_MASTER_MAX_DIMENSION = 2560
+
 BUCKET_LOCATION = 'donation'
 
+# Audit log entries of a request/task are written in one bulk insert after
+# commit ("inline"), or handed to the maintenance queue ("queue")
+AUDITLOG_BUFFER_FLUSH = "inline"
+# Audit log entries older than the current and previous N months are moved to
+# monthly compressed archives (common.tasks.archive_audit_log, daily)
+AUDITLOG_HOT_MONTHS = 3
+
+# Prometheus metrics at /metrics (libs/metrics.py), for these addresses or
+# with "Authorization: Bearer $METRICS_TOKEN"; query count/time response
+# headers are added while DEBUG is on
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Repeated enqueues of the same (task, object) within this window run once
+TASK_COALESCE_WINDOW = 1.0
+
+# Named task queues (see libs.queues), each served by its own qcluster process:
+#   python manage.py qcluster                                    -> ledger
+#   Q_CLUSTER_NAME=donation-images python manage.py qcluster      -> images
+#   Q_CLUSTER_NAME=donation-maintenance python manage.py qcluster -> maintenance
+TASK_QUEUES = {
+    "ledger": "donation-cluster",
+    "images": "donation-images",
+    "maintenance": "donation-maintenance",
+}
+
 Q_CLUSTER = {
     "name": "donation-cluster",
-    "workers": 4,
+    "workers": int(os.environ.get("Q_LEDGER_WORKERS", 4)),
     "timeout": 90,
     "retry": 120,
     "queue_limit": 50,
@@ -230,4 +271,23 @@ Q_CLUSTER = {
         "port": 6379,
         "db": 0,
     },
+    "ALT_CLUSTERS": {
+        "donation-images": {
+            # at most half the cores, so renders never starve the ledger cluster
+            "workers": int(os.environ.get("Q_IMAGES_WORKERS", max(1, (os.cpu_count() or 2) // 2))),
+            "timeout": 900,  # batched card renders for large placement sets
+            "retry": 960,
+            "max_attempts": 3,
+            "queue_limit": 20,
+            "bulk": 1,
+        },
+        "donation-maintenance": {
+            "workers": int(os.environ.get("Q_MAINTENANCE_WORKERS", 1)),
+            "timeout": 3600,
+            "retry": 3700,
+            "max_attempts": 1,
+            "queue_limit": 5,
+            "bulk": 1,
+        },
+    },
 }
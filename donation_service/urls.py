@@ -17,6 +17,8 @@ from campaigns.views import (
 )
 from common.views import FileViewSet
 from common.views.chunk_upload import ChunkUploadViewSet
+from common.views.variant import FileVariantViewSet
+from libs.metrics import metrics_view
 
 # Setup router
 router = DefaultRouter()
@@ -28,6 +30,7 @@ router.register(r'allocations', FundAllocationViewSet, basename='allocation')
 router.register(r'withdrawals', FundWithdrawalRequestViewSet, basename='withdrawal')
 router.register(r'files/upload', FileViewSet, basename='file_upload')
 router.register(r'files/chunk-upload', ChunkUploadViewSet, basename='file_chunk_upload')
+router.register(r'files/variants', FileVariantViewSet, basename='file_variant')
 
 # Swagger schema config
 schema_view = get_schema_view(
@@ -50,6 +53,7 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('swagger.json', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 if settings.DEBUG:
     urlpatterns.append(path('admin/', custom_admin_site.urls))
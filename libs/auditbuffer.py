@@ -0,0 +1,270 @@
+"""
+Buffered audit log writes.
+
+django-auditlog inserts one ``LogEntry`` per save/delete of a registered model,
+synchronously and inside the caller's transaction. Within ``buffered_auditlog()``
+(wrapped around every request by ``AuditlogBufferMiddleware``, and usable in
+tasks and commands) the entries are built the same way but collected instead,
+and written with one ``bulk_create`` once the writes they describe have
+committed:
+
+- an entry made inside ``transaction.atomic`` is only kept if that
+  transaction commits, just like a synchronous insert would have been;
+- entries are flushed when the block exits, also if it exits with an
+  exception (autocommitted writes before the error are still logged);
+- a failed flush is retried through the maintenance queue, where django-q
+  keeps failed tasks, so entries are not dropped.
+
+``AUDITLOG_BUFFER_FLUSH = "queue"`` hands every flush to the queue instead
+of writing in-process.
+
+While buffering, auditlog's own receivers are switched off through its
+``auditlog_disabled`` context variable, set to a sentinel; a nested
+``disable_auditlog()`` still disables logging altogether. Actor and remote
+address are taken when the entry is built, from the same ``pre_save`` hook
+``AuditlogMiddleware`` uses. ``m2m_fields`` changes are not buffered; no model
+registers any here.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from auditlog.cid import get_cid
+from auditlog.conf import settings as auditlog_settings
+from auditlog.context import auditlog_disabled
+from auditlog.diff import model_instance_diff
+from auditlog.models import DEFAULT_OBJECT_REPR, LogEntry
+from auditlog.registry import auditlog
+from auditlog.signals import post_log, pre_log
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.encoding import smart_str
+
+from libs.queues import MAINTENANCE, enqueue
+
+logger = logging.getLogger(__name__)
+
+AUDITLOG_BUFFER_FLUSH = getattr(settings, "AUDITLOG_BUFFER_FLUSH", "inline")  # or "queue"
+AUDITLOG_BUFFER_BATCH_SIZE = getattr(settings, "AUDITLOG_BUFFER_BATCH_SIZE", 500)
+
+# value of auditlog_disabled while buffering: truthy for auditlog, recognizable for us
+_BUFFERING = type("Buffering", (), {"__bool__": lambda self: True, "__repr__": lambda self: "<buffering>"})()
+
+_buffer = ContextVar("auditlog_buffer", default=None)
+
+
+class AuditBuffer:
+    def __init__(self):
+        self.entries = []
+        self.closed = False
+
+    def add(self, entry):
+        using = router.db_for_write(LogEntry)
+        if transaction.get_connection(using).in_atomic_block:
+            transaction.on_commit(lambda: self._committed(entry), using=using)
+        else:
+            self._committed(entry)
+
+    def _committed(self, entry):
+        if self.closed:
+            # the block ended inside an outer transaction that has now committed
+            flush_entries([entry])
+            return
+        self.entries.append(entry)
+        if len(self.entries) >= AUDITLOG_BUFFER_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        if entries:
+            flush_entries(entries)
+
+    def close(self):
+        self.closed = True
+        self.flush()
+
+
+@contextmanager
+def buffered_auditlog():
+    """
+    Collect audit entries made in this block and write them in bulk (see module doc).
+    Nested blocks join the outermost one.
+    """
+    if _buffer.get() is not None or auditlog_disabled.get():
+        yield _buffer.get()
+        return
+    buffer = AuditBuffer()
+    buffer_token = _buffer.set(buffer)
+    disabled_token = auditlog_disabled.set(_BUFFERING)
+    try:
+        yield buffer
+    finally:
+        auditlog_disabled.reset(disabled_token)
+        _buffer.reset(buffer_token)
+        buffer.close()
+
+
+def _entry_values(entry):
+    return {field.attname: getattr(entry, field.attname)
+            for field in LogEntry._meta.concrete_fields if not field.primary_key}
+
+
+def write_entries(values):
+    """
+    Queue task: insert entries given as field value dicts.
+    """
+    LogEntry.objects.bulk_create([LogEntry(**row) for row in values], batch_size=AUDITLOG_BUFFER_BATCH_SIZE)
+    return len(values)
+
+
+def flush_entries(entries):
+    if AUDITLOG_BUFFER_FLUSH != "queue":
+        try:
+            LogEntry.objects.bulk_create(entries, batch_size=AUDITLOG_BUFFER_BATCH_SIZE)
+            return
+        except Exception as e:
+            logger.warning(f"Could not write {len(entries)} audit log entries, retrying through the queue: {e}")
+    values = [_entry_values(entry) for entry in entries]
+    try:
+        enqueue(write_entries, values, queue=MAINTENANCE)
+    except Exception:
+        # last resort: keep them in the logs rather than lose them
+        logger.exception(f"Could not queue audit log entries: {values}")
+
+
+def _active_buffer():
+    if auditlog_disabled.get() is not _BUFFERING:
+        return None
+    return _buffer.get()
+
+
+def save_log_entry(entry):
+    """
+    Save a hand-built entry (e.g. one describing a bulk ``update()``, which
+    sends no signals): buffered when inside ``buffered_auditlog()``, skipped
+    under ``disable_auditlog()``, otherwise saved right away.
+    """
+    disabled = auditlog_disabled.get()
+    if disabled and disabled is not _BUFFERING:
+        return None
+    entry.cid = entry.cid or get_cid()
+    buffer = _active_buffer()
+    if buffer is None:
+        entry.save()
+        return entry
+    pre_save.send(sender=LogEntry, instance=entry, raw=False,
+                  using=router.db_for_write(LogEntry), update_fields=None)
+    buffer.add(entry)
+    return entry
+
+
+def log_bulk_write(action, instances, old_instances=None, fields=None):
+    """
+    Audit entries for rows written with ``bulk_create``/``bulk_update``, which
+    send no signals. ``old_instances`` (same order) are the pre-update copies.
+    """
+    for i, instance in enumerate(instances):
+        old = old_instances[i] if old_instances is not None else None
+        changes = model_instance_diff(old, instance, fields_to_check=fields)
+        if not changes:
+            continue
+        pk = LogEntry.objects._get_pk_value(instance)
+        save_log_entry(LogEntry(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_pk=pk,
+            object_id=pk if isinstance(pk, int) else None,
+            object_repr=smart_str(instance),
+            serialized_data=LogEntry.objects._get_serialized_data_or_none(instance),
+            action=action,
+            changes=changes,
+        ))
+
+
+def _buffer_log_entry(buffer, action, instance, sender, diff_old, diff_new, fields_to_check=None):
+    """
+    ``auditlog.receivers._create_log_entry`` and ``LogEntryManager.log_create``,
+    building the entry instead of saving it.
+    """
+    pre_log_results = pre_log.send(sender, instance=instance, action=action)
+    if any(item[1] is False for item in pre_log_results):
+        return
+
+    error = None
+    entry = None
+    changes = None
+    try:
+        changes = model_instance_diff(diff_old, diff_new, fields_to_check=fields_to_check)
+        if changes:
+            pk = LogEntry.objects._get_pk_value(instance)
+            try:
+                object_repr = smart_str(instance)
+            except ObjectDoesNotExist:
+                object_repr = DEFAULT_OBJECT_REPR
+            entry = LogEntry(
+                content_type=ContentType.objects.get_for_model(instance),
+                object_pk=pk,
+                object_id=pk if isinstance(pk, int) else None,
+                object_repr=object_repr,
+                serialized_data=LogEntry.objects._get_serialized_data_or_none(instance),
+                action=action,
+                changes=changes,
+                cid=get_cid(),
+            )
+            get_additional_data = getattr(instance, "get_additional_data", None)
+            if callable(get_additional_data):
+                entry.additional_data = get_additional_data()
+            # what save() would send: AuditlogMiddleware sets actor/remote_addr here
+            pre_save.send(sender=LogEntry, instance=entry, raw=False,
+                          using=router.db_for_write(LogEntry), update_fields=None)
+            buffer.add(entry)
+    except BaseException as e:
+        error = e
+    finally:
+        if entry or error:
+            post_log.send(sender, instance=instance, instance_old=diff_old, action=action, error=error,
+                          pre_log_results=pre_log_results, changes=changes, log_entry=entry,
+                          log_created=entry is not None)
+        if error:
+            raise error
+
+
+def _raw_skipped(kwargs):
+    return kwargs.get("raw") and auditlog_settings.AUDITLOG_DISABLE_ON_RAW_SAVE
+
+
+def log_create(sender, instance, created, **kwargs):
+    buffer = _active_buffer()
+    if buffer is None or not created or _raw_skipped(kwargs):
+        return
+    _buffer_log_entry(buffer, LogEntry.Action.CREATE, instance, sender, None, instance)
+
+
+def log_update(sender, instance, **kwargs):
+    buffer = _active_buffer()
+    if buffer is None or instance._state.adding or _raw_skipped(kwargs):
+        return
+    old = sender.objects.filter(pk=instance.pk).first()
+    _buffer_log_entry(buffer, LogEntry.Action.UPDATE, instance, sender, old, instance,
+                      fields_to_check=kwargs.get("update_fields"))
+
+
+def log_delete(sender, instance, **kwargs):
+    buffer = _active_buffer()
+    if buffer is None or instance.pk is None or _raw_skipped(kwargs):
+        return
+    _buffer_log_entry(buffer, LogEntry.Action.DELETE, instance, sender, instance, None)
+
+
+def connect_receivers():
+    """
+    Connect the buffering receivers for every model registered with auditlog.
+    Call once the models are registered (``AppConfig.ready``).
+    """
+    for model in auditlog.get_models():
+        uid = f"auditbuffer:{model._meta.label}"
+        post_save.connect(log_create, sender=model, dispatch_uid=uid)
+        pre_save.connect(log_update, sender=model, dispatch_uid=uid)
+        post_delete.connect(log_delete, sender=model, dispatch_uid=uid)
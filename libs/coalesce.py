@@ -0,0 +1,115 @@
+"""
+Task coalescing for django-q.
+
+``coalesced_async_task(func, key, ...)`` keeps at most one pending run per
+(task, key) in the shared cache. While a run is pending, further requests only
+replace its arguments, so the run executes once with the latest ones. The run
+itself waits out a short debounce window measured from the first request,
+which absorbs bursts such as several saves of the same placement.
+
+Counters of requested and collapsed enqueues are kept in the cache as well;
+see ``coalesce_stats``.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from django_q.tasks import async_task
+
+from libs.queues import LEDGER, cluster_for
+
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW = getattr(settings, "TASK_COALESCE_WINDOW", 1.0)  # seconds
+COALESCE_PENDING_TIMEOUT = getattr(settings, "TASK_COALESCE_PENDING_TIMEOUT", 600)
+
+_STATS_FUNCS_KEY = "coalesce:stats:funcs"
+
+
+def _func_path(func):
+    if isinstance(func, str):
+        return func
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def _cache_key(func_path, key, suffix):
+    return f"coalesce:{func_path}:{key}:{suffix}"
+
+
+def _incr(func_path, counter):
+    stats_key = f"coalesce:stats:{func_path}:{counter}"
+    cache.add(stats_key, 0, None)
+    try:
+        cache.incr(stats_key)
+    except ValueError:
+        # evicted between add and incr
+        cache.set(stats_key, 1, None)
+
+    funcs = cache.get(_STATS_FUNCS_KEY) or []
+    if func_path not in funcs:
+        cache.set(_STATS_FUNCS_KEY, funcs + [func_path], None)
+
+
+def coalesced_async_task(func, key, *args, queue=LEDGER, q_options=None, **kwargs):
+    """
+    Enqueue ``func(*args, **kwargs)`` unless a run for the same ``(func, key)``
+    is already pending, in which case that run picks up these arguments.
+
+    :param func: Task function or its dotted path.
+    :param key: Identifies the object the task works on, e.g. a placement id.
+    :param queue: Named queue (see ``libs.queues``) the run is sent to.
+    :param q_options: Extra django-q options passed to ``async_task``.
+    :return: The django-q task id, or None if the request was collapsed.
+    """
+    func_path = _func_path(func)
+    cache.set(_cache_key(func_path, key, "args"), (args, kwargs), COALESCE_PENDING_TIMEOUT)
+    _incr(func_path, "requested")
+
+    if not cache.add(_cache_key(func_path, key, "pending"), time.time(), COALESCE_PENDING_TIMEOUT):
+        _incr(func_path, "collapsed")
+        logger.debug(f"Collapsed {func_path} for {key} into the pending run")
+        return None
+
+    _incr(func_path, "enqueued")
+    q_options = dict(q_options or {}, cluster=cluster_for(queue))
+    return async_task(run_coalesced, func_path, key, q_options=q_options)
+
+
+def run_coalesced(func_path, key):
+    """
+    Worker side of ``coalesced_async_task``: wait for the debounce window,
+    release the pending slot and run the task with the latest arguments.
+    """
+    pending_key = _cache_key(func_path, key, "pending")
+    first_requested = cache.get(pending_key)
+    if first_requested:
+        remaining = first_requested + COALESCE_WINDOW - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    # Release the slot before reading the arguments: a request arriving after
+    # this point enqueues a new run instead of being lost.
+    cache.delete(pending_key)
+    stored = cache.get(_cache_key(func_path, key, "args"))
+    if stored is None:
+        logger.warning(f"Arguments for coalesced {func_path} ({key}) expired, skipping run")
+        return None
+    args, kwargs = stored
+
+    func = import_string(func_path)
+    return func(*args, **kwargs)
+
+
+def coalesce_stats():
+    """
+    Return ``{func_path: {"requested": n, "enqueued": n, "collapsed": n}}``.
+    """
+    funcs = cache.get(_STATS_FUNCS_KEY) or []
+    counters = ("requested", "enqueued", "collapsed")
+    values = cache.get_many([f"coalesce:stats:{f}:{c}" for f in funcs for c in counters])
+    return {
+        f: {c: values.get(f"coalesce:stats:{f}:{c}", 0) for c in counters}
+        for f in funcs
+    }
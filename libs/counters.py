@@ -0,0 +1,82 @@
+"""
+Cached counters for dashboard badges.
+
+``register(name, count, models)`` declares a counter computed by ``count()``
+(usually a ``.count()`` query) and kept in the shared cache until one of
+``models`` is saved or deleted, or ``COUNTER_TIMEOUT`` passes. Invalidation
+runs after the surrounding transaction commits, so the next read never
+recounts rows that are about to change. ``get_counts`` reads several counters
+with a single cache round trip; only the missing ones hit the database.
+
+Bulk ``update()``/``delete()`` calls send no signals: call ``invalidate``
+after them.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from libs.metrics import record_cache
+
+COUNTER_TIMEOUT = getattr(settings, "CACHED_COUNTER_TIMEOUT", 300)  # seconds
+
+_counters = {}
+
+
+class CachedCounter:
+    def __init__(self, name, count, timeout=COUNTER_TIMEOUT, condition=None):
+        self.name = name
+        self.count = count
+        self.timeout = timeout
+        self.condition = condition
+
+    @property
+    def key(self):
+        return f"counter:{self.name}"
+
+    def get(self):
+        return get_counts([self.name])[self.name]
+
+    def invalidate(self):
+        cache.delete(self.key)
+
+    def _changed(self, sender, instance, **kwargs):
+        if self.condition is None or self.condition(instance):
+            transaction.on_commit(self.invalidate)
+
+
+def register(name, count, models=(), timeout=COUNTER_TIMEOUT, condition=None):
+    """
+    Declare the counter ``name``, invalidated whenever an instance of one of
+    ``models`` is saved or deleted; only those for which ``condition(instance)``
+    is true when given.
+    """
+    counter = CachedCounter(name, count, timeout=timeout, condition=condition)
+    for model in models:
+        uid = f"counter:{name}:{model._meta.label}"
+        post_save.connect(counter._changed, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(counter._changed, sender=model, weak=False, dispatch_uid=uid)
+    _counters[name] = counter
+    return counter
+
+
+def get_counts(names):
+    """
+    Return ``{name: value}`` for the given counters.
+    """
+    counters = [_counters[name] for name in names]
+    cached = cache.get_many([counter.key for counter in counters])
+    values, missing = {}, {}
+    for counter in counters:
+        if counter.key in cached:
+            values[counter.name] = cached[counter.key]
+        else:
+            values[counter.name] = missing[counter] = counter.count()
+    for counter, value in missing.items():
+        cache.set(counter.key, value, counter.timeout)
+    record_cache("counters", hits=len(counters) - len(missing), misses=len(missing))
+    return values
+
+
+def invalidate(*names):
+    cache.delete_many([_counters[name].key for name in names])
@@ -0,0 +1,304 @@
+"""
+Local read-through disk cache in front of remote file storage.
+
+Server-side readers (card rendering, image normalization, variants) open the
+same source images over and over; with S3/Spaces each open is a full download.
+``ReadCacheStorage`` wraps a storage and keeps the downloaded objects in a
+local directory:
+
+- entries are evicted least recently used first once the directory grows past
+  ``max_size`` bytes, down to ``FILE_READ_CACHE_LOW_WATER`` of it. The total
+  size is tracked in the shared Django cache, so the directory is only walked
+  when it is over budget (or the total is unknown), not on every miss;
+- an entry is served without asking the bucket for ``revalidate_after``
+  seconds, after that it is revalidated with a conditional GET (``If-None-Match``
+  on the stored ETag), which costs a round trip but no transfer if unchanged;
+- writes and deletes go straight to the wrapped storage, deletes also drop the
+  local entry.
+
+Several worker processes can share one cache directory: entries are written
+through a temporary file and renamed into place. Local storages are passed
+through untouched.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File as DjangoFile
+from django.core.files.storage import Storage
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+from libs.metrics import record_cache
+from libs.storage import FILE_STORAGE, MEDIA_ROOT, is_local_storage
+from libs.streams import write_atomic
+
+logger = logging.getLogger(__name__)
+
+FILE_READ_CACHE_ROOT = getattr(settings, "FILE_READ_CACHE_ROOT", os.path.join(MEDIA_ROOT, "cache"))
+FILE_READ_CACHE_SIZE = getattr(settings, "FILE_READ_CACHE_SIZE", 512 * 1024 * 1024)  # bytes
+FILE_READ_CACHE_REVALIDATE = getattr(settings, "FILE_READ_CACHE_REVALIDATE", 300)  # seconds
+# eviction frees space down to this fraction of the budget, so it runs once per batch of misses
+FILE_READ_CACHE_LOW_WATER = getattr(settings, "FILE_READ_CACHE_LOW_WATER", 0.9)
+
+_META_SUFFIX = ".meta"
+
+
+class ReadCacheStorage(Storage):
+    """
+    Storage wrapper that serves reads from a local LRU disk cache.
+    Everything except ``open``/``delete`` is delegated to ``storage``.
+    """
+
+    def __init__(self, storage, location=FILE_READ_CACHE_ROOT, max_size=FILE_READ_CACHE_SIZE,
+                 revalidate_after=FILE_READ_CACHE_REVALIDATE):
+        self.storage = storage
+        self.location = location
+        self.max_size = max_size
+        self.revalidate_after = revalidate_after
+        self.hits = self.revalidations = self.misses = 0
+
+    def __getattr__(self, name):
+        if name == "storage":
+            raise AttributeError(name)
+        return getattr(self.storage, name)
+
+    @property
+    def enabled(self):
+        return not is_local_storage(self.storage) and self.max_size > 0
+
+    # -- Storage API ----------------------------------------------------------
+
+    def _open(self, name, mode="rb"):
+        if not self.enabled or "r" not in mode or "+" in mode:
+            return self.storage.open(name, mode)
+        path = self._fetch(name)
+        try:
+            return DjangoFile(open(path, "rb"), name=name)
+        except FileNotFoundError:
+            # evicted by another process between fetch and open
+            return DjangoFile(open(self._fetch(name, force=True), "rb"), name=name)
+
+    def _save(self, name, content):
+        name = self.storage.save(name, content)
+        self._discard(name)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        return self.storage.get_available_name(name, max_length=max_length)
+
+    def generate_filename(self, filename):
+        return self.storage.generate_filename(filename)
+
+    def delete(self, name):
+        self.storage.delete(name)
+        self._discard(name)
+
+    def exists(self, name):
+        return self.storage.exists(name)
+
+    def size(self, name):
+        return self.storage.size(name)
+
+    def url(self, name):
+        return self.storage.url(name)
+
+    def path(self, name):
+        return self.storage.path(name)
+
+    def listdir(self, path):
+        return self.storage.listdir(path)
+
+    def get_modified_time(self, name):
+        return self.storage.get_modified_time(name)
+
+    # -- cache ----------------------------------------------------------------
+
+    def _entry_path(self, name):
+        location = f"{getattr(self.storage, 'bucket_name', '')}:{getattr(self.storage, 'location', '')}:{name}"
+        digest = hashlib.sha1(location.encode("utf-8")).hexdigest()
+        return os.path.join(self.location, digest[:2], digest + os.path.splitext(name)[1].lower())
+
+    def _read_meta(self, path):
+        try:
+            with open(path + _META_SUFFIX) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, path, meta):
+        tmp_path = f"{path}{_META_SUFFIX}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path + _META_SUFFIX)
+
+    def _fetch(self, name, force=False):
+        """
+        Make sure an up-to-date copy of ``name`` is on local disk and return its path.
+        """
+        path = self._entry_path(name)
+        meta = None if force else self._read_meta(path)
+        if meta is not None and not os.path.exists(path):
+            meta = None
+        if meta is not None and time.time() - meta["checked_at"] < self.revalidate_after:
+            self.hits += 1
+            record_cache("file_read", hits=1)
+            self._touch(path)
+            return path
+
+        previous_size = meta["size"] if meta is not None else 0
+        fresh = self._download(name, path, meta)
+        if fresh is None:
+            self.revalidations += 1
+            record_cache("file_read", hits=1)
+            self._touch(path)
+        else:
+            self.misses += 1
+            record_cache("file_read", misses=1)
+            meta = fresh
+        meta["checked_at"] = time.time()
+        self._write_meta(path, meta)
+        if fresh is not None:
+            total = self._add_size(fresh["size"] - previous_size)
+            if total is None or total > self.max_size:
+                self._evict()
+        return path
+
+    def _download(self, name, path, meta=None):
+        """
+        Download ``name`` into ``path`` and return its metadata, or return None
+        if ``meta`` describes a copy that is still current.
+        """
+        if isinstance(self.storage, S3Boto3Storage):
+            params = {"IfNoneMatch": meta["etag"]} if meta and meta.get("etag") else {}
+            key = self.storage._normalize_name(clean_name(name))
+            try:
+                response = self.storage.bucket.Object(key).get(**params)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code in ("304", "NotModified"):
+                    return None
+                if code in ("404", "NoSuchKey"):
+                    self._discard(name)
+                    raise FileNotFoundError(name)
+                raise
+            size = write_atomic(path, response["Body"])
+            return {"name": name, "size": size, "etag": response.get("ETag"),
+                    "modified": response["LastModified"].timestamp()}
+
+        try:
+            modified = self.storage.get_modified_time(name).timestamp()
+        except NotImplementedError:
+            modified = None
+        if meta and modified is not None and meta.get("modified") == modified \
+                and meta.get("size") == self.storage.size(name):
+            return None
+        with self.storage.open(name, "rb") as source:
+            size = write_atomic(path, source)
+        return {"name": name, "size": size, "etag": None, "modified": modified}
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _discard(self, name):
+        if not self.enabled:
+            return
+        path = self._entry_path(name)
+        meta = self._read_meta(path)
+        removed = False
+        for p in (path, path + _META_SUFFIX):
+            try:
+                os.remove(p)
+                removed = removed or p == path
+            except FileNotFoundError:
+                pass
+        if removed and meta is not None:
+            self._add_size(-meta["size"])
+
+    @property
+    def _size_key(self):
+        return f"filecache:size:{hashlib.sha1(self.location.encode('utf-8')).hexdigest()}"
+
+    def _add_size(self, delta):
+        """
+        Add ``delta`` bytes to the shared size total and return it, or None
+        while the total is unknown. Approximate: every eviction recounts it.
+        """
+        try:
+            return cache.incr(self._size_key, delta)
+        except ValueError:
+            return None
+
+    def _evict(self):
+        """
+        Measure the directory and, if it is over ``max_size``, remove least
+        recently used entries down to the low-water mark. Only one process
+        evicts at a time; the others carry on.
+        """
+        lock_key = f"{self._size_key}:evicting"
+        if not cache.add(lock_key, 1, 300):
+            return
+        try:
+            total = self._evict_locked()
+        finally:
+            cache.delete(lock_key)
+        cache.set(self._size_key, total, None)
+
+    def _evict_locked(self):
+        entries, total = [], 0
+        for root, _dirs, files in os.walk(self.location):
+            for file_name in files:
+                if file_name.endswith((_META_SUFFIX, ".tmp")) or file_name.startswith(".tmp"):
+                    continue
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_size:
+            return total
+
+        target = self.max_size * FILE_READ_CACHE_LOW_WATER
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= target:
+                break
+            for p in (path, path + _META_SUFFIX):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        logger.info(f"File read cache evicted down to {total} bytes")
+        return total
+
+    def clear(self):
+        if os.path.isdir(self.location):
+            for root, _dirs, files in os.walk(self.location):
+                for file_name in files:
+                    os.remove(os.path.join(root, file_name))
+        cache.delete(self._size_key)
+
+
+FILE_READ_CACHE = ReadCacheStorage(FILE_STORAGE)
+
+
+def open_cached(field_file, mode="rb"):
+    """
+    Open a ``FieldFile`` for reading, through ``FILE_READ_CACHE`` when it is
+    stored in ``FILE_STORAGE``. Use it as a context manager.
+    """
+    if field_file.storage is FILE_STORAGE:
+        return FILE_READ_CACHE.open(field_file.name, mode)
+    return field_file.open(mode)
@@ -0,0 +1,368 @@
+"""
+Prometheus metrics without a client library or an external service.
+
+Counters and histograms live in a thread-safe per-process registry and are
+served in the Prometheus text format (0.0.4) by ``metrics_view``. uWSGI and
+django-q run several processes, so every process writes a snapshot of its
+registry to ``METRICS_DIR`` (one JSON file per pid, at most every
+``METRICS_FLUSH_INTERVAL`` seconds) and the endpoint adds them all up: any
+worker answers a scrape with totals for the whole host. A scrape removes
+the files of processes that are no longer running, so the totals drop when
+a worker exits or the service restarts (Prometheus reads that as a counter
+reset). Without a ``METRICS_DIR`` a scrape only sees the process that
+served it.
+
+What is recorded:
+
+- ``MetricsMiddleware``: per-route request latency, database queries and
+  query time per request (plus ``X-DB-Queries`` / ``X-DB-Time`` response
+  headers when ``METRICS_DEBUG_HEADERS``, by default in ``DEBUG``);
+- ``TimedSerializerMixin``: time spent in serializers' ``to_representation``;
+- ``CACHE_REQUESTS``: hits and misses of the application caches;
+- ``record_task``: django-q task durations (connected in ``CampaignsConfig``);
+- at scrape time, the task coalescing counters of ``libs.coalesce``.
+
+``/metrics`` answers requests from ``METRICS_ALLOWED_IPS`` or carrying
+``Authorization: Bearer <METRICS_TOKEN>``.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = getattr(settings, "METRICS_ENABLED", True)
+METRICS_DIR = getattr(settings, "METRICS_DIR", os.path.join(tempfile.gettempdir(), "donation-metrics"))
+METRICS_FLUSH_INTERVAL = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)  # seconds
+METRICS_DEBUG_HEADERS = getattr(settings, "METRICS_DEBUG_HEADERS", settings.DEBUG)
+METRICS_ALLOWED_IPS = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+METRICS_TOKEN = getattr(settings, "METRICS_TOKEN", None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+TASK_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.values = {}  # (sample name, sorted label items) -> value
+        self._lock = threading.Lock()
+        self._flushed_at = 0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add(self, name, labels, amount):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[name, list(labels), value] for (name, labels), value in self.values.items()]
+
+    def flush(self, force=False):
+        """
+        Write this process' snapshot to ``METRICS_DIR``.
+        """
+        if not METRICS_DIR or (not force and time.monotonic() - self._flushed_at < METRICS_FLUSH_INTERVAL):
+            return
+        self._flushed_at = time.monotonic()
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+            tmp = f"{path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {e}")
+
+    def collect(self):
+        """
+        Sum of all process snapshots (this process' live values included).
+        Snapshots of exited processes are deleted instead of counted.
+        """
+        totals = {}
+        snapshots = [self.snapshot()]
+        own = f"{os.getpid()}.json"
+        if METRICS_DIR and os.path.isdir(METRICS_DIR):
+            for filename in os.listdir(METRICS_DIR):
+                if filename == own:
+                    continue
+                pid = filename.split(".", 1)[0]
+                if not pid.isdigit() or not filename.endswith((".json", ".json.tmp")):
+                    continue
+                if not _pid_alive(int(pid)):
+                    try:
+                        os.remove(os.path.join(METRICS_DIR, filename))
+                    except OSError:
+                        pass  # removed by a concurrent scrape
+                    continue
+                if filename.endswith(".tmp"):
+                    continue
+                try:
+                    with open(os.path.join(METRICS_DIR, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # being replaced
+        for snapshot in snapshots:
+            for name, labels, value in snapshot:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # running under another user
+    return True
+
+
+REGISTRY = Registry()
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        if METRICS_ENABLED:
+            self.registry.add(self.name, labels, amount)
+
+    def samples(self, values):
+        return sorted((key, value) for key, value in values.items() if key[0] == self.name)
+
+
+class Histogram:
+    """
+    Buckets are stored cumulatively, as exposed.
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.registry = registry
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        for bound in self.buckets:
+            if value <= bound:
+                self.registry.add(f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, 1)
+        self.registry.add(f"{self.name}_bucket", {**labels, "le": "+Inf"}, 1)
+        self.registry.add(f"{self.name}_sum", labels, value)
+        self.registry.add(f"{self.name}_count", labels, 1)
+
+    def samples(self, values):
+        names = (f"{self.name}_bucket", f"{self.name}_sum", f"{self.name}_count")
+        rows = [(key, value) for key, value in values.items() if key[0] in names]
+        order = {_format_value(bound): i for i, bound in enumerate(self.buckets)}
+        order["+Inf"] = len(self.buckets)
+
+        def sort_key(row):
+            (name, labels), _ = row
+            plain = tuple(pair for pair in labels if pair[0] != "le")
+            le = dict(labels).get("le")
+            return plain, names.index(name), order.get(le, -1)
+
+        # buckets of a series that never got a small enough observation are absent: fill them in
+        series = {}
+        for (name, labels), value in rows:
+            if name == names[0]:
+                series.setdefault(tuple(pair for pair in labels if pair[0] != "le"), {})[dict(labels)["le"]] = value
+        for plain, counts in series.items():
+            for bound in order:
+                if bound not in counts:
+                    rows.append(((names[0], tuple(sorted(plain + (("le", bound),)))), 0))
+        return sorted(rows, key=sort_key)
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(registry=REGISTRY, extra=None):
+    """
+    The Prometheus text exposition of ``registry`` (all processes) followed
+    by ``extra`` lines.
+    """
+    values = registry.collect()
+    lines = []
+    for metric in registry.metrics.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for (name, labels), value in metric.samples(values):
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+            lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{name} {_format_value(value)}")
+    lines.extend(extra or [])
+    return "\n".join(lines) + "\n"
+
+
+# ---------- metrics ----------
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route.")
+REQUESTS = Counter("http_requests_total", "Requests by route and status class.")
+DB_QUERIES = Histogram("db_queries_per_request", "Database queries per request.", buckets=QUERY_COUNT_BUCKETS)
+DB_QUERY_SECONDS = Counter("db_query_seconds_total", "Time spent in database queries, by route.")
+SERIALIZER_SECONDS = Histogram("serializer_duration_seconds", "Time spent serializing, by top-level serializer.")
+CACHE_REQUESTS = Counter("cache_requests_total", "Application cache lookups by cache and result (hit/miss).")
+TASK_SECONDS = Histogram("task_duration_seconds", "django-q task run time.", buckets=TASK_BUCKETS)
+
+
+# ---------- request instrumentation ----------
+
+class _QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def _route(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or match.route or "<unnamed>"
+
+
+class MetricsMiddleware:
+    """
+    Records latency and database work per route. Goes first in
+    ``MIDDLEWARE`` so the whole stack is timed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not METRICS_ENABLED:
+            return self.get_response(request)
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        route = _route(request)
+        REQUEST_SECONDS.observe(elapsed, method=request.method, route=route)
+        REQUESTS.inc(method=request.method, route=route, status=f"{response.status_code // 100}xx")
+        DB_QUERIES.observe(timer.count, route=route)
+        DB_QUERY_SECONDS.inc(timer.seconds, route=route)
+        if METRICS_DEBUG_HEADERS:
+            response["X-DB-Queries"] = str(timer.count)
+            response["X-DB-Time"] = f"{timer.seconds * 1000:.1f}ms"
+        REGISTRY.flush()
+        return response
+
+
+_serializer_depth = ContextVar("metrics_serializer_depth", default=0)
+
+
+class TimedSerializerMixin:
+    """
+    Time the outermost ``to_representation`` (nested serializers are part of
+    their parent's time). For list serializers the child's name is used.
+    """
+
+    def to_representation(self, instance):
+        depth = _serializer_depth.get()
+        token = _serializer_depth.set(depth + 1)
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            _serializer_depth.reset(token)
+            if depth == 0:
+                child = getattr(self, "child", None)
+                name = f"{type(child).__name__}[]" if child is not None else type(self).__name__
+                SERIALIZER_SECONDS.observe(time.perf_counter() - started, serializer=name)
+
+
+def record_cache(cache_name, hits=0, misses=0):
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache_name, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache_name, result="miss")
+
+
+def record_task(sender, task, **kwargs):
+    """
+    ``django_q.signals.post_execute`` receiver (sent by the cluster monitor).
+    """
+    started, stopped = task.get("started"), task.get("stopped")
+    if started and stopped:
+        TASK_SECONDS.observe((stopped - started).total_seconds(), func=str(task.get("func")),
+                             success=str(bool(task.get("success"))).lower())
+    REGISTRY.flush()
+
+
+# ---------- endpoint ----------
+
+def _coalesce_lines():
+    from libs.coalesce import coalesce_stats
+
+    lines = ["# HELP task_coalesce_total Coalesced task enqueue requests by outcome.",
+             "# TYPE task_coalesce_total counter"]
+    for func, counts in sorted(coalesce_stats().items()):
+        for outcome, value in counts.items():
+            lines.append(f'task_coalesce_total{{func="{_escape(func)}",outcome="{outcome}"}} {value}')
+    return lines
+
+
+def _allowed(request):
+    if METRICS_TOKEN and request.headers.get("Authorization") == f"Bearer {METRICS_TOKEN}":
+        return True
+    return request.META.get("REMOTE_ADDR") in METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    REGISTRY.flush(force=True)
+    try:
+        extra = _coalesce_lines()
+    except Exception as e:
+        # the shared cache being down should not hide the other metrics
+        logger.warning(f"Could not read coalesce stats: {e}")
+        extra = []
+    return HttpResponse(render(extra=extra), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -5,6 +5,8 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth.models import AnonymousUser, User
 
+from libs.auditbuffer import buffered_auditlog
+
 
 class SSOAuthentication(JWTAuthentication):
     def authenticate(self, request):
@@ -62,3 +64,17 @@ class SSOUserMiddleware(MiddlewareMixin):
 
         except Exception:
             request.user = AnonymousUser()
+
+
+class AuditlogBufferMiddleware:
+    """
+    Write the audit log entries of a request in bulk once its writes have
+    committed (see ``libs.auditbuffer``). Goes after ``AuditlogMiddleware``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with buffered_auditlog():
+            return self.get_response(request)
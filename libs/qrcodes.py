@@ -0,0 +1,330 @@
+"""
+Batch QR code encoder.
+
+``qrcode.make`` builds a new encoder, image factory and module grid for every
+code, pushes every bit through ``BitBuffer.put_bit``, runs Reed-Solomon with
+generic polynomial objects and tries all 8 mask patterns. For bulk rollouts
+the encoder below keeps that setup between codes instead:
+
+- the function patterns (finders, timing, alignment, format/version info) and
+  the zig-zag data placement order are computed once per version and mask;
+- Reed-Solomon uses cached generator polynomials and log/exp tables;
+- a fixed mask pattern skips the mask penalty search;
+- module matrices are memoized, and images are rasterized straight from the
+  matrix with Pillow (PNG) or written as a compact path (SVG).
+
+The produced matrices are identical to ``qrcode`` for the same mask pattern.
+"""
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from io import BytesIO
+from itertools import groupby
+
+import qrcode
+from PIL import Image
+from qrcode import base, util
+
+# doubled exp table, so exp[a + b] never needs a modulo
+_EXP = base.EXP_TABLE[:255] * 2
+_LOG = base.LOG_TABLE
+_GENERATORS = {}
+
+# "0"/"1" characters -> 0/1 module bytes
+_BITS = bytes.maketrans(b"01", b"\x00\x01")
+# module byte (0 = light, 1 = dark) -> grayscale pixel
+_PIXELS = bytes([255, 0]) + bytes(254)
+
+
+def _generator(ec_count):
+    """
+    Log-form coefficients (leading term dropped) of the RS generator polynomial.
+    """
+    generator = _GENERATORS.get(ec_count)
+    if generator is None:
+        poly = [1]
+        for i in range(ec_count):
+            # multiply by (x - a^i)
+            nxt = poly + [0]
+            for j, coef in enumerate(poly):
+                if coef:
+                    nxt[j + 1] ^= _EXP[_LOG[coef] + i]
+            poly = nxt
+        generator = _GENERATORS[ec_count] = [_LOG[coef] for coef in poly[1:]]
+    return generator
+
+
+def _ec_codewords(data, ec_count):
+    generator = _generator(ec_count)
+    remainder = [0] * ec_count
+    for byte in data:
+        factor = byte ^ remainder.pop(0)
+        remainder.append(0)
+        if factor:
+            log_factor = _LOG[factor]
+            for i, log_coef in enumerate(generator):
+                remainder[i] ^= _EXP[log_factor + log_coef]
+    return remainder
+
+
+class _BitWriter:
+    """
+    Drop-in for ``qrcode.util.BitBuffer`` backed by a single integer.
+    """
+    __slots__ = ("value", "length")
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def put(self, num, length):
+        self.value = (self.value << length) | (num & ((1 << length) - 1))
+        self.length += length
+
+    def put_bit(self, bit):
+        self.put(1 if bit else 0, 1)
+
+    def __len__(self):
+        return self.length
+
+
+def _write_segments(data_list, version):
+    writer = _BitWriter()
+    mode_sizes = util.mode_sizes_for_version(version)
+    for data in data_list:
+        writer.put(data.mode, 4)
+        writer.put(len(data), mode_sizes[data.mode])
+        data.write(writer)
+    return writer
+
+
+def _best_version(data_list, error_correction):
+    """
+    Smallest version that fits the data, like ``QRCode.best_fit``.
+    """
+    version = 1
+    while True:
+        needed_bits = len(_write_segments(data_list, version))
+        fitted = bisect_left(util.BIT_LIMIT_TABLE[error_correction], needed_bits, version)
+        if fitted == 41:
+            raise qrcode.exceptions.DataOverflowError()
+        if util.mode_sizes_for_version(fitted) is util.mode_sizes_for_version(version):
+            return fitted
+        version = fitted
+
+
+def _create_data(version, error_correction, data_list):
+    """
+    Same codewords as ``qrcode.util.create_data`` (data then error correction,
+    interleaved per RS block).
+    """
+    writer = _write_segments(data_list, version)
+    rs_blocks = base.rs_blocks(version, error_correction)
+    bit_limit = sum(block.data_count * 8 for block in rs_blocks)
+    if len(writer) > bit_limit:
+        raise qrcode.exceptions.DataOverflowError(
+            f"Code length overflow. Data size ({len(writer)}) > size available ({bit_limit})"
+        )
+
+    # terminator (up to four 0s), then pad to a whole byte
+    writer.put(0, min(bit_limit - len(writer), 4))
+    writer.put(0, -len(writer) % 8)
+    codewords = list(writer.value.to_bytes(len(writer) // 8, "big"))
+    pad = [util.PAD0, util.PAD1]
+    codewords += [pad[i % 2] for i in range(bit_limit // 8 - len(codewords))]
+
+    dc_blocks, ec_blocks = [], []
+    offset = 0
+    for block in rs_blocks:
+        dc = codewords[offset:offset + block.data_count]
+        offset += block.data_count
+        dc_blocks.append(dc)
+        ec_blocks.append(_ec_codewords(dc, block.total_count - block.data_count))
+
+    result = []
+    for blocks in (dc_blocks, ec_blocks):
+        for i in range(max(len(b) for b in blocks)):
+            result.extend(b[i] for b in blocks if i < len(b))
+    return result
+
+
+class _Layout:
+    """
+    Everything about a (version, error correction, mask) symbol that does not
+    depend on the data: the function pattern template, the flat module indexes
+    of data cells in placement order, and the mask bit for each of them.
+    """
+
+    def __init__(self, version, error_correction, mask_pattern):
+        size = version * 4 + 17
+        qr = qrcode.QRCode(version=version, error_correction=error_correction)
+        qr.modules_count = size
+        qr.modules = [[None] * size for _ in range(size)]
+        qr.setup_position_probe_pattern(0, 0)
+        qr.setup_position_probe_pattern(size - 7, 0)
+        qr.setup_position_probe_pattern(0, size - 7)
+        qr.setup_position_adjust_pattern()
+        qr.setup_timing_pattern()
+        qr.setup_type_info(False, mask_pattern)
+        if version >= 7:
+            qr.setup_type_number(False)
+
+        # Same traversal as QRCode.map_data: two-column zig-zag from the bottom right.
+        coords = []
+        row, inc = size - 1, -1
+        for col in range(size - 1, 0, -2):
+            if col <= 6:
+                col -= 1
+            while True:
+                for c in (col, col - 1):
+                    if qr.modules[row][c] is None:
+                        coords.append((row, c))
+                row += inc
+                if row < 0 or row >= size:
+                    row -= inc
+                    inc = -inc
+                    break
+
+        mask = util.mask_func(mask_pattern)
+        self.size = size
+        self.template = bytes(1 if m else 0 for line in qr.modules for m in line)
+        self.indexes = [r * size + c for r, c in coords]
+        self.mask = int.from_bytes(bytes(1 if mask(r, c) else 0 for r, c in coords), "big")
+
+
+class QRBatchEncoder:
+    def __init__(self, box_size=10, border=4, error_correction=qrcode.constants.ERROR_CORRECT_M,
+                 mask_pattern=0, cache_size=4096):
+        """
+        :param box_size: Pixels per module in PNG output (and SVG width/height).
+        :param border: Quiet zone width in modules.
+        :param error_correction: One of ``qrcode.constants.ERROR_CORRECT_*``.
+        :param mask_pattern: Fixed mask (0-7), or None to pick the best mask per
+            code through ``qrcode`` like ``qrcode.make`` does (much slower).
+        :param cache_size: Number of module matrices kept in memory.
+        """
+        self.box_size = box_size
+        self.border = border
+        self.error_correction = error_correction
+        self.mask_pattern = mask_pattern
+        self.cache_size = cache_size
+        self._qr = qrcode.QRCode(box_size=box_size, border=border, error_correction=error_correction)
+        self._layouts = {}
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _layout(self, version):
+        layout = self._layouts.get(version)
+        if layout is None:
+            layout = self._layouts[version] = _Layout(version, self.error_correction, self.mask_pattern)
+        return layout
+
+    def _modules(self, data):
+        """
+        Module rows (without border) as bytes of 0 (light) / 1 (dark).
+        """
+        if self.mask_pattern is None:
+            qr = self._qr
+            qr.border = 0
+            qr.clear()
+            qr.version = None
+            qr.add_data(data)
+            qr.make(fit=True)
+            return [bytes(row) for row in qr.modules]
+
+        data_list = list(util.optimal_data_chunks(data, minimum=20))
+        version = _best_version(data_list, self.error_correction)
+        codewords = _create_data(version, self.error_correction, data_list)
+        layout = self._layout(version)
+
+        cells = len(layout.indexes)
+        # codeword bits in placement order, remaining cells light, then masked
+        bits = int.from_bytes(bytes(codewords), "big") << (cells - len(codewords) * 8)
+        bits = format(bits, "b").zfill(cells).encode("ascii").translate(_BITS)
+        bits = (int.from_bytes(bits, "big") ^ layout.mask).to_bytes(cells, "big")
+
+        flat = bytearray(layout.template)
+        for index, bit in zip(layout.indexes, bits):
+            flat[index] = bit
+        size = layout.size
+        return [bytes(flat[r:r + size]) for r in range(0, size * size, size)]
+
+    def matrix(self, data):
+        """
+        Return the module matrix (including the border) for ``data`` as a tuple
+        of rows, each a ``bytes`` of 0 (light) / 1 (dark).
+        """
+        with self._lock:
+            matrix = self._matrices.get(data)
+            if matrix is not None:
+                self._matrices.move_to_end(data)
+                return matrix
+
+            rows = self._modules(data)
+            quiet = bytes(self.border)
+            blank = bytes(len(rows) + 2 * self.border)
+            matrix = ((blank,) * self.border
+                      + tuple(quiet + row + quiet for row in rows)
+                      + (blank,) * self.border)
+
+            self._matrices[data] = matrix
+            if len(self._matrices) > self.cache_size:
+                self._matrices.popitem(last=False)
+            return matrix
+
+    def image(self, data):
+        """
+        Return a 1-bit (mode ``1``) Pillow image of the QR code.
+        """
+        matrix = self.matrix(data)
+        size = len(matrix)
+        raw = b"".join(matrix).translate(_PIXELS)
+        image = Image.frombytes("L", (size, size), raw).convert("1", dither=Image.Dither.NONE)
+        return image.resize((size * self.box_size, size * self.box_size), Image.NEAREST)
+
+    def png(self, data):
+        buffer = BytesIO()
+        self.image(data).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def svg(self, data):
+        """
+        Return the QR code as SVG bytes, one path segment per run of dark modules.
+        """
+        matrix = self.matrix(data)
+        size = len(matrix)
+        pixels = size * self.box_size
+        path = []
+        for y, row in enumerate(matrix):
+            x = 0
+            for dark, run in groupby(row):
+                length = len(tuple(run))
+                if dark:
+                    path.append(f"M{x} {y}h{length}v1h-{length}z")
+                x += length
+
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+            f'width="{pixels}" height="{pixels}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill="#fff"/>'
+            f'<path d="{"".join(path)}" fill="#000"/></svg>'
+        ).encode("utf-8")
+
+    def render(self, data, fmt):
+        if fmt == "png":
+            return self.png(data)
+        if fmt == "svg":
+            return self.svg(data)
+        raise ValueError(f"Unsupported QR format: {fmt}")
+
+_default_encoder = None
+
+
+def get_encoder():
+    """
+    Return the process-wide encoder, so worker tasks share its setup and matrix cache.
+    """
+    global _default_encoder
+    if _default_encoder is None:
+        _default_encoder = QRBatchEncoder()
+    return _default_encoder
@@ -0,0 +1,35 @@
+"""
+Named task queues.
+
+Each queue is a django-q cluster with its own workers, timeout and retry
+(see ``Q_CLUSTER`` and its ``ALT_CLUSTERS`` in settings) and is started as a
+separate ``qcluster`` process, so slow image rendering can never hold up
+ledger and payment work:
+
+- ``ledger``: donations, webhooks, withdrawals (the default cluster)
+- ``images``: QR codes, donation cards, image variants and normalization
+- ``maintenance``: sweepers, archival and other scheduled housekeeping
+"""
+from django.conf import settings
+from django_q.tasks import async_task
+
+LEDGER = "ledger"
+IMAGES = "images"
+MAINTENANCE = "maintenance"
+
+TASK_QUEUES = getattr(settings, "TASK_QUEUES", {})
+
+
+def cluster_for(queue):
+    """
+    Return the django-q cluster name serving ``queue`` (None = default cluster).
+    """
+    return TASK_QUEUES.get(queue)
+
+
+def enqueue(func, *args, queue=LEDGER, **kwargs):
+    """
+    ``async_task`` on the cluster that serves ``queue``.
+    """
+    return async_task(func, *args, cluster=cluster_for(queue), **kwargs)
+
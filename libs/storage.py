@@ -17,9 +17,20 @@
 """
 
 
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.move import file_move_safe
 from django.core.files.storage import FileSystemStorage, DefaultStorage
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+from libs.metrics import record_cache
 
 
 USE_S3 = getattr(settings, "USE_S3", False)
@@ -78,3 +89,232 @@ STORAGE_CHUNK = FileSystemStorage(
 )
 
 CHUNK_UPLOAD_PRIVATE = FileSystemStorage(location=CHUNK_UPLOAD_FINISHED_ROOT)
+
+# private exports (audit log archives): never public, downloaded through the admin
+if USE_S3 or USE_DO_SPACE:
+    ARCHIVE_STORAGE = S3Boto3Storage(
+        location=get_bucket_location("archive"), file_overwrite=False, default_acl="private", querystring_auth=True
+    )
+else:
+    ARCHIVE_STORAGE = FileSystemStorage(location=f"{MEDIA_ROOT}/archive")
+
+
+def is_local_storage(storage):
+    return isinstance(storage, FileSystemStorage)
+
+
+def move_into_storage(path, name, storage=FILE_STORAGE):
+    """
+    Move the local file at ``path`` into a ``FileSystemStorage`` under a free
+    name derived from ``name``. This is a rename when both are on the same
+    filesystem, a copy otherwise.
+
+    :return: The name the file was stored under.
+    """
+    for _ in range(3):
+        stored_name = storage.get_available_name(name)
+        destination = storage.path(stored_name)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        try:
+            file_move_safe(path, destination, allow_overwrite=False)
+        except FileExistsError:
+            # taken by a concurrent upload since get_available_name
+            continue
+        if storage.file_permissions_mode is not None:
+            os.chmod(destination, storage.file_permissions_mode)
+        return stored_name
+    raise FileExistsError(f"No free name for {name}")
+
+
+# direct-to-bucket multipart uploads (only with S3 / DO Spaces)
+USE_OBJECT_STORAGE = USE_S3 or USE_DO_SPACE
+UPLOAD_PRESIGNED_EXPIRY = getattr(settings, "UPLOAD_PRESIGNED_EXPIRY", 3600)  # seconds
+
+
+def _bucket_client():
+    return FILE_STORAGE.connection.meta.client, FILE_STORAGE.bucket_name
+
+
+def _object_key(name):
+    return FILE_STORAGE._normalize_name(clean_name(name))
+
+
+def create_multipart_upload(name):
+    """
+    Start a multipart upload for ``name`` in FILE_STORAGE and return its upload id.
+    The object gets the same content type, ACL and object parameters as files
+    saved through the storage.
+    """
+    client, bucket = _bucket_client()
+    key = _object_key(name)
+    params = FILE_STORAGE._get_write_parameters(key)
+    return client.create_multipart_upload(Bucket=bucket, Key=key, **params)["UploadId"]
+
+
+def presign_upload_parts(name, multipart_upload_id, part_numbers, expires_in=UPLOAD_PRESIGNED_EXPIRY):
+    """
+    Return ``{part_number: url}``; clients ``PUT`` each part's bytes to its url.
+    """
+    client, bucket = _bucket_client()
+    key = _object_key(name)
+    return {
+        part_number: client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": bucket, "Key": key, "UploadId": multipart_upload_id, "PartNumber": part_number},
+            ExpiresIn=expires_in,
+        )
+        for part_number in part_numbers
+    }
+
+
+def list_uploaded_parts(name, multipart_upload_id):
+    """
+    Return ``{part_number: {"ETag": ..., "Size": ...}}`` of the parts uploaded so far.
+    """
+    client, bucket = _bucket_client()
+    paginator = client.get_paginator("list_parts")
+    parts = {}
+    for page in paginator.paginate(Bucket=bucket, Key=_object_key(name), UploadId=multipart_upload_id):
+        for part in page.get("Parts", []):
+            parts[part["PartNumber"]] = {"ETag": part["ETag"], "Size": part["Size"]}
+    return parts
+
+
+def complete_multipart_upload(name, multipart_upload_id, parts):
+    """
+    :param parts: ``{part_number: {"ETag": ...}}`` as returned by ``list_uploaded_parts``.
+    """
+    client, bucket = _bucket_client()
+    client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=_object_key(name),
+        UploadId=multipart_upload_id,
+        MultipartUpload={"Parts": [
+            {"PartNumber": number, "ETag": parts[number]["ETag"]} for number in sorted(parts)
+        ]},
+    )
+
+
+def abort_multipart_upload(name, multipart_upload_id):
+    client, bucket = _bucket_client()
+    client.abort_multipart_upload(Bucket=bucket, Key=_object_key(name), UploadId=multipart_upload_id)
+
+
+# URL cache: S3Boto3Storage.url() runs a botocore presign for every call, even
+# for public (unsigned) URLs. Public URLs never change for a stored name, so
+# they are memoized; signed URLs are kept until shortly before they expire.
+# Lookups go to a per-process LRU first, then to the shared cache.
+URL_CACHE_ENABLED = getattr(settings, "FILE_URL_CACHE", True)
+URL_CACHE_SIZE = getattr(settings, "FILE_URL_CACHE_SIZE", 10000)
+URL_EXPIRY_MARGIN = getattr(settings, "FILE_URL_EXPIRY_MARGIN", 300)  # seconds
+PUBLIC_URL_TIMEOUT = getattr(settings, "FILE_URL_PUBLIC_TIMEOUT", 7 * 24 * 60 * 60)
+
+
+class _URLCache:
+    def __init__(self, size):
+        self.size = size
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._urls.get(key)
+            if entry is None:
+                return None
+            url, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._urls[key]
+                return None
+            self._urls.move_to_end(key)
+            return url
+
+    def set(self, key, url, expires_at):
+        with self._lock:
+            self._urls[key] = (url, expires_at)
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.size:
+                self._urls.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._urls.clear()
+
+
+_url_cache = _URLCache(URL_CACHE_SIZE)
+
+
+def _url_timeout(storage):
+    """
+    Seconds a URL of ``storage`` may be cached: None for public URLs,
+    0 when signed URLs expire too soon to be worth caching.
+    """
+    if not getattr(storage, "querystring_auth", False):
+        return None
+    return max(storage.querystring_expire - URL_EXPIRY_MARGIN, 0)
+
+
+def _url_cache_key(storage, name):
+    location = f"{getattr(storage, 'bucket_name', '')}:{getattr(storage, 'location', '')}:{name}"
+    return "file-url:" + hashlib.md5(location.encode("utf-8")).hexdigest()
+
+
+def _cacheable(field_file):
+    return URL_CACHE_ENABLED and field_file and isinstance(field_file.storage, S3Boto3Storage)
+
+
+def file_url(field_file):
+    """
+    ``field_file.url`` through the URL cache. Returns None for an empty field.
+    """
+    if not field_file:
+        return None
+    if not _cacheable(field_file):
+        return field_file.url
+    return file_urls([field_file])[field_file.name]
+
+
+def file_urls(field_files):
+    """
+    Resolve the URLs of many files at once: one lookup in the local LRU, one
+    ``get_many`` on the shared cache for the rest, and signing only for what
+    is still missing. Returns ``{name: url}`` for the files the cache applies
+    to (not empty and in object storage); use ``file_url`` for the others.
+    """
+    urls, missing = {}, {}
+    for field_file in field_files:
+        if not _cacheable(field_file) or field_file.name in urls:
+            continue
+        key = _url_cache_key(field_file.storage, field_file.name)
+        url = _url_cache.get(key)
+        if url is None:
+            missing[key] = field_file
+        else:
+            urls[field_file.name] = url
+    record_cache("file_url_local", hits=len(urls), misses=len(missing))
+    if not missing:
+        return urls
+
+    now = time.time()
+    shared = cache.get_many(list(missing))
+    record_cache("file_url_shared", hits=len(shared), misses=len(missing) - len(shared))
+    to_store = {}
+    timeouts = {}
+    for key, field_file in missing.items():
+        timeout = _url_timeout(field_file.storage)
+        entry = shared.get(key)
+        if entry is not None:
+            url, expires_at = entry
+        else:
+            url = field_file.url
+            expires_at = None if timeout is None else now + timeout
+            if timeout != 0:
+                to_store[key] = (url, expires_at)
+                timeouts[key] = PUBLIC_URL_TIMEOUT if timeout is None else timeout
+        if timeout != 0:
+            _url_cache.set(key, url, expires_at)
+        urls[field_file.name] = url
+
+    # set_many takes one timeout; signed and public URLs of one storage share it
+    for timeout in set(timeouts.values()):
+        cache.set_many({k: v for k, v in to_store.items() if timeouts[k] == timeout}, timeout)
+    return urls
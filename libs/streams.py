@@ -0,0 +1,223 @@
+"""
+Streaming helpers for uploads: constant-memory copies and incremental base64 decoding.
+"""
+import base64
+import binascii
+import os
+import tempfile
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+_WHITESPACE = b" \t\r\n"
+# longest data-URI header we look for, e.g. "data:application/vnd...;base64,"
+_MAX_HEADER = 256
+
+
+class Base64StreamDecoder:
+    """
+    Decode base64 text that arrives in arbitrary pieces.
+
+    An optional data-URI header (``data:image/png;base64,``) is stripped,
+    whitespace is ignored and missing ``=`` padding is tolerated, like
+    ``common.serializers.decode_base64_img``. Only a few bytes are held back
+    between calls, so memory stays bounded by the size of each piece.
+    """
+
+    def __init__(self):
+        self._head = b""
+        self._header_done = False
+        self._pending = b""
+        self.header = None
+
+    @property
+    def media_type(self):
+        """
+        Media type from the data-URI header (``image/png``), once it has been seen.
+        """
+        if not self.header or not self.header.startswith(b"data:"):
+            return None
+        return self.header[5:].split(b";")[0].decode("ascii", "replace") or None
+
+    def feed(self, data):
+        """
+        Feed a piece of base64 text (str or bytes) and return the bytes decoded so far.
+        """
+        if isinstance(data, str):
+            data = data.encode("ascii")
+
+        if not self._header_done:
+            self._head += data
+            comma = self._head.find(b",")
+            if comma == -1 and len(self._head) <= _MAX_HEADER:
+                return b""
+            if comma != -1:
+                self.header, data = self._head[:comma].strip(), self._head[comma + 1:]
+            else:
+                data = self._head
+            self._head = b""
+            self._header_done = True
+
+        data = self._pending + data.translate(None, _WHITESPACE)
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return self._decode(data[:usable])
+
+    def flush(self):
+        """
+        Decode whatever is left, padding it if needed.
+        """
+        if not self._header_done:
+            self._header_done = True
+            self._pending = self._head.translate(None, _WHITESPACE)
+            self._head = b""
+        data, self._pending = self._pending, b""
+        if len(data) % 4:
+            data += b"=" * (4 - len(data) % 4)
+        return self._decode(data)
+
+    @staticmethod
+    def _decode(data):
+        try:
+            return base64.b64decode(data)
+        except binascii.Error as e:
+            raise ValueError(f"Invalid base64 data: {e}")
+
+
+class StreamLimitExceeded(ValueError):
+    def __init__(self, size, limit):
+        super().__init__(f"Stream exceeds {limit} bytes")
+        self.size = size
+        self.limit = limit
+
+
+class ConcatReader:
+    """
+    Read-only file-like object over several files, opened one at a time.
+
+    :param hasher: Optional hashlib object updated with the raw file bytes.
+    :param decoder: Optional ``Base64StreamDecoder``; reads return decoded bytes.
+    :param limit: Raise ``StreamLimitExceeded`` as soon as more than ``limit``
+        bytes have been produced.
+    """
+
+    def __init__(self, paths, hasher=None, decoder=None, limit=None, buffer_size=COPY_BUFFER_SIZE):
+        self._paths = list(paths)
+        self._current = None
+        self._buffer = bytearray()
+        self._exhausted = False
+        self.hasher = hasher
+        self.decoder = decoder
+        self.limit = limit
+        self.buffer_size = buffer_size
+        self.size = 0
+        self.closed = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def read(self, size=-1):
+        while (size is None or size < 0 or len(self._buffer) < size) and self._fill():
+            pass
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        self._paths = []
+        self.closed = True
+
+    def _fill(self):
+        while not self._exhausted:
+            if self._current is None:
+                if not self._paths:
+                    self._exhausted = True
+                    if self.decoder is not None:
+                        self._emit(self.decoder.flush())
+                    return True
+                self._current = open(self._paths.pop(0), "rb")
+
+            data = self._current.read(self.buffer_size)
+            if not data:
+                self._current.close()
+                self._current = None
+                continue
+            if self.hasher is not None:
+                self.hasher.update(data)
+            if self.decoder is not None:
+                data = self.decoder.feed(data)
+            self._emit(data)
+            return True
+        return False
+
+    def _emit(self, data):
+        self.size += len(data)
+        if self.limit is not None and self.size > self.limit:
+            self.close()
+            raise StreamLimitExceeded(self.size, self.limit)
+        self._buffer += data
+
+
+def copy_stream(source, destination, hasher=None, decoder=None, limit=None, buffer_size=COPY_BUFFER_SIZE):
+    """
+    Copy ``source`` into ``destination`` in fixed-size buffers.
+
+    :param hasher: Optional hashlib object updated with the raw source bytes.
+    :param decoder: Optional ``Base64StreamDecoder``; decoded bytes are written
+        instead of the raw ones (the caller flushes it after the last source).
+    :param limit: Raise ``StreamLimitExceeded`` once more than ``limit`` bytes
+        would be written.
+    :return: Number of bytes written to ``destination``.
+    """
+    written = 0
+    while True:
+        data = source.read(buffer_size)
+        if not data:
+            return written
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if hasher is not None:
+            hasher.update(data)
+        if decoder is not None:
+            data = decoder.feed(data)
+        written += len(data)
+        if limit is not None and written > limit:
+            raise StreamLimitExceeded(written, limit)
+        destination.write(data)
+
+
+class DigestMismatch(ValueError):
+    pass
+
+
+def write_atomic(path, source, hasher=None, expected_hexdigest=None, buffer_size=COPY_BUFFER_SIZE):
+    """
+    Stream ``source`` into ``path`` through a temporary file in the same
+    directory, then rename it into place. Concurrent or repeated writers of the
+    same path never leave a partial file behind; the last one wins.
+
+    :param hasher: Optional hashlib object updated with the written bytes.
+    :param expected_hexdigest: If given, ``hasher`` must match it, otherwise
+        ``DigestMismatch`` is raised and ``path`` is left untouched.
+    :return: Number of bytes written.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=".tmp", delete=False) as tmp:
+        try:
+            written = copy_stream(source, tmp, hasher=hasher, buffer_size=buffer_size)
+            if expected_hexdigest and hasher.hexdigest() != expected_hexdigest.lower():
+                raise DigestMismatch(f"Checksum mismatch: expected {expected_hexdigest}, got {hasher.hexdigest()}")
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+    return written